@@ -1,21 +1,48 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from flask import send_from_directory
 
+import asyncio
 import logging
-import re
 import os
 import json
 from datetime import datetime, timedelta
 import uuid
 import shutil
+import hashlib
+import io
+from typing import Any, List, Optional, Union
+
+import orjson
+from pydantic import BaseModel
 
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import AIMessage, HumanMessage
 from langgraph.types import Command
-from aiTutorAgent import aiTutorAgent, mongodb_client
+from aiTutorAgent import (
+    aiTutorAgent,
+    analysis_jobs,
+    checkpoint_archive,
+    FINISHED_THREAD_ARCHIVE_AFTER_HOURS,
+    THREAD_ARCHIVE_AFTER_HOURS,
+    mongo,
+    async_runner,
+    init_async_graph,
+    memory,
+    session_aggregates,
+    session_store,
+    student_profiles,
+    thread_registry,
+)
+from aiTutorAgent.session_export import (
+    SESSION_EXPORT_EXTENSION,
+    read_transcript,
+    session_bytes,
+)
 from rag import rag
+from rag.vector_store_cache import SessionVectorStores, VectorStoreCache
+from telemetry import RESPONSE_BYTES, VECTOR_STORE_RECOVERIES, render_metrics
 
 from dotenv import load_dotenv
 
@@ -36,9 +63,15 @@ TOTAL_WEEKS = 14
 
 thread_ids = []
 
-# to store vector stores and their access times
-app.vector_stores = {}
-app.vector_store_access_times = {}
+# vector stores of the sessions, shared by the sessions of the same course and
+# weeks and evicted by LRU and TTL, see SessionVectorStores and VectorStoreCache
+app.vector_stores = SessionVectorStores(
+    VectorStoreCache(
+        max_entries=int(os.getenv("VECTOR_STORE_CACHE_MAX_ENTRIES", "32")),
+        max_bytes=int(float(os.getenv("VECTOR_STORE_CACHE_MAX_MB", "2048")) * 1024**2),
+        ttl_seconds=float(os.getenv("VECTOR_STORE_CACHE_TTL_MINUTES", "120")) * 60,
+    )
+)
 
 
 def get_graph_data(graph):
@@ -183,9 +216,20 @@ def get_topics():
         return jsonify({"error": str(e)}), 500
 
 
+# week indexes are built once: concurrent first sessions of a course must not
+# write the same index folder
+vector_store_build_lock = threading.RLock()
+
+
 def embed_documents(folder_path, vector_store_path):
+    """
+    Build the vector store of a week folder and save it.
+
+    The components of rag are used without its per-instance documents and vector
+    store, so concurrent requests do not overwrite each other's index.
+    """
     logging.debug(f"Loading documents from: {folder_path}")
-    documents = rag.load_documents(folder_path)
+    documents = rag.document_loader_factory.create_loader(folder_path).load()
 
     # Clean and normalize the text before embedding
     for doc in documents:
@@ -195,14 +239,32 @@ def embed_documents(folder_path, vector_store_path):
     logging.debug(f"Documents loaded")
 
     logging.debug(f"Embedding documents")
-    vector_store = rag.embed_documents()
-    rag.save_vector_store(vector_store_path)
+    chunks = rag.text_splitter.split_documents(documents)
+    vector_store = rag.vector_store_factory.create_vector_store(chunks, rag.embeddings)
+    with vector_store_build_lock:
+        vector_store.save_local(vector_store_path)
     logging.debug(f"Vector store created")
 
 
-def load_vector_store(vector_store_path):
-    logging.debug(f"Loading vector store from: {vector_store_path}")
-    vector_store = rag.load_vector_store(vector_store_path)
+def ensure_vector_store(folder_path, vector_store_path):
+    """
+    Build the vector store of a week folder unless it exists.
+
+    Returns:
+        bool: Whether it was built
+    """
+    with vector_store_build_lock:
+        if os.path.exists(vector_store_path):
+            return False
+        embed_documents(folder_path, vector_store_path)
+        return True
+
+
+def load_vector_store(vector_store_paths):
+    logging.debug(f"Loading vector store from: {vector_store_paths}")
+    vector_store = rag.vector_store_factory.load_vector_store(
+        vector_store_paths, rag.embeddings
+    )
     logging.debug(f"Vector store loaded")
     return vector_store
 
@@ -244,21 +306,39 @@ def update_vector_store():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/start-tutoring", methods=["POST"])
-def start_tutoring():
-    data = request.json
+class TutoringRequestError(Exception):
+    """Invalid tutoring request, reported to the client with the given status code"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def prepare_tutoring_session(data):
+    """
+    Load the vector store of the selected course and build the initial graph input.
+
+    Args:
+        data (dict): The /start-tutoring request body
+
+    Returns:
+        tuple: (thread_id, thread config, initial graph input)
+
+    Raises:
+        TutoringRequestError: If the course folder or its vector stores are not found
+    """
     duration = data.get("duration", 30)
     folder_name = data.get("folder_name")  # Get the selected folder from request
     topic = data.get("topic")
     current_week = data.get("current_week")
     student_id = data.get("student_id")
     if not folder_name:
-        return jsonify({"error": "No folder selected"}), 400
+        raise TutoringRequestError("No folder selected", 400)
 
     folder_path = os.path.join("course_material", folder_name)
 
     if not os.path.exists(folder_path):
-        return jsonify({"error": "Selected folder not found"}), 404
+        raise TutoringRequestError("Selected folder not found", 404)
 
     vector_store = None
     vector_store_paths = []
@@ -277,31 +357,36 @@ def start_tutoring():
             logging.info(f"Week {week} Folder is empty: {folder_path_week}")
             continue
         # check if the vector store exists, if not, embed the documents and create it
-        if not os.path.exists(vector_store_path_week):
-            embed_documents(folder_path_week, vector_store_path_week)
+        if ensure_vector_store(folder_path_week, vector_store_path_week):
             logging.info(
                 f"Vector store created for week {week}: {vector_store_path_week}"
             )
         vector_store_paths.append(vector_store_path_week)
 
-    # merge all vector stores
+    thread_id = str(uuid.uuid4())
+
+    # merge all vector stores, unless another session uses the same weeks
     if len(vector_store_paths) > 0:
         logging.info(f"Merging vector stores for folder {folder_name}")
         logging.info(f"Vector store paths: {vector_store_paths}")
-        vector_store = load_vector_store(vector_store_paths)
+        vector_store, _ = app.vector_stores.load(
+            thread_id, vector_store_paths, load_vector_store
+        )
     else:
         logging.error(f"No vector stores found for folder {folder_name}")
-        return jsonify({"error": "No vector stores found for folder"}), 404
+        raise TutoringRequestError("No vector stores found for folder", 404)
 
     if topic != "ALL":
         topic = topic.split("\\", 2)[1]
         logging.info(f"Topic Selected: {topic}")
-        titles = rag.get_titles(topic)
+        titles = rag.get_titles(topic, vector_store=vector_store)
     else:
-        titles = rag.get_titles()
+        titles = rag.get_titles(vector_store=vector_store)
 
     initial_input = {
         "subject": folder_name,
+        # selected file, the per-topic counts of the student profile
+        "topic": topic,
         "titles": titles,
         "summary": "",
         "messages": [],
@@ -313,133 +398,315 @@ def start_tutoring():
         "task_breakdown": [],
         "current_task_index": 0,
         "task_solving_start_index": 0,
+        "conversation_summary": "",
+        "summarized_message_count": 0,
         "vector_store_paths": vector_store_paths,  # Store vector store paths in the state
         "current_week": current_week,  # Store current week for recovery purposes
     }
 
-    thread_id = str(uuid.uuid4())
     thread_ids.append(thread_id)
     thread = {"configurable": {"thread_id": str(thread_id), "user_id": str(student_id)}}
 
-    app.vector_stores[thread_id] = vector_store
-    update_vector_store_access_time(thread_id)  # Track access time
+    thread_registry.register(
+        thread_id,
+        str(student_id),
+        folder_name,
+        created_at=initial_input["start_time"],
+        vector_store_paths=vector_store_paths,
+    )
 
-    response = aiTutorAgent.graph.invoke(initial_input, thread)
-    response_json = messages_to_json(response["messages"])
-    state = aiTutorAgent.graph.get_state(thread)
-    next_state = state.next[0] if state.next else ""
+    return thread_id, thread, initial_input
 
-    # print(f"State: {state_to_json(state)}")
-    # print(f"jsonify: {jsonify( {"state": state_to_json(state)})}")
 
-    graph = aiTutorAgent.graph.get_graph()
-    # save the graph
-    # create graph folder if it doesn't exist
-    graph_folder = "graph"
-    if not os.path.exists(graph_folder):
-        os.makedirs(graph_folder)
-    try:
-        graph.draw_mermaid_png(output_file_path=os.path.join(graph_folder, "graph.png"))
-    except Exception as e:
-        logging.error(f"Error in draw_mermaid_png: {str(e)}")
-
-    return jsonify(
-        {
-            "messages": response_json,
-            "thread_id": thread_id,
-            "state": state_to_json(state),
-            "next_state": next_state,
-        }
-    )
+def get_thread_state(thread):
+    """
+    State snapshot of a thread, read with the synchronous graph.
 
+    The checkpoints of an abandoned thread are moved to the archive, so they
+    are restored first if the thread was archived.
+    """
+    checkpoint_archive.restore_if_archived(thread["configurable"]["thread_id"])
+    return aiTutorAgent.graph.get_state(thread)
 
-# API endpoint to handle student responses and continue the session
-@app.route("/continue-tutoring", methods=["POST"])
-def continue_tutoring():
-    data = request.json
-    student_response = data.get("student_response", "")
-    thread_id = data.get("thread_id")
-    student_id = data.get("student_id")
-    thread = {"configurable": {"thread_id": str(thread_id), "user_id": str(student_id)}}
 
-    # Update access time if this thread has a vector store
-    if thread_id in app.vector_stores:
-        update_vector_store_access_time(thread_id)
+def record_recovery(loaded, known_thread):
+    """
+    Count a vector store recovery: a store of another session reused, reloaded
+    after its eviction from this process, or reloaded because the session ran on
+    another worker until now.
+    """
+    if not loaded:
+        result = "shared"
+    elif known_thread:
+        result = "loaded"
     else:
-        # Recovery mechanism - try to recreate the vector store
-        try:
-            logging.info(
-                f"Vector store missing for thread {thread_id}. Attempting recovery..."
+        result = "loaded_other_worker"
+    VECTOR_STORE_RECOVERIES.labels(result=result).inc()
+
+
+def recover_vector_store(thread_id, thread):
+    """
+    Make sure the vector store of a thread is loaded, recreating it from the
+    paths saved in the graph state if it was evicted or never loaded in this process.
+    """
+    # Mark the vector store as recently used if it is cached
+    if app.vector_stores.get(thread_id) is not None:
+        return
+    # the session used a store of this worker before, so that store was evicted
+    known_thread = thread_id in app.vector_stores
+
+    # Recovery mechanism - try to recreate the vector store
+    try:
+        logging.info(
+            f"Vector store missing for thread {thread_id}. Attempting recovery..."
+        )
+
+        thread_info = thread_registry.get(str(thread_id), fields=["vector_store_paths"])
+
+        # the registry has the paths, no need to read the state
+        if thread_info and thread_info.get("vector_store_paths"):
+            _, loaded = app.vector_stores.load(
+                thread_id, thread_info["vector_store_paths"], load_vector_store
             )
+            record_recovery(loaded, known_thread)
+            return
 
-            # Get the session state
-            state = aiTutorAgent.graph.get_state(thread)
+        # Get the session state
+        state = get_thread_state(thread)
 
-            # Extract vector_store_paths and other necessary information from state
-            vector_store_paths = state.values.get("vector_store_paths", [])
-            folder_name = state.values.get("subject")
-            current_week = state.values.get("current_week")
+        # Extract vector_store_paths and other necessary information from state
+        vector_store_paths = state.values.get("vector_store_paths", [])
+        folder_name = state.values.get("subject")
+        current_week = state.values.get("current_week")
 
+        logging.info(
+            f"Recovery details: folder={folder_name}, current_week={current_week}, paths={vector_store_paths}"
+        )
+
+        if vector_store_paths:
+            # Recreate the vector store from the saved paths
+            _, loaded = app.vector_stores.load(
+                thread_id, vector_store_paths, load_vector_store
+            )
+            record_recovery(loaded, known_thread)
+            logging.info(f"Successfully recovered vector store for thread {thread_id}")
+        elif folder_name and current_week:
+            # If paths not available but we have folder name and week, try to rebuild paths
             logging.info(
-                f"Recovery details: folder={folder_name}, current_week={current_week}, paths={vector_store_paths}"
+                f"No vector store paths available. Rebuilding from folder and week..."
             )
+            rebuilt_vector_store_paths = []
+
+            for week in range(1, int(current_week) + 1):
+                vector_store_path_week = os.path.join(
+                    "vector_store", folder_name, str(week)
+                )
+                if os.path.exists(vector_store_path_week):
+                    rebuilt_vector_store_paths.append(vector_store_path_week)
 
-            if vector_store_paths:
-                # Recreate the vector store from the saved paths
-                vector_store = load_vector_store(vector_store_paths)
-                app.vector_stores[thread_id] = vector_store
-                update_vector_store_access_time(thread_id)
-                logging.info(
-                    f"Successfully recovered vector store for thread {thread_id}"
+            if rebuilt_vector_store_paths:
+                _, loaded = app.vector_stores.load(
+                    thread_id, rebuilt_vector_store_paths, load_vector_store
                 )
-            elif folder_name and current_week:
-                # If paths not available but we have folder name and week, try to rebuild paths
-                logging.info(
-                    f"No vector store paths available. Rebuilding from folder and week..."
+                record_recovery(loaded, known_thread)
+
+                # Update the state with the rebuilt paths
+                aiTutorAgent.graph.update_state(
+                    thread, {"vector_store_paths": rebuilt_vector_store_paths}
                 )
-                rebuilt_vector_store_paths = []
-
-                for week in range(1, int(current_week) + 1):
-                    vector_store_path_week = os.path.join(
-                        "vector_store", folder_name, str(week)
-                    )
-                    if os.path.exists(vector_store_path_week):
-                        rebuilt_vector_store_paths.append(vector_store_path_week)
-
-                if rebuilt_vector_store_paths:
-                    vector_store = load_vector_store(rebuilt_vector_store_paths)
-                    app.vector_stores[thread_id] = vector_store
-                    update_vector_store_access_time(thread_id)
-
-                    # Update the state with the rebuilt paths
-                    aiTutorAgent.graph.update_state(
-                        thread, {"vector_store_paths": rebuilt_vector_store_paths}
-                    )
-                    logging.info(
-                        f"Successfully rebuilt vector store for thread {thread_id}"
-                    )
-                else:
-                    logging.error(f"Could not find any vector store paths for recovery")
+                logging.info(f"Successfully rebuilt vector store for thread {thread_id}")
             else:
-                logging.error(f"Insufficient information for vector store recovery")
+                VECTOR_STORE_RECOVERIES.labels(result="failed").inc()
+                logging.error(f"Could not find any vector store paths for recovery")
+        else:
+            VECTOR_STORE_RECOVERIES.labels(result="failed").inc()
+            logging.error(f"Insufficient information for vector store recovery")
+    except Exception as e:
+        VECTOR_STORE_RECOVERIES.labels(result="failed").inc()
+        logging.error(f"Vector store recovery failed: {str(e)}")
+
+
+async def run_tutor_graph(graph_input, thread):
+    """
+    Run the tutor graph until the next interrupt.
+
+    The nodes look up the session vector store through the Flask app context,
+    so it is pushed for the duration of the run. The checkpoints of the run are
+    buffered by the checkpointer and durably written once it stops.
+
+    Returns:
+        tuple: (graph response, state snapshot after the run)
+    """
+    graph = await init_async_graph()
+    # resuming an archived thread needs its checkpoints back first
+    await asyncio.to_thread(
+        checkpoint_archive.restore_if_archived, thread["configurable"]["thread_id"]
+    )
+    with app.app_context():
+        try:
+            response = await graph.ainvoke(graph_input, thread)
+        finally:
+            # single durable write at the interrupt boundary
+            await graph.checkpointer.aflush(thread)
+        state = await graph.aget_state(thread)
+
+    await asyncio.to_thread(
+        thread_registry.record_activity,
+        thread["configurable"]["thread_id"],
+        len(state.values.get("messages", [])),
+        state.next[0] if state.next else "",
+    )
+    return response, state
+
+
+class TutoringMessage(BaseModel):
+    role: str
+    content: Union[str, List[Any]]
+
+
+class TutoringResponse(BaseModel):
+    """Body of the /start-tutoring and /continue-tutoring responses"""
+
+    thread_id: str
+    # messages after the client's message_cursor
+    messages: List[TutoringMessage]
+    # number of messages of the session, sent back by the client with the next turn
+    message_cursor: int
+    next_state: str
+    answer_trials: int = 0
+    current_task_index: int = 0
+    task_count: int = 0
+    # full graph state, only for the debug view of the client
+    state: Optional[Any] = None
+
+
+def tutoring_response(
+    response, thread_id, state, message_cursor=0, include_state=False
+) -> TutoringResponse:
+    """
+    Build the /start-tutoring and /continue-tutoring response.
+
+    Args:
+        response (dict): The graph response
+        thread_id (str): The thread ID
+        state (StateSnapshot): The state after the run
+        message_cursor (int): Number of messages the client already has
+        include_state (bool): Whether to include the full state (debug)
+
+    Returns:
+        TutoringResponse: The response
+    """
+    messages = response["messages"]
+    message_cursor = min(max(int(message_cursor or 0), 0), len(messages))
+    return TutoringResponse(
+        thread_id=str(thread_id),
+        messages=messages_to_json(messages[message_cursor:]),
+        message_cursor=len(messages),
+        next_state=state.next[0] if state.next else "",
+        answer_trials=state.values.get("answer_trials", 0),
+        current_task_index=state.values.get("current_task_index", 0),
+        task_count=len(state.values.get("task_breakdown", [])),
+        state=state_to_json(state) if include_state else None,
+    )
+
+
+def encode_tutoring_response(tutoring_response: TutoringResponse, endpoint) -> bytes:
+    """Encode the response with orjson and record its size"""
+    body = orjson.dumps(tutoring_response.model_dump(exclude_none=True))
+    RESPONSE_BYTES.labels(endpoint=endpoint).observe(len(body))
+    return body
+
+
+def build_graph_artifact():
+    """
+    Serialize the graph topology once; the compiled graph never changes at runtime.
+
+    Returns:
+        tuple: (JSON body of /get-graph, content hash used as ETag)
+    """
+    graph_data = get_graph_data(aiTutorAgent.graph.get_graph())
+    body = orjson.dumps({"graph": graph_data}, option=orjson.OPT_SORT_KEYS)
+    return body, hashlib.sha256(body).hexdigest()[:16]
+
+
+GRAPH_JSON, GRAPH_ETAG = build_graph_artifact()
+GRAPH_IMAGE_PATH = os.path.join("graph", f"graph-{GRAPH_ETAG}.png")
+
+
+graph_image_lock = threading.Lock()
+
+
+def render_graph_image():
+    """
+    Render the graph topology to graph/graph-<hash>.png, once per topology.
+    The file is named by content hash, so restarts and workers reuse it.
+
+    Returns:
+        bool: Whether the image exists
+    """
+    with graph_image_lock:
+        if os.path.exists(GRAPH_IMAGE_PATH):
+            return True
+        os.makedirs(os.path.dirname(GRAPH_IMAGE_PATH), exist_ok=True)
+        try:
+            aiTutorAgent.graph.get_graph().draw_mermaid_png(
+                output_file_path=GRAPH_IMAGE_PATH
+            )
+            logging.info(f"Graph image rendered to {GRAPH_IMAGE_PATH}")
+            return True
         except Exception as e:
-            logging.error(f"Vector store recovery failed: {str(e)}")
+            logging.error(f"Error in draw_mermaid_png: {str(e)}")
+            return False
 
+
+@app.route("/start-tutoring", methods=["POST"])
+def start_tutoring():
     try:
-        response = aiTutorAgent.graph.invoke(Command(resume=student_response), thread)
+        thread_id, thread, initial_input = prepare_tutoring_session(request.json)
+    except TutoringRequestError as e:
+        return jsonify({"error": str(e)}), e.status_code
 
-        response_json = messages_to_json(response["messages"])
-        state = aiTutorAgent.graph.get_state(thread)
-        next_state = state.next[0] if state.next else ""
+    response, state = async_runner.run(run_tutor_graph(initial_input, thread))
 
-        return jsonify(
-            {
-                "messages": response_json,
-                "thread_id": thread_id,
-                "state": state_to_json(state),
-                "next_state": next_state,
-            }
+    # print(f"State: {state_to_json(state)}")
+    # print(f"jsonify: {jsonify( {"state": state_to_json(state)})}")
+
+    body = encode_tutoring_response(
+        tutoring_response(
+            response, thread_id, state, include_state=bool(request.json.get("debug"))
+        ),
+        "/start-tutoring",
+    )
+    return Response(body, mimetype="application/json")
+
+
+# API endpoint to handle student responses and continue the session
+@app.route("/continue-tutoring", methods=["POST"])
+def continue_tutoring():
+    data = request.json
+    student_response = data.get("student_response", "")
+    thread_id = data.get("thread_id")
+    student_id = data.get("student_id")
+    thread = {"configurable": {"thread_id": str(thread_id), "user_id": str(student_id)}}
+
+    recover_vector_store(thread_id, thread)
+
+    try:
+        response, state = async_runner.run(
+            run_tutor_graph(Command(resume=student_response), thread)
+        )
+
+        body = encode_tutoring_response(
+            tutoring_response(
+                response,
+                thread_id,
+                state,
+                message_cursor=data.get("message_cursor"),
+                include_state=bool(data.get("debug")),
+            ),
+            "/continue-tutoring",
         )
+        return Response(body, mimetype="application/json")
     except Exception as e:
         logging.error(f"Error in continue_tutoring: {str(e)}")
         return (
@@ -452,10 +719,6 @@ def continue_tutoring():
 
 @app.route("/save-session", methods=["POST"])
 def save_session_history():
-    SESSION_HISTORY_DIR = "saved_session_history"
-    if not os.path.exists(SESSION_HISTORY_DIR):
-        os.makedirs(SESSION_HISTORY_DIR)
-
     try:
         data = request.json
         thread_id = data.get("thread_id")
@@ -465,7 +728,7 @@ def save_session_history():
         thread = {
             "configurable": {"thread_id": str(thread_id), "user_id": str(student_id)}
         }
-        state = aiTutorAgent.graph.get_state(thread)
+        state = get_thread_state(thread)
         message_history = state.values["messages"]
         subject = state.values["subject"]
         start_time = state.values["start_time"]
@@ -477,23 +740,30 @@ def save_session_history():
         logging.info(f"Date Time: {time_stamp}")
 
         # Create a filename using the provided date_time and topic_code
-        filename = f"{time_stamp}_{topic_code}_{student_id}.txt"
-        filepath = os.path.join(SESSION_HISTORY_DIR, filename)
-
-        with open(filepath, "w", encoding="utf-8") as file:
-            file.write(f"Subject: {subject}\n")
-            file.write(f"Start Time: {start_time}\n")
-            file.write(f"End Time: {end_time}\n")
-            file.write("-" * 80 + "\n")
-
-            for message in message_history:
-                role = (
-                    "AI Message" if isinstance(message, AIMessage) else "Human Message"
-                )
-                header = f" {role} "
-                separator = "=" * ((80 - len(header)) // 2)
-                file.write(f"{separator}{header}{separator}\n")
-                file.write(f"{message.content}\n\n")
+        filename = f"{time_stamp}_{topic_code}_{student_id}{SESSION_EXPORT_EXTENSION}"
+
+        # structured export, the text transcript is rendered on download
+        content = session_bytes(
+            {
+                "thread_id": str(thread_id),
+                "student_id": str(student_id),
+                "course_code": topic_code,
+                "subject": subject,
+                "start_time": start_time,
+                "end_time": end_time,
+            },
+            message_history,
+        )
+        # appended to the session archive, see SessionArchive
+        session_store.save(
+            filename,
+            content,
+            student_id,
+            topic_code,
+            time_stamp,
+            thread_id=str(thread_id),
+            subject=subject,
+        )
 
         # Return session summary data in response
         summary = {
@@ -509,7 +779,7 @@ def save_session_history():
             ],
         }
         return jsonify(
-            {"message": f"Session history saved to {filepath}", "summary": summary}
+            {"message": f"Session history saved as {filename}", "summary": summary}
         )
 
     except Exception as e:
@@ -519,27 +789,30 @@ def save_session_history():
 
 @app.route("/download-session", methods=["POST"])
 def download_session_history():
-    SESSION_HISTORY_DIR = "saved_session_history"
     try:
         data = request.json
         thread_id = data.get("thread_id")
         student_id = data.get("student_id")
         topic_code = data.get("topic_code")  # Updated field name
         time_stamp = data.get("time_stamp")  # New field for date and time
-        filename = f"{time_stamp}_{topic_code}_{student_id}.txt"
+        base_name = f"{time_stamp}_{topic_code}_{student_id}"
 
         logging.info(f"student id: {student_id}")
         logging.info(f"topic code: {topic_code}")
         logging.info(f"time stamp: {time_stamp}")
-        logging.info(f"downloading session history: {filename}")
-        # Use the latest file (if multiple matches)
-        file_path = os.path.join(SESSION_HISTORY_DIR, filename)
+        logging.info(f"downloading session history: {base_name}")
+        session = session_store.get(base_name + SESSION_EXPORT_EXTENSION) or session_store.get(
+            f"{base_name}.txt"  # saved before the structured export
+        )
+        if session is None:
+            return jsonify({"error": "Session history not found"}), 404
+        _, content = next(session_store.read_sessions([session]))
 
         return send_file(
-            file_path,
+            io.BytesIO(read_transcript(session["filename"], content).encode("utf-8")),
             mimetype="text/plain",
             as_attachment=True,
-            download_name=os.path.basename(file_path),
+            download_name=f"{base_name}.txt",
         )
     except Exception as e:
         logging.error(f"Error in download_session_history: {str(e)}")
@@ -550,10 +823,49 @@ def download_session_history():
 
 
 @app.route("/get-graph", methods=["GET"])
+def get_graph():
+    response = Response(GRAPH_JSON, mimetype="application/json")
+    response.set_etag(GRAPH_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    # 304 Not Modified if the client has this version
+    return response.make_conditional(request)
+
+
+@app.route("/get-graph-image", methods=["GET"])
 def get_graph_image():
-    graph = aiTutorAgent.graph.get_graph()
-    graph_data = get_graph_data(graph)
-    return jsonify({"graph": graph_data})
+    # the client has this version, no need to render it
+    if GRAPH_ETAG in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(GRAPH_ETAG)
+        return response
+    # rendered by the first request (mermaid.ink), not at import
+    if not render_graph_image():
+        return jsonify({"error": "Graph image could not be rendered"}), 503
+    return send_file(GRAPH_IMAGE_PATH, mimetype="image/png", etag=GRAPH_ETAG, max_age=3600, conditional=True)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    data, content_type = render_metrics()
+    return Response(data, content_type=content_type)
+
+
+def health_response(mongo_health):
+    """Body and status code of /health"""
+    status_code = 200 if mongo_health["status"] == "ok" else 503
+    return {
+        "status": mongo_health["status"],
+        "mongodb": mongo_health,
+        "vector_store_cache": app.vector_stores.stats(),
+    }, status_code
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    # the ping runs on the event loop, it does not hold a pooled connection of the worker
+    body, status_code = health_response(async_runner.run(mongo.health_check(), 10))
+    return jsonify(body), status_code
 
 
 @app.route("/update-duration", methods=["PUT"])
@@ -564,6 +876,7 @@ def update_duration():
     print(f"duration_minutes: {duration_minutes}")
     print(f"thread_id: {thread_id}")
     try:
+        checkpoint_archive.restore_if_archived(str(thread_id))
         aiTutorAgent.extend_duration(str(thread_id), int(duration_minutes))
         return jsonify({"message": "Duration updated successfully"})
     except Exception as e:
@@ -571,7 +884,6 @@ def update_duration():
         return jsonify({"error": "Failed to update duration", "details": str(e)}), 500
 
 
-SESSION_HISTORY_DIR = "saved_session_history"
 COURSE_MATERIAL_DIR = "course_material"
 
 
@@ -583,31 +895,9 @@ def get_sessions():
         date = data.get("date")
         course_code = data.get("course_code")
 
-        sessions = []
-
-        for filename in os.listdir(SESSION_HISTORY_DIR):
-            if filename.endswith(".txt"):
-                # Use regex to extract parts of the filename
-                match = re.match(r"(\d{8})_(\d{4})_(.+)_(.+)\.txt", filename)
-                if match:
-                    file_date, file_time, file_course, file_student_id = match.groups()
-
-                    # Apply filters (only check fields that are provided)
-                    matches_student_id = not student_id or file_student_id == student_id
-                    matches_date = not date or file_date == date
-                    matches_course_code = not course_code or file_course == course_code
-
-                    if matches_student_id and matches_date and matches_course_code:
-                        sessions.append(
-                            {
-                                "filename": filename,
-                                "student_id": file_student_id,
-                                "course_code": file_course,
-                                "date": file_date,
-                                "time": file_time,
-                                "filepath": os.path.join(SESSION_HISTORY_DIR, filename),
-                            }
-                        )
+        sessions = session_store.find(
+            student_id=student_id, course_code=course_code, date=date
+        )
 
         return jsonify({"sessions": sessions})
 
@@ -616,12 +906,23 @@ def get_sessions():
         return jsonify({"error": "Failed to fetch sessions", "details": str(e)}), 500
 
 
+def submit_analysis(kind, params):
+    """
+    Submit an analysis job and return it: 200 with the result if an identical
+    analysis completed recently, 202 while it runs (poll /analysis-jobs/<job_id>).
+    """
+    # a new saved session changes the count, so it gets a new analysis
+    params = {**params, "session_count": session_aggregates.total(**params)}
+    job = analysis_jobs.submit(kind, params)
+    status_code = 200 if job["status"] == analysis_jobs.DONE else 202
+    return jsonify(analysis_jobs.to_json(job)), status_code
+
+
 @app.route("/general-analysis", methods=["POST"])
 def general_analysis():
     try:
         # Perform general analysis (e.g., analyze all sessions)
-        analysis_result = aiTutorAgent.general_analysis()
-        return jsonify(analysis_result)
+        return submit_analysis("general", {})
     except Exception as e:
         logging.error(f"Error in general_analysis: {str(e)}")
         return (
@@ -640,8 +941,7 @@ def student_analysis():
             return jsonify({"error": "Student ID is required"}), 400
 
         # Perform student-specific analysis
-        analysis_result = aiTutorAgent.student_analysis(student_id)
-        return jsonify(analysis_result)
+        return submit_analysis("student", {"student_id": str(student_id)})
     except Exception as e:
         logging.error(f"Error in student_analysis: {str(e)}")
         return (
@@ -660,8 +960,7 @@ def course_analysis():
             return jsonify({"error": "Course Code is required"}), 400
 
         # Perform course-specific analysis
-        analysis_result = aiTutorAgent.course_analysis(course_code)
-        return jsonify(analysis_result)
+        return submit_analysis("course", {"course_code": str(course_code)})
     except Exception as e:
         logging.error(f"Error in course_analysis: {str(e)}")
         return (
@@ -680,8 +979,7 @@ def day_analysis():
             return jsonify({"error": "Date is required"}), 400
 
         # Perform day-specific analysis
-        analysis_result = aiTutorAgent.day_analysis(date)
-        return jsonify(analysis_result)
+        return submit_analysis("day", {"date": str(date)})
     except Exception as e:
         logging.error(f"Error in day_analysis: {str(e)}")
         return (
@@ -690,36 +988,53 @@ def day_analysis():
         )
 
 
+@app.route("/student-profile", methods=["POST"])
+def get_student_profile():
+    try:
+        data = request.json
+        student_id = data.get("student_id")
+
+        if not student_id:
+            return jsonify({"error": "Student ID is required"}), 400
+
+        profile = student_profiles.get(student_id)
+        if profile is None:
+            return jsonify({"error": "Student profile not found"}), 404
+        return jsonify({"profile": profile})
+    except Exception as e:
+        logging.error(f"Error in get_student_profile: {str(e)}")
+        return (
+            jsonify({"error": "Failed to fetch student profile", "details": str(e)}),
+            500,
+        )
+
+
+@app.route("/analysis-jobs/<job_id>", methods=["GET"])
+def get_analysis_job(job_id):
+    try:
+        job = analysis_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Analysis job not found"}), 404
+        return jsonify(analysis_jobs.to_json(job))
+    except Exception as e:
+        logging.error(f"Error in get_analysis_job: {str(e)}")
+        return (
+            jsonify({"error": "Failed to fetch analysis job", "details": str(e)}),
+            500,
+        )
+
+
 @app.route("/statistics", methods=["GET"])
 def get_statistics():
     try:
-        # Check if directories exist
-        if not os.path.exists(SESSION_HISTORY_DIR):
-            return (
-                jsonify({"error": f"Directory not found: {SESSION_HISTORY_DIR}"}),
-                500,
-            )
         if not os.path.exists(COURSE_MATERIAL_DIR):
             return (
                 jsonify({"error": f"Directory not found: {COURSE_MATERIAL_DIR}"}),
                 500,
             )
 
-        # Count total number of sessions
-        session_files = [
-            name for name in os.listdir(SESSION_HISTORY_DIR) if name.endswith(".txt")
-        ]
-        total_sessions = len(session_files)
-
-        # Count total number of unique students (safe extraction)
-        student_ids = set()
-        for filename in session_files:
-            parts = filename.split("_")
-            if len(parts) > 3:  # Ensure there are enough parts before accessing index 3
-                student_id = parts[3].split(".")[0]  # Extract student ID
-                student_ids.add(student_id)
-
-        total_students = len(student_ids)
+        total_sessions = session_aggregates.total()
+        total_students = session_aggregates.distinct_count("student_id")
 
         # Count total number of courses
         course_dirs = [
@@ -790,6 +1105,40 @@ def get_course_material():
         return jsonify({"error": str(e)}), 500
 
 
+def conversation_metadata(thread):
+    """Listing fields of a session registry document"""
+    return {
+        "thread_id": thread["thread_id"],
+        "subject": thread.get("subject", "Unknown"),
+        "created_at": thread["created_at"].isoformat(),
+        "last_activity": (
+            thread["last_activity"].isoformat() if thread.get("last_activity") else None
+        ),
+        "message_count": thread.get("message_count", 0),
+        "next_state": thread.get("next_state", ""),
+    }
+
+
+def thread_messages_page(thread_id, after=-1, limit=None):
+    """
+    Read a page of the messages of a thread.
+
+    The messages are read from the message collection of the checkpointer;
+    sessions checkpointed before messages were stored separately fall back to
+    the full state.
+
+    Returns:
+        list: (position, message) pairs
+    """
+    page = memory.list_messages(thread_id, after_seq=after, limit=limit)
+    if page:
+        return page
+
+    state = get_thread_state({"configurable": {"thread_id": thread_id}})
+    messages = list(enumerate(state.values.get("messages", [])))[after + 1 :]
+    return messages[:limit] if limit else messages
+
+
 @app.route("/get-student-chat-history", methods=["POST"])
 def get_student_chat_history():
     try:
@@ -798,74 +1147,93 @@ def get_student_chat_history():
         if not student_id:
             return jsonify({"error": "Student ID is required"}), 400
 
-        # These values need to match what was used in __init__.py
-        MONGODB_DB = os.getenv("MONGODB_DB", "ai_tutor_db")
-        MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "agent_checkpoints")
+        page_size = min(max(int(data.get("page_size", 20)), 1), 100)
+        # metadata only by default, the messages are fetched with /get-thread-messages
+        include_messages = bool(data.get("include_messages", False))
 
-        db = mongodb_client[MONGODB_DB]
-        checkpoints_collection = db[MONGODB_COLLECTION]
-
-        # Get distinct thread_ids from MongoDB
-        thread_ids = checkpoints_collection.distinct("thread_id")
+        # sessions of the student, newest first, from the indexed thread registry
+        try:
+            threads, next_cursor = thread_registry.list_for_student(
+                str(student_id), cursor=data.get("cursor"), limit=page_size
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         conversations = []
+        for thread in threads:
+            conversation = conversation_metadata(thread)
+            if include_messages:
+                messages = [
+                    message for _, message in thread_messages_page(thread["thread_id"])
+                ]
+                conversation["messages"] = messages_to_json(messages)
+            conversations.append(conversation)
 
-        # For each thread_id, check if it belongs to this student
-        for thread_id in thread_ids:
-            try:
-                # Create thread config
-                thread_config = {
-                    "configurable": {"thread_id": thread_id, "user_id": str(student_id)}
-                }
+        return jsonify(
+            {
+                "student_id": student_id,
+                "conversation_count": thread_registry.count_for_student(
+                    str(student_id)
+                ),
+                "conversations": conversations,
+                "next_cursor": next_cursor,
+            }
+        )
 
-                # Try to get state - this will succeed if the thread belongs to this user
-                # Otherwise, it will raise an exception
-                state = aiTutorAgent.graph.get_state(thread_config)
-
-                stored_user_id = state.metadata.get("user_id")
-                # print(f"stored_user_id: {stored_user_id}")
-                # print(f"student_id: {student_id}")
-                if stored_user_id != student_id:
-                    # Skip this thread – it doesn't belong to the given student
-                    continue
-
-                # Extract conversation information
-                messages = state.values.get("messages", [])
-
-                conversation = {
-                    "thread_id": thread_id,
-                    "subject": state.values.get("subject", "Unknown"),
-                    "created_at": state.created_at,
-                    "messages": messages_to_json(messages),
-                    "message_count": len(messages),
-                }
+    except Exception as e:
+        logging.error(f"Error in get_user_chat_history: {str(e)}", exc_info=True)
+        return (
+            jsonify({"error": "Failed to retrieve chat history", "details": str(e)}),
+            500,
+        )
 
-                # Add additional metadata if available
-                if state.metadata:
-                    conversation["step"] = state.metadata.get("step", 0)
 
-                conversations.append(conversation)
+@app.route("/get-thread-messages", methods=["POST"])
+def get_thread_messages():
+    """
+    Messages of one session of a student, in pages.
 
-            except Exception as e:
-                # This thread doesn't belong to this user
-                logging.debug(f"Thread {thread_id} retrival error: {str(e)}")
-                continue
+    Request body: thread_id, student_id, cursor (position of the last message
+    received, omit for the first page), page_size
+    """
+    try:
+        data = request.json
+        thread_id = data.get("thread_id")
+        student_id = data.get("student_id")
+        if not thread_id or not student_id:
+            return jsonify({"error": "Thread ID and student ID are required"}), 400
 
-        # Sort conversations by creation date (newest first)
-        conversations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+        thread = thread_registry.get(str(thread_id))
+        if not thread or thread.get("student_id") != str(student_id):
+            return jsonify({"error": "Conversation not found"}), 404
+
+        page_size = min(max(int(data.get("page_size", 50)), 1), 200)
+        cursor = data.get("cursor")
+        after = int(cursor) if cursor is not None else -1
+
+        # one extra message tells whether there is a next page
+        page = thread_messages_page(thread_id, after=after, limit=page_size + 1)
+        next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_cursor = page[-1][0]
+
+        messages = messages_to_json([message for _, message in page])
+        for (position, _), message in zip(page, messages):
+            message["position"] = position
 
         return jsonify(
             {
-                "student_id": student_id,
-                "conversation_count": len(conversations),
-                "conversations": conversations,
+                "thread_id": thread_id,
+                "messages": messages,
+                "next_cursor": next_cursor,
             }
         )
 
     except Exception as e:
-        logging.error(f"Error in get_user_chat_history: {str(e)}", exc_info=True)
+        logging.error(f"Error in get_thread_messages: {str(e)}", exc_info=True)
         return (
-            jsonify({"error": "Failed to retrieve chat history", "details": str(e)}),
+            jsonify({"error": "Failed to retrieve messages", "details": str(e)}),
             500,
         )
 
@@ -1020,86 +1388,23 @@ def upload_file():
         return jsonify({"error": "Failed to upload file"}), 500
 
 
-# Function to update access time for a vector store
-def update_vector_store_access_time(thread_id):
-    """Update the last access time for a thread's vector store"""
-    app.vector_store_access_times[thread_id] = datetime.now()
-
-
-# Function to clean up expired vector stores
-def cleanup_vector_stores():
-    """Remove vector stores for expired sessions to prevent memory leaks"""
-    if not hasattr(app, "vector_store_access_times"):
-        return
-
-    # First clean up based on access time
-    current_time = datetime.now()
-    expired_time = current_time - timedelta(
-        hours=2
-    )  # Sessions older than 2 hours expire
-
-    to_remove = []
-    for thread_id, last_access in app.vector_store_access_times.items():
-        if last_access < expired_time:
-            to_remove.append(thread_id)
-
-    for thread_id in to_remove:
-        if thread_id in app.vector_stores:
-            del app.vector_stores[thread_id]
-        if thread_id in app.vector_store_access_times:
-            del app.vector_store_access_times[thread_id]
-
-    if to_remove:
-        logging.info(f"Cleaned up {len(to_remove)} expired vector stores based on time")
-
-    # Then check for orphaned vector stores that might exist in app.vector_stores
-    # but not be accessible in MongoDB (thread no longer exists)
-    orphaned = []
-
-    # Collect all thread_ids from MongoDB
-    try:
-        MONGODB_DB = os.getenv("MONGODB_DB", "ai_tutor_db")
-        MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "agent_checkpoints")
-
-        db = mongodb_client[MONGODB_DB]
-        checkpoints_collection = db[MONGODB_COLLECTION]
-
-        # Get existing thread IDs from MongoDB
-        existing_thread_ids = set(checkpoints_collection.distinct("thread_id"))
-
-        # Find thread IDs that have vector stores but don't exist in MongoDB
-        for thread_id in list(app.vector_stores.keys()):
-            if thread_id not in existing_thread_ids:
-                orphaned.append(thread_id)
-
-        # Remove orphaned vector stores
-        for thread_id in orphaned:
-            if thread_id in app.vector_stores:
-                del app.vector_stores[thread_id]
-            if thread_id in app.vector_store_access_times:
-                del app.vector_store_access_times[thread_id]
-
-        if orphaned:
-            logging.info(f"Cleaned up {len(orphaned)} orphaned vector stores")
-    except Exception as e:
-        logging.error(f"Error checking for orphaned vector stores: {str(e)}")
-
-
-# Set up scheduled cleanup task to run every hour
-def scheduled_cleanup():
-    """Run cleanup tasks periodically"""
+# Set up scheduled archival of the stale threads to run every hour
+def scheduled_archival():
+    """Archive the abandoned and finished threads periodically"""
     while True:
         try:
             time.sleep(3600)  # Sleep for 1 hour
-            with app.app_context():
-                cleanup_vector_stores()
+            checkpoint_archive.archive_stale_threads(
+                timedelta(hours=THREAD_ARCHIVE_AFTER_HOURS),
+                timedelta(hours=FINISHED_THREAD_ARCHIVE_AFTER_HOURS),
+            )
         except Exception as e:
-            logging.error(f"Error in scheduled cleanup: {str(e)}")
+            logging.error(f"Error in scheduled archival: {str(e)}")
 
 
-# Start the cleanup thread
-cleanup_thread = threading.Thread(target=scheduled_cleanup, daemon=True)
-cleanup_thread.start()
+# Start the archival thread
+archival_thread = threading.Thread(target=scheduled_archival, daemon=True)
+archival_thread.start()
 
 # Run the Flask app
 if __name__ == "__main__":
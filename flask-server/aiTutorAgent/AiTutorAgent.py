@@ -1,6 +1,7 @@
 # Import LangChain components
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import json
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain.prompts import PromptTemplate
 import logging
 
@@ -11,22 +12,19 @@ from langchain.memory import ConversationBufferMemory
 from langchain_core.runnables import RunnableSequence
 from langgraph.graph.message import add_messages
 from langchain_core.messages import AnyMessage, HumanMessage, AIMessage, ChatMessage
-import matplotlib
-
-matplotlib.use("Agg")  # Use the 'Agg' backend
-import matplotlib.pyplot as plt
-import pandas as pd
 
 
 # from langgraph.checkpoint.sqlite import SqliteSaver
 # from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from langgraph.graph import START, END, StateGraph
+from langgraph.config import get_config
 from langgraph.types import Command, interrupt
 
 from typing_extensions import TypedDict, Literal
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from datetime import timedelta, datetime
 from langchain.schema import Document
 from langchain.vectorstores.base import VectorStore
@@ -34,10 +32,26 @@ from rag import rag
 import logging
 
 from functools import wraps
-from typing import Callable, TypeVar, ParamSpec, Any
+from typing import Awaitable, Callable, TypeVar, ParamSpec, Any
 
 from flask import current_app
 from langchain_core.runnables.config import RunnableConfig
+from pydantic import BaseModel, Field
+import time
+
+from aiTutorAgent.chart_renderer import ChartRenderer, chart
+from aiTutorAgent.conversation_memory import ConversationMemory
+from aiTutorAgent.session_analyzer import SessionAnalyzer
+from aiTutorAgent.session_store import SessionStore
+from aiTutorAgent.student_profiles import StudentProfiles
+from telemetry import (
+    LLM_ANSWER_ATTEMPTS,
+    LLM_RETRIES,
+    PROMPT_TOKENS_ESTIMATE,
+    VECTOR_SEARCH_DURATION,
+    span,
+    traced_node,
+)
 
 
 class AgentState(TypedDict):
@@ -54,6 +68,19 @@ class AgentState(TypedDict):
     task_breakdown: List[str]
     current_task_index: int  # index of the current task
     task_solving_start_index: int  # index of the first task that the student is solving
+    conversation_summary: str  # rolling summary of the messages outside the window
+    summarized_message_count: int  # number of messages covered by the rolling summary
+
+
+class QuestionAnswer(BaseModel):
+    """Structured output of the question answering LLM call"""
+
+    answer: str = Field(
+        description="Detailed answer to the student's question, with examples"
+    )
+    testing_question: str = Field(
+        description="Exam-style question assessing the student's understanding, without its answer"
+    )
 
 
 class AiTutorAgent:
@@ -62,13 +89,32 @@ class AiTutorAgent:
     # before the system provides a complete explanation
     MAX_ANSWER_ATTEMPTS: int = 3
 
+    # Maximum number of LLM calls to get a well-formed answer and testing question
+    MAX_LLM_ANSWER_ATTEMPTS: int = 3
+
     def __init__(
-        self, GOOGLE_MODEL_NAME: str, GOOGLE_API_KEY: str, memory: MemorySaver
+        self,
+        llm: BaseChatModel,
+        memory: MemorySaver,
+        session_store: Optional[SessionStore] = None,
+        session_analyzer: Optional[SessionAnalyzer] = None,
+        chart_renderer: Optional[ChartRenderer] = None,
+        student_profiles: Optional[StudentProfiles] = None,
     ):
-        self.llm = ChatGoogleGenerativeAI(
-            model=GOOGLE_MODEL_NAME, google_api_key=GOOGLE_API_KEY
-        )
+        # chat model from aiTutorAgent.llm_providers.create_llm
+        self.llm = llm
+        # saved sessions, read by the analyses
+        self.session_store = session_store
+        # map-reduce summaries of the saved sessions
+        self.session_analyzer = session_analyzer
+        # content-addressed charts of the analyses
+        self.chart_renderer = chart_renderer or ChartRenderer()
+        # learning-progress profiles, updated by the per-turn events of the graph
+        self.student_profiles = student_profiles
+        # single call returning both the answer and the testing question
+        self.question_answer_llm = self.llm.with_structured_output(QuestionAnswer)
         self.memory = memory
+        self.conversation_memory = ConversationMemory()
         self.vector_store = None  # Store as instance variable as it cannot store a state, not serializable
 
         @property
@@ -117,7 +163,11 @@ class AiTutorAgent:
         builder.add_node("task_solving_summary", self.task_solving_summary)
 
         builder.add_edge(START, "create_summary")
+        self.builder = builder
 
+        # The nodes are async, so the graph is executed with `async_graph.ainvoke`.
+        # `graph` shares the same checkpoints and is used to read and update the
+        # state from synchronous code (`get_state`, `update_state`).
         self.graph = builder.compile(
             checkpointer=memory,
             # interrupt_before=[
@@ -126,6 +176,7 @@ class AiTutorAgent:
             #     "student_answer_if_any_further_question",
             # ],
         )
+        self.async_graph = None
 
         self.SUMMARY_PROMPT = """
             Generate a concise summary of the key topics present in the provided titles. 
@@ -196,7 +247,8 @@ class AiTutorAgent:
             4. Question is at the end of the conversation.
             
             5. **Output Formatting**:
-            - Present your **answer to student's question** and the **testing question** to the student in clear, student-friendly language.
+            - Put your **answer to student's question** in the `answer` field and the **testing question** in the `testing_question` field.
+            - Use clear, student-friendly language in both fields.
             - Do **not** include  answer to the testing question in your response to the student.
 
                 ---
@@ -306,6 +358,20 @@ class AiTutorAgent:
 
             """
 
+        self.STUDENT_PROFILE_PROMPT = """
+            The following is the learning-progress profile of a student: counts of
+            questions asked (per topic), answers (correct / wrong), hints and full
+            explanations needed, completed sessions and minutes spent, per subject,
+            and the questions recently answered wrong.
+
+            {profile}
+
+            Provide a detailed summary of:
+            1. Key insights for this student.
+            2. Performance trends.
+            3. Areas of improvement.
+        """
+
         self.SESSION_SUMMARY_PROMPT = """
                 You are an AI Tutor.
 
@@ -338,6 +404,21 @@ class AiTutorAgent:
                 {messages}
             """
 
+        self.ROLLING_SUMMARY_PROMPT = """
+            You are an AI Tutor.
+
+            **Instructions**:
+            Update the summary of the tutoring conversation with the new messages.
+            Keep the questions asked, the key concepts explained and how the student performed.
+            Keep the summary concise, no more than 200 words.
+
+            **Current Summary**:
+            {summary}
+
+            **New Messages**:
+            {messages}
+        """
+
         self.QUESTION_BREAKDOWN_PROMPT = """
             You are an AI Tutor.
 
@@ -474,71 +555,70 @@ class AiTutorAgent:
 
         """
 
-    def general_analysis(self):
-        session_files = self._get_all_session_files()
-        combined_content = self._combine_session_files(session_files)
-        return self._generate_analysis("General Analysis", combined_content)
+    # the analyses report their progress to an optional callback (AnalysisJobs)
+    def general_analysis(self, progress: Optional[Callable[[str], None]] = None):
+        sessions = self._get_all_sessions()
+        return self._analyze_sessions("General Analysis", sessions, progress)
 
-    def student_analysis(self, student_id: str):
-        session_files = self._get_session_files_by_student(student_id)
-        combined_content = self._combine_session_files(session_files)
-        return self._generate_analysis(
-            f"Student {student_id} Analysis", combined_content
+    def student_analysis(
+        self, student_id: str, progress: Optional[Callable[[str], None]] = None
+    ):
+        title = f"Student {student_id} Analysis"
+        profile = (
+            self.student_profiles.get(student_id) if self.student_profiles else None
         )
-
-    def course_analysis(self, course_code: str):
-        session_files = self._get_session_files_by_course(course_code)
-        combined_content = self._combine_session_files(session_files)
-        return self._generate_analysis(
-            f"Course {course_code} Analysis", combined_content
+        if profile is None:
+            # no profile yet (sessions before the profiles): read the transcripts
+            sessions = self._get_sessions_by_student(student_id)
+            return self._analyze_sessions(title, sessions, progress)
+
+        # short narrative over the compact profile instead of the raw history
+        if progress:
+            progress("Writing the analysis and charts")
+        profile_json = json.dumps(profile, default=str, indent=1)
+        response = self.llm.invoke(self.STUDENT_PROFILE_PROMPT.format(profile=profile_json))
+        return {
+            "summary": response.content,
+            "visualizations": self._generate_visualizations(title),
+            "profile": json.loads(profile_json),
+        }
+
+    def course_analysis(
+        self, course_code: str, progress: Optional[Callable[[str], None]] = None
+    ):
+        sessions = self._get_sessions_by_course(course_code)
+        return self._analyze_sessions(
+            f"Course {course_code} Analysis", sessions, progress
         )
 
-    def day_analysis(self, date: str):
-        session_files = self._get_session_files_by_date(date)
-        combined_content = self._combine_session_files(session_files)
-        return self._generate_analysis(f"Day {date} Analysis", combined_content)
-
-    def _get_all_session_files(self):
-        SESSION_HISTORY_DIR = "saved_session_history"
-        return [
-            os.path.join(SESSION_HISTORY_DIR, f)
-            for f in os.listdir(SESSION_HISTORY_DIR)
-            if f.endswith(".txt")
-        ]
+    def day_analysis(self, date: str, progress: Optional[Callable[[str], None]] = None):
+        sessions = self._get_sessions_by_date(date)
+        return self._analyze_sessions(f"Day {date} Analysis", sessions, progress)
 
-    def _get_session_files_by_student(self, student_id: str):
-        SESSION_HISTORY_DIR = "saved_session_history"
-        return [
-            os.path.join(SESSION_HISTORY_DIR, f)
-            for f in os.listdir(SESSION_HISTORY_DIR)
-            if f.endswith(f"_{student_id}.txt")
-        ]
+    def _analyze_sessions(
+        self,
+        title: str,
+        sessions: list,
+        progress: Optional[Callable[[str], None]] = None,
+    ):
+        progress = progress or (lambda message: None)
+        progress(f"Summarizing {len(sessions)} sessions")
+        # oldest first, so new sessions only change the last reduce groups
+        content = self.session_analyzer.analyze(sessions[::-1])
+        progress("Writing the analysis and charts")
+        return self._generate_analysis(title, content)
 
-    def _get_session_files_by_course(self, course_code: str):
-        SESSION_HISTORY_DIR = "saved_session_history"
-        return [
-            os.path.join(SESSION_HISTORY_DIR, f)
-            for f in os.listdir(SESSION_HISTORY_DIR)
-            if f.split("_")[2] == course_code
-        ]
+    def _get_all_sessions(self):
+        return self.session_store.find()
 
-    def _get_session_files_by_date(self, date: str):
-        SESSION_HISTORY_DIR = "saved_session_history"
-        return [
-            os.path.join(SESSION_HISTORY_DIR, f)
-            for f in os.listdir(SESSION_HISTORY_DIR)
-            if f.startswith(date)
-        ]
+    def _get_sessions_by_student(self, student_id: str):
+        return self.session_store.find(student_id=student_id)
 
-    def _combine_session_files(self, session_files: list):
-        combined_content = ""
-        for filepath in session_files:
-            try:
-                with open(filepath, "r") as file:
-                    combined_content += file.read() + "\n"
-            except Exception as e:
-                logging.error(f"Error reading file {filepath}: {str(e)}")
-        return combined_content
+    def _get_sessions_by_course(self, course_code: str):
+        return self.session_store.find(course_code=course_code)
+
+    def _get_sessions_by_date(self, date: str):
+        return self.session_store.find(date=date)
 
     def _generate_analysis(self, title: str, content: str):
         # Customize the prompt based on the type of analysis
@@ -605,168 +685,108 @@ class AiTutorAgent:
         try:
             logging.info(f"Generating visualizations for: {title}")
 
-            # Ensure the visualizations directory exists
-            if not os.path.exists("static/visualizations"):
-                os.makedirs("static/visualizations")
-
-            # Get session data
-            session_files = self._get_all_session_files()
-            session_data = []
-
-            for filepath in session_files:
-                filename = os.path.basename(filepath)
-                parts = filename.split("_")
-                if len(parts) == 4:
-                    date, time, course_code, student_id = parts
-                    student_id = student_id.split(".")[0]  # Remove .txt
-                    session_data.append(
-                        {
-                            "date": date,
-                            "time": time,
-                            "course_code": course_code,
-                            "student_id": student_id,
-                        }
-                    )
+            # Session counts, pre-aggregated when the sessions are saved
+            aggregates = self.session_store.aggregates
 
-            # Convert session data to a DataFrame
-            df = pd.DataFrame(session_data)
+            def most_sessions_first(counts: dict) -> dict:
+                return dict(sorted(counts.items(), key=lambda item: -item[1]))
 
             # Generate visualizations based on the type of analysis
             if "Student" in title:
                 student_id = title.replace("Student ", "").replace(" Analysis", "")
-                student_sessions = df[df["student_id"] == student_id]
-
-                # Bar graph: Sessions per date
-                session_counts = student_sessions["date"].value_counts().sort_index()
-                plt.figure(figsize=(10, 6))
-                session_counts.plot(kind="bar", color="skyblue")
-                plt.title(f"Sessions for Student {student_id}")
-                plt.xlabel("Date")
-                plt.ylabel("Number of Sessions")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout()
-                plt.savefig(f"static/visualizations/{title}_sessions_bar.png")
-                plt.close()
-
-                # Pie chart: Sessions per course
-                course_counts = student_sessions["course_code"].value_counts()
-                plt.figure(figsize=(8, 8))
-                course_counts.plot(
-                    kind="pie",
-                    autopct="%1.1f%%",
-                    colors=["lightgreen", "lightcoral", "lightskyblue"],
-                )
-                plt.title(f"Course Distribution for Student {student_id}")
-                plt.ylabel("")
-                plt.savefig(f"static/visualizations/{title}_courses_pie.png")
-                plt.close()
-
-                return {
-                    "sessions_bar_chart": f"visualizations/{title}_sessions_bar.png",
-                    "courses_pie_chart": f"visualizations/{title}_courses_pie.png",
+                charts = {
+                    # Bar graph: Sessions per date
+                    "sessions_bar_chart": chart(
+                        "bar",
+                        aggregates.counts("date", student_id=student_id),
+                        f"Sessions for Student {student_id}",
+                        "Date",
+                        "Number of Sessions",
+                        color="skyblue",
+                    ),
+                    # Pie chart: Sessions per course
+                    "courses_pie_chart": chart(
+                        "pie",
+                        most_sessions_first(
+                            aggregates.counts("course_code", student_id=student_id)
+                        ),
+                        f"Course Distribution for Student {student_id}",
+                        color=["lightgreen", "lightcoral", "lightskyblue"],
+                        figsize=(8, 8),
+                    ),
                 }
 
             elif "Course" in title:
                 course_code = title.replace("Course ", "").replace(" Analysis", "")
-                course_sessions = df[df["course_code"] == course_code]
-
-                # Line graph: Sessions over time
-                session_counts = course_sessions["date"].value_counts().sort_index()
-                plt.figure(figsize=(10, 6))
-                session_counts.plot(kind="line", marker="o", color="purple")
-                plt.title(f"Sessions for Course {course_code}")
-                plt.xlabel("Date")
-                plt.ylabel("Number of Sessions")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout()
-
-                # Replace spaces with underscores in the title for the filename
-                filename = title.replace(" ", "_")
-                plt.savefig(f"static/visualizations/{filename}_sessions_line.png")
-                plt.close()
-
-                # Bar graph: Sessions per student
-                student_counts = course_sessions["student_id"].value_counts()
-                plt.figure(figsize=(10, 6))
-                student_counts.plot(kind="bar", color="orange")
-                plt.title(f"Student Participation in Course {course_code}")
-                plt.xlabel("Student ID")
-                plt.ylabel("Number of Sessions")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout()
-                plt.savefig(f"static/visualizations/{filename}_students_bar.png")
-                plt.close()
-
-                return {
-                    "sessions_line_chart": f"visualizations/{filename}_sessions_line.png",
-                    "students_bar_chart": f"visualizations/{filename}_students_bar.png",
+                charts = {
+                    # Line graph: Sessions over time
+                    "sessions_line_chart": chart(
+                        "line",
+                        aggregates.counts("date", course_code=course_code),
+                        f"Sessions for Course {course_code}",
+                        "Date",
+                        "Number of Sessions",
+                        color="purple",
+                    ),
+                    # Bar graph: Sessions per student
+                    "students_bar_chart": chart(
+                        "bar",
+                        most_sessions_first(
+                            aggregates.counts("student_id", course_code=course_code)
+                        ),
+                        f"Student Participation in Course {course_code}",
+                        "Student ID",
+                        "Number of Sessions",
+                        color="orange",
+                    ),
                 }
 
             elif "Day" in title:
                 date = title.replace("Day ", "").replace(" Analysis", "")
-                day_sessions = df[df["date"] == date]
-
-                # Pie chart: Sessions per course
-                course_counts = day_sessions["course_code"].value_counts()
-                plt.figure(figsize=(8, 8))
-                course_counts.plot(
-                    kind="pie",
-                    autopct="%1.1f%%",
-                    colors=["gold", "lightblue", "lightgreen"],
-                )
-                plt.title(f"Course Distribution on {date}")
-                plt.ylabel("")
-                plt.savefig(f"static/visualizations/{title}_courses_pie.png")
-                plt.close()
-
-                # Bar graph: Sessions per student
-                student_counts = day_sessions["student_id"].value_counts()
-                plt.figure(figsize=(10, 6))
-                student_counts.plot(kind="bar", color="lightcoral")
-                plt.title(f"Student Participation on {date}")
-                plt.xlabel("Student ID")
-                plt.ylabel("Number of Sessions")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout()
-                plt.savefig(f"static/visualizations/{title}_students_bar.png")
-                plt.close()
-
-                return {
-                    "courses_pie_chart": f"visualizations/{title}_courses_pie.png",
-                    "students_bar_chart": f"visualizations/{title}_students_bar.png",
+                charts = {
+                    # Pie chart: Sessions per course
+                    "courses_pie_chart": chart(
+                        "pie",
+                        most_sessions_first(aggregates.counts("course_code", date=date)),
+                        f"Course Distribution on {date}",
+                        color=["gold", "lightblue", "lightgreen"],
+                        figsize=(8, 8),
+                    ),
+                    # Bar graph: Sessions per student
+                    "students_bar_chart": chart(
+                        "bar",
+                        most_sessions_first(aggregates.counts("student_id", date=date)),
+                        f"Student Participation on {date}",
+                        "Student ID",
+                        "Number of Sessions",
+                        color="lightcoral",
+                    ),
                 }
 
             else:  # General Analysis
-                # Bar graph: Total sessions over time
-                session_counts = df["date"].value_counts().sort_index()
-                plt.figure(figsize=(10, 6))
-                session_counts.plot(kind="bar", color="teal")
-                plt.title("Total Sessions Over Time")
-                plt.xlabel("Date")
-                plt.ylabel("Number of Sessions")
-                plt.xticks(rotation=45, ha="right")
-                plt.tight_layout()
-                plt.savefig(f"static/visualizations/{title}_sessions_bar.png")
-                plt.close()
-
-                # Pie chart: Sessions per course
-                course_counts = df["course_code"].value_counts()
-                plt.figure(figsize=(8, 8))
-                course_counts.plot(
-                    kind="pie",
-                    autopct="%1.1f%%",
-                    colors=["lightpink", "lightblue", "lightgreen"],
-                )
-                plt.title("Course Distribution")
-                plt.ylabel("")
-                plt.savefig(f"static/visualizations/{title}_courses_pie.png")
-                plt.close()
-
-                return {
-                    "sessions_bar_chart": f"visualizations/{title}_sessions_bar.png",
-                    "courses_pie_chart": f"visualizations/{title}_courses_pie.png",
+                charts = {
+                    # Bar graph: Total sessions over time
+                    "sessions_bar_chart": chart(
+                        "bar",
+                        aggregates.counts("date"),
+                        "Total Sessions Over Time",
+                        "Date",
+                        "Number of Sessions",
+                        color="teal",
+                    ),
+                    # Pie chart: Sessions per course
+                    "courses_pie_chart": chart(
+                        "pie",
+                        most_sessions_first(aggregates.counts("course_code")),
+                        "Course Distribution",
+                        color=["lightpink", "lightblue", "lightgreen"],
+                        figsize=(8, 8),
+                    ),
                 }
 
+            # only the charts whose data changed are rendered
+            return self.chart_renderer.render_all(charts)
+
         except Exception as e:
             logging.error(f"Error generating visualizations: {str(e)}")
             return {"error": "Failed to generate visualizations"}
@@ -778,7 +798,7 @@ class AiTutorAgent:
         error_message: str = "I apologize, but I'm having trouble processing your question. Could you please try again?",
     ):
         """
-        Decorator for retrying agent methods on error or invalid output from LLM.
+        Decorator for retrying async agent methods on error or invalid output from LLM.
 
         Args:
             max_retries: Maximum number of retry attempts
@@ -790,15 +810,17 @@ class AiTutorAgent:
         P = ParamSpec("P")
         R = TypeVar("R")
 
-        def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        def decorator(
+            func: Callable[P, Awaitable[R]],
+        ) -> Callable[P, Awaitable[R]]:
             @wraps(func)
-            def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
                 current_retry = 0
                 last_error = None
 
                 while current_retry < max_retries:
                     try:
-                        result = func(*args, **kwargs)
+                        result = await func(*args, **kwargs)
 
                         # If no validator provided or validation passes, return result
                         if validator is None or validator(result):
@@ -809,6 +831,7 @@ class AiTutorAgent:
                     except Exception as e:
                         current_retry += 1
                         last_error = e
+                        LLM_RETRIES.labels(function=func.__name__).inc()
                         logging.warning(
                             f"{func.__name__} - Attempt {current_retry}/{max_retries} failed: {str(e)}"
                         )
@@ -839,9 +862,12 @@ class AiTutorAgent:
         # make sure at least break down into 2 tasks
         return len(tasks) > 1 and all(task.strip() for task in tasks)
 
-    def create_summary(self, state: AgentState) -> Command[Literal["greeting"]]:
+    @traced_node
+    async def create_summary(self, state: AgentState) -> Command[Literal["greeting"]]:
 
-        response = self.llm.invoke(self.SUMMARY_PROMPT.format(titles=state["titles"]))
+        response = await self.llm.ainvoke(
+            self.SUMMARY_PROMPT.format(titles=state["titles"])
+        )
         # return {"summary": response.content}
         return Command(
             # state update
@@ -850,12 +876,13 @@ class AiTutorAgent:
             goto="greeting",
         )
 
-    def greeting(self, state: AgentState) -> Command[Literal["student_input"]]:
+    @traced_node
+    async def greeting(self, state: AgentState) -> Command[Literal["student_input"]]:
         subject = state["subject"]
         summary = state["summary"]
         greeting_prompt = self.GREETING_PROMPT.format(subject=subject, summary=summary)
         messages = [HumanMessage(content=greeting_prompt)]
-        response = self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages)
         # return {"messages": response}
         return Command(
             # state update
@@ -864,7 +891,8 @@ class AiTutorAgent:
             goto="student_input",
         )
 
-    def student_input(self, state: AgentState) -> Command[
+    @traced_node
+    async def student_input(self, state: AgentState) -> Command[
         Literal[
             "time_out_message",
             "reask_question",
@@ -878,7 +906,9 @@ class AiTutorAgent:
         )
 
         # TODO: add repeat mechanism for the question type prompt
-        question_type_response = self.llm.invoke(question_type_prompt).content
+        question_type_response = (
+            await self.llm.ainvoke(question_type_prompt)
+        ).content
         print(f"question_type_response: {question_type_response}")
 
         if self.time_out(state):
@@ -896,16 +926,22 @@ class AiTutorAgent:
             )
             goto = END
 
+        update = {
+            "messages": [HumanMessage(content=question)],
+            "student_question": question,
+            # reset related variables
+            "task_breakdown": [],
+            "tutor_question": "",
+            "answer_trials": 0,
+        }
+        # fold the messages which fell out of the window into the rolling summary
+        update.update(await self.update_rolling_summary(state))
+        if goto in ("llm_answer_question", "question_breakdown"):
+            await self.record_learning_event(state, "question", topic=state.get("topic"))
+
         return Command(
             # state update
-            update={
-                "messages": [HumanMessage(content=question)],
-                "student_question": question,
-                # reset related variables
-                "task_breakdown": [],
-                "tutor_question": "",
-                "answer_trials": 0,
-            },
+            update=update,
             # Control flow
             goto=goto,
         )
@@ -917,7 +953,8 @@ class AiTutorAgent:
         duration_minutes = state["duration_minutes"]
         return (current_time - start_time) > timedelta(minutes=duration_minutes)
 
-    def reask_question(self, state: AgentState) -> Command[Literal["student_input"]]:
+    @traced_node
+    async def reask_question(self, state: AgentState) -> Command[Literal["student_input"]]:
         return Command(
             # state update
             update={
@@ -931,35 +968,77 @@ class AiTutorAgent:
             goto="student_input",
         )
 
-    def llm_answer_question(
+    @traced_node
+    async def llm_answer_question(
         self, state: AgentState, config: RunnableConfig
-    ) -> Command[Literal["student_answer_question"]]:
+    ) -> Command[Literal["student_answer_question", "student_input"]]:
 
         thread_id = config["metadata"]["thread_id"]
         if thread_id is None:
             raise ValueError("No thread_id in current context")
 
-        while True:
-            question = state["student_question"]
+        question = state["student_question"]
 
-            result_from_document_search = self.vector_search(question, thread_id)
-            response = self.llm.invoke(
-                self.QUESTION_ANSWERING_PROMPT.format(
-                    question=question,
-                    result_from_document_search=result_from_document_search,
-                )
-            )
+        # retrieval does not depend on the LLM output, run it once per question
+        result_from_document_search = await self.avector_search(question, thread_id)
+        question_answering_prompt = self.QUESTION_ANSWERING_PROMPT.format(
+            question=question,
+            result_from_document_search=result_from_document_search,
+        )
 
-            result = response.content
-            result_parts = result.split("Question")
-            if len(result_parts) > 1:
-                tutor_question = result_parts[-1].strip()
-            else:
-                tutor_question = (
-                    None  # or handle the case where "Question" is not found
+        question_answer = None
+        attempts = 0
+        start = time.perf_counter()
+        while attempts < self.MAX_LLM_ANSWER_ATTEMPTS:
+            attempts += 1
+            try:
+                question_answer = await self.question_answer_llm.ainvoke(
+                    question_answering_prompt
                 )
-            if tutor_question:
+            except Exception as e:
+                LLM_RETRIES.labels(function="llm_answer_question").inc()
+                logging.warning(
+                    f"llm_answer_question - Attempt {attempts}/{self.MAX_LLM_ANSWER_ATTEMPTS} failed: {str(e)}"
+                )
+                question_answer = None
+                continue
+
+            if (
+                question_answer is not None
+                and question_answer.answer.strip()
+                and question_answer.testing_question.strip()
+            ):
                 break
+
+            LLM_RETRIES.labels(function="llm_answer_question").inc()
+            logging.warning(
+                f"llm_answer_question - Attempt {attempts}/{self.MAX_LLM_ANSWER_ATTEMPTS} returned incomplete output: {question_answer}"
+            )
+            question_answer = None
+
+        latency = time.perf_counter() - start
+        LLM_ANSWER_ATTEMPTS.observe(attempts)
+        logging.info(
+            f"llm_answer_question - attempts: {attempts}, latency: {latency:.2f}s, success: {question_answer is not None}"
+        )
+
+        if question_answer is None:
+            return Command(
+                # state update
+                update={
+                    "messages": [
+                        AIMessage(
+                            content="I apologize, but I'm having trouble answering your question. Could you please try again?"
+                        )
+                    ]
+                },
+                # Control flow
+                goto="student_input",
+            )
+
+        tutor_question = question_answer.testing_question.strip()
+        result = f"{question_answer.answer.strip()}\n\n**Question**: {tutor_question}"
+
         return Command(
             # state update
             update={
@@ -971,7 +1050,8 @@ class AiTutorAgent:
             goto="student_answer_question",
         )
 
-    def student_answer_question(self, state: AgentState) -> Command[
+    @traced_node
+    async def student_answer_question(self, state: AgentState) -> Command[
         Literal[
             "time_out_message",
             "tell_student_answer_is_correct",
@@ -987,14 +1067,18 @@ class AiTutorAgent:
         else:
             answer_trials = state["answer_trials"]
             question = state["tutor_question"]
-            response = self.llm.invoke(
+            response = await self.llm.ainvoke(
                 self.CHECK_QUESTION_ANSWER_PROMPT.format(
                     question=question, answer=student_answer
                 )
             )
             result = response.content.strip()
+            correct = result.lower().startswith("correct")
+            await self.record_learning_event(
+                state, "answer", correct=correct, question=question
+            )
             # check if the answer is correct
-            if result.lower().startswith("correct"):
+            if correct:
                 goto = "tell_student_answer_is_correct"
             else:
                 # check if wrong answer exceeds the max answer attempts
@@ -1011,21 +1095,77 @@ class AiTutorAgent:
         )
 
     # helper function
-    # TODO: use trim_message library
     def get_question_answer_context(self, state: AgentState):
         answer_trials = state["answer_trials"]
         number_of_related_messages = (answer_trials + 1) * 2
         messages = state["messages"][(-1 * number_of_related_messages) :]
 
         # Convert messages into conversation format
-        conversation = []
-        for msg in messages:
-            if isinstance(msg, AIMessage):
-                conversation.append(f"AI: {msg.content}")
-            elif isinstance(msg, HumanMessage):
-                conversation.append(f"Student: {msg.content}")
+        return self.conversation_memory.render(messages)
+
+    # helper function
+    async def update_rolling_summary(self, state: AgentState) -> dict:
+        """
+        Summarize the messages which fell out of the conversation window.
 
-        return "\n".join(conversation)
+        Returns:
+            dict: State update with the new rolling summary, empty if no update is needed
+        """
+        summarized_message_count = state.get("summarized_message_count", 0)
+        messages_to_summarize = self.conversation_memory.messages_to_summarize(
+            state["messages"], summarized_message_count
+        )
+        if not messages_to_summarize:
+            return {}
+
+        prompt = self.ROLLING_SUMMARY_PROMPT.format(
+            summary=state.get("conversation_summary", "") or "None",
+            messages=self.conversation_memory.render(messages_to_summarize),
+        )
+        self.report_prompt_tokens("rolling_summary", prompt)
+        response = await self.llm.ainvoke(prompt)
+        return {
+            "conversation_summary": response.content,
+            "summarized_message_count": summarized_message_count
+            + len(messages_to_summarize),
+        }
+
+    # helper function
+    def report_prompt_tokens(self, node: str, prompt: str):
+        """Report the estimated prompt size of a node's LLM call"""
+        prompt_tokens = self.conversation_memory.estimate_tokens(prompt)
+        PROMPT_TOKENS_ESTIMATE.labels(node=node).observe(prompt_tokens)
+        logging.info(f"{node} - prompt tokens (est.): {prompt_tokens}")
+
+    # helper function
+    async def record_learning_event(self, state: AgentState, event: str, **fields):
+        """Fold a tutoring event into the profile of the student, see StudentProfiles"""
+        if self.student_profiles is None:
+            return
+        try:
+            configurable = get_config()["configurable"]
+        except Exception:
+            configurable = {}
+        student_id = configurable.get("user_id")
+        if not student_id:
+            return
+        # the study time is counted with every event, so abandoned sessions count too
+        session_minutes = None
+        if state.get("start_time"):
+            session_minutes = (datetime.now() - state["start_time"]).total_seconds() / 60
+        try:
+            await asyncio.to_thread(
+                self.student_profiles.record_event,
+                student_id,
+                event,
+                subject=state.get("subject"),
+                thread_id=configurable.get("thread_id"),
+                session_minutes=session_minutes,
+                **fields,
+            )
+        except Exception as e:
+            # the profile must never break the tutoring session
+            logging.error(f"Error recording learning event {event}: {str(e)}")
 
     # def further_question_correctness(self, state: AgentState, max_trials=3):
     #     if self.time_out(state):
@@ -1046,7 +1186,8 @@ class AiTutorAgent:
     #     return "Correct" if result.lower().startswith("correct") else "Wrong"
     #     # need to add one trials for answer_trials
 
-    def tell_student_answer_is_correct(
+    @traced_node
+    async def tell_student_answer_is_correct(
         self, state: AgentState
     ) -> Command[Literal["intermediate_summary"]]:
         return Command(
@@ -1059,12 +1200,15 @@ class AiTutorAgent:
     # def add_wrong_answer_trials(self, state: AgentState):
     #     return {"answer_trials": state["answer_trials"] + 1}
 
-    def hints(self, state: AgentState) -> Command[Literal["student_answer_question"]]:
+    @traced_node
+    async def hints(self, state: AgentState) -> Command[Literal["student_answer_question"]]:
         question_answer_context = self.get_question_answer_context(state)
-        print(f"question_answer_context for hints: {question_answer_context}")
-        response = self.llm.invoke(
-            self.HINTS_PROMPT.format(question_answer_context=question_answer_context)
+        prompt = self.HINTS_PROMPT.format(
+            question_answer_context=question_answer_context
         )
+        self.report_prompt_tokens("hints", prompt)
+        response = await self.llm.ainvoke(prompt)
+        await self.record_learning_event(state, "hint")
         result = response.content
         # return {"messages": [AIMessage(content=result)]}
         return Command(
@@ -1077,15 +1221,17 @@ class AiTutorAgent:
             goto="student_answer_question",
         )
 
-    def explain_answer(
+    @traced_node
+    async def explain_answer(
         self, state: AgentState
     ) -> Command[Literal["intermediate_summary"]]:
         question_answer_context = self.get_question_answer_context(state)
-        response = self.llm.invoke(
-            self.EXPLAIN_ANSWER_PROMPT.format(
-                question_answer_context=question_answer_context
-            )
+        prompt = self.EXPLAIN_ANSWER_PROMPT.format(
+            question_answer_context=question_answer_context
         )
+        self.report_prompt_tokens("explain_answer", prompt)
+        response = await self.llm.ainvoke(prompt)
+        await self.record_learning_event(state, "explanation")
         result = response.content
         # return {"messages": [AIMessage(content=result)]}
         return Command(
@@ -1095,15 +1241,16 @@ class AiTutorAgent:
             goto="intermediate_summary",
         )
 
-    def intermediate_summary(
+    @traced_node
+    async def intermediate_summary(
         self, state: AgentState
     ) -> Command[Literal["student_answer_if_any_further_question"]]:
         question_answer_context = self.get_question_answer_context(state)
-        response = self.llm.invoke(
-            self.INTERMEDIATE_SUMMARY_PROMPT.format(
-                question_answer_context=question_answer_context
-            )
+        prompt = self.INTERMEDIATE_SUMMARY_PROMPT.format(
+            question_answer_context=question_answer_context
         )
+        self.report_prompt_tokens("intermediate_summary", prompt)
+        response = await self.llm.ainvoke(prompt)
         result = response.content
         # return {"messages": [AIMessage(content=result)]}
         return Command(
@@ -1122,7 +1269,8 @@ class AiTutorAgent:
     # def ask_any_further_question(self, state: AgentState):
     #     return {"messages": [AIMessage(content=self.ANY_FURTHER_QUESTION_PROMPT)]}
 
-    def student_answer_if_any_further_question(
+    @traced_node
+    async def student_answer_if_any_further_question(
         self, state: AgentState
     ) -> Command[Literal["session_summary", "student_input"]]:
         update = {}
@@ -1173,7 +1321,8 @@ class AiTutorAgent:
     # else:
     #     return "No"
 
-    def time_out_message(
+    @traced_node
+    async def time_out_message(
         self, state: AgentState
     ) -> Command[Literal["session_summary"]]:
         return Command(
@@ -1192,11 +1341,18 @@ class AiTutorAgent:
         #     ]
         # }
 
-    def session_summary(self, state: AgentState):
-        messages = state["messages"]
-        response = self.llm.invoke(
-            self.SESSION_SUMMARY_PROMPT.format(messages=messages)
+    @traced_node
+    async def session_summary(self, state: AgentState):
+        # rolling summary of the earlier conversation plus all the later messages
+        messages = self.conversation_memory.context(
+            state["messages"],
+            summary=state.get("conversation_summary", ""),
+            summarized_message_count=state.get("summarized_message_count", 0),
         )
+        prompt = self.SESSION_SUMMARY_PROMPT.format(messages=messages)
+        self.report_prompt_tokens("session_summary", prompt)
+        response = await self.llm.ainvoke(prompt)
+        await self.record_learning_event(state, "session_end")
         result = response.content
         # return {"messages": [AIMessage(content=result)]}
         return Command(
@@ -1206,8 +1362,9 @@ class AiTutorAgent:
             goto=END,
         )
 
+    @traced_node
     @retry_on_error(validator=validate_task_breakdown)
-    def question_breakdown(
+    async def question_breakdown(
         self, state: AgentState, config: RunnableConfig
     ) -> Command[Literal["subtask_guideline"]]:
         question = state["student_question"]
@@ -1217,8 +1374,8 @@ class AiTutorAgent:
         if thread_id is None:
             raise ValueError("No thread_id in current context")
 
-        related_course_content = self.vector_search(question, thread_id)
-        response = self.llm.invoke(
+        related_course_content = await self.avector_search(question, thread_id)
+        response = await self.llm.ainvoke(
             self.QUESTION_BREAKDOWN_PROMPT.format(
                 question=question, related_course_content=related_course_content
             )
@@ -1247,7 +1404,8 @@ class AiTutorAgent:
             goto="subtask_guideline",
         )
 
-    def subtask_guideline(
+    @traced_node
+    async def subtask_guideline(
         self, state: AgentState, config: RunnableConfig
     ) -> Command[Literal["student_answer_subtask"]]:
         task_breakdown = state["task_breakdown"]
@@ -1259,15 +1417,17 @@ class AiTutorAgent:
         if thread_id is None:
             raise ValueError("No thread_id in current context")
 
-        vector_search_results = self.vector_search(current_task, thread_id)
-        previous_conversation = state["messages"][state["task_solving_start_index"] :]
-        response = self.llm.invoke(
-            self.SUBTASK_GUIDELINE_PROMPT.format(
-                task=current_task,
-                related_course_content=vector_search_results,
-                previous_conversation=previous_conversation,
-            )
+        vector_search_results = await self.avector_search(current_task, thread_id)
+        previous_conversation = self.conversation_memory.context(
+            state["messages"], start_index=state["task_solving_start_index"]
         )
+        prompt = self.SUBTASK_GUIDELINE_PROMPT.format(
+            task=current_task,
+            related_course_content=vector_search_results,
+            previous_conversation=previous_conversation,
+        )
+        self.report_prompt_tokens("subtask_guideline", prompt)
+        response = await self.llm.ainvoke(prompt)
         result = response.content
         subtask_guideline_str = (
             f"**Subtask {current_task_index + 1}: {current_task}**\n{result}"
@@ -1280,7 +1440,8 @@ class AiTutorAgent:
             goto="student_answer_subtask",
         )
 
-    def student_answer_subtask(
+    @traced_node
+    async def student_answer_subtask(
         self, state: AgentState
     ) -> Command[Literal["check_subtask_answer"]]:
         update = {}
@@ -1299,7 +1460,8 @@ class AiTutorAgent:
             goto=goto,
         )
 
-    def check_subtask_answer(self, state: AgentState) -> Command[
+    @traced_node
+    async def check_subtask_answer(self, state: AgentState) -> Command[
         Literal[
             "task_solving_summary",
             "subtask_guideline",
@@ -1311,18 +1473,24 @@ class AiTutorAgent:
         current_task_index = state["current_task_index"]
         current_task = state["task_breakdown"][current_task_index]
         task_solving_start_index = state["task_solving_start_index"]
-        previous_subtask_history = state["messages"][task_solving_start_index:]
+        previous_subtask_history = self.conversation_memory.context(
+            state["messages"], start_index=task_solving_start_index
+        )
 
-        response = self.llm.invoke(
-            self.CHECK_SUBTASK_ANSWER_PROMPT.format(
-                student_answer=student_answer,
-                task=current_task,
-                previous_subtask_history=previous_subtask_history,
-            )
+        prompt = self.CHECK_SUBTASK_ANSWER_PROMPT.format(
+            student_answer=student_answer,
+            task=current_task,
+            previous_subtask_history=previous_subtask_history,
         )
+        self.report_prompt_tokens("check_subtask_answer", prompt)
+        response = await self.llm.ainvoke(prompt)
 
         result = response.content
-        if result.lower().startswith("correct"):
+        correct = result.lower().startswith("correct")
+        await self.record_learning_event(
+            state, "subtask_answer", correct=correct, question=current_task
+        )
+        if correct:
             if state["current_task_index"] == len(state["task_breakdown"]) - 1:
                 update = {
                     "messages": [AIMessage(content="You have solved all the tasks.")],
@@ -1353,18 +1521,20 @@ class AiTutorAgent:
             goto=goto,
         )
 
-    def hint_for_subtask(
+    @traced_node
+    async def hint_for_subtask(
         self, state: AgentState
     ) -> Command[Literal["student_answer_subtask"]]:
-        response = self.llm.invoke(
-            self.HINT_FOR_SUBTASK_PROMPT.format(
-                task=state["task_breakdown"][state["current_task_index"]],
-                student_answer=state["messages"][-1].content,
-                previous_conversation=state["messages"][
-                    state["task_solving_start_index"] :
-                ],
-            )
+        prompt = self.HINT_FOR_SUBTASK_PROMPT.format(
+            task=state["task_breakdown"][state["current_task_index"]],
+            student_answer=state["messages"][-1].content,
+            previous_conversation=self.conversation_memory.context(
+                state["messages"], start_index=state["task_solving_start_index"]
+            ),
         )
+        self.report_prompt_tokens("hint_for_subtask", prompt)
+        response = await self.llm.ainvoke(prompt)
+        await self.record_learning_event(state, "hint")
         result = response.content
         return Command(
             # state update
@@ -1373,29 +1543,33 @@ class AiTutorAgent:
             goto="student_answer_subtask",
         )
 
-    def explain_subtask_answer(
+    @traced_node
+    async def explain_subtask_answer(
         self, state: AgentState, config: RunnableConfig
     ) -> Command[Literal["task_solving_summary", "subtask_guideline"]]:
         current_task_index = state["current_task_index"]
         task_breakdown = state["task_breakdown"]
         current_task = task_breakdown[current_task_index]
         student_subtask_start_index = -2 * (self.MAX_ANSWER_ATTEMPTS)
-        student_answer_attempt = state["messages"][student_subtask_start_index:]
+        student_answer_attempt = self.conversation_memory.render(
+            state["messages"][student_subtask_start_index:]
+        )
 
         # Extract thread_id from config
         thread_id = config["metadata"]["thread_id"]
         if thread_id is None:
             raise ValueError("No thread_id in current context")
 
-        related_course_content = self.vector_search(current_task, thread_id)
+        related_course_content = await self.avector_search(current_task, thread_id)
 
-        response = self.llm.invoke(
-            self.EXPLAIN_SUBTASK_ANSWER_PROMPT.format(
-                task=current_task,
-                student_answer_attempt=student_answer_attempt,
-                related_course_content=related_course_content,
-            )
+        prompt = self.EXPLAIN_SUBTASK_ANSWER_PROMPT.format(
+            task=current_task,
+            student_answer_attempt=student_answer_attempt,
+            related_course_content=related_course_content,
         )
+        self.report_prompt_tokens("explain_subtask_answer", prompt)
+        response = await self.llm.ainvoke(prompt)
+        await self.record_learning_event(state, "explanation")
         result = response.content
 
         if current_task_index >= len(task_breakdown) - 1:
@@ -1419,20 +1593,23 @@ class AiTutorAgent:
             goto=goto,
         )
 
-    def task_solving_summary(
+    @traced_node
+    async def task_solving_summary(
         self, state: AgentState
     ) -> Command[Literal["student_answer_if_any_further_question"]]:
         messages = state["messages"]
         task_solving_start_index = state["task_solving_start_index"]
-        previous_conversation = messages[task_solving_start_index:]
+        previous_conversation = self.conversation_memory.render(
+            messages[task_solving_start_index:]
+        )
 
-        response = self.llm.invoke(
-            self.TASK_SOLVING_SUMMARY_PROMPT.format(
-                task=state["student_question"],
-                subtasks=state["task_breakdown"],
-                student_progress=previous_conversation,
-            )
+        prompt = self.TASK_SOLVING_SUMMARY_PROMPT.format(
+            task=state["student_question"],
+            subtasks=state["task_breakdown"],
+            student_progress=previous_conversation,
         )
+        self.report_prompt_tokens("task_solving_summary", prompt)
+        response = await self.llm.ainvoke(prompt)
         result = response.content
 
         return Command(
@@ -1450,6 +1627,17 @@ class AiTutorAgent:
             goto="student_answer_if_any_further_question",
         )
 
+    def compile_async_graph(self, async_memory: BaseCheckpointSaver):
+        """
+        Compile the graph used to execute the tutoring session asynchronously.
+
+        Args:
+            async_memory (BaseCheckpointSaver): Checkpointer supporting the async API,
+                created on the event loop the graph is executed on
+        """
+        self.async_graph = self.builder.compile(checkpointer=async_memory)
+        return self.async_graph
+
     # update state of the graph for a specific thread
     def extend_duration(self, thread_id: str, extend_minutes: int):
         thread = {"configurable": {"thread_id": str(thread_id)}}
@@ -1458,6 +1646,58 @@ class AiTutorAgent:
             thread, {"duration_minutes": current_duration + extend_minutes}
         )
 
+    def get_vector_store(self, thread_id: str) -> VectorStore:
+        """
+        Get the vector store of a tutoring session.
+
+        Args:
+            thread_id (str): The thread ID to identify which vector store to use
+
+        Returns:
+            VectorStore: The vector store of the session
+
+        Raises:
+            ValueError: If vector store not found for the thread_id
+        """
+        if not hasattr(current_app, "vector_stores"):
+            raise ValueError("Flask app does not have vector_stores cache initialized")
+
+        vector_store = current_app.vector_stores.get(thread_id)
+        if vector_store is None:
+            # Try to get thread state to provide more informative error
+            thread = {"configurable": {"thread_id": str(thread_id)}}
+            try:
+                state = self.graph.get_state(thread)
+                subject = state.values.get("subject", "unknown")
+                current_week = state.values.get("current_week", "unknown")
+                has_paths = "vector_store_paths" in state.values
+                raise ValueError(
+                    f"No vector store found for thread {thread_id}. "
+                    f"Subject: {subject}, Week: {current_week}, "
+                    f"Has paths: {has_paths}. The session may have expired."
+                )
+            except Exception as inner_e:
+                # Fall back to simpler error if we can't get state info
+                raise ValueError(
+                    f"No vector store found for thread {thread_id}. The session may have expired."
+                )
+
+        return vector_store
+
+    @staticmethod
+    def format_search_results(vector_search_results: List[Document]) -> str:
+        """Join the page contents of the search results, cleaning up extra spaces"""
+        vector_search_results_str = (
+            "\n\n".join(
+                " ".join(doc.page_content.split())  # Clean up extra spaces
+                for doc in vector_search_results
+            )
+            if vector_search_results
+            else "No related content"
+        )
+        logging.debug(f"vector_search_results_str: {vector_search_results_str}")
+        return vector_search_results_str
+
     def vector_search(self, question: str, thread_id: str, k: int = 3) -> str:
         """
         Search the vector store for documents related to the query.
@@ -1475,52 +1715,57 @@ class AiTutorAgent:
         """
 
         try:
-            if not hasattr(current_app, "vector_stores"):
-                raise ValueError(
-                    "Flask app does not have vector_stores dictionary initialized"
-                )
+            vector_store = self.get_vector_store(thread_id)
 
-            if thread_id not in current_app.vector_stores:
-                # Try to get thread state to provide more informative error
-                thread = {"configurable": {"thread_id": str(thread_id)}}
-                try:
-                    state = self.graph.get_state(thread)
-                    subject = state.values.get("subject", "unknown")
-                    current_week = state.values.get("current_week", "unknown")
-                    has_paths = "vector_store_paths" in state.values
-                    raise ValueError(
-                        f"No vector store found for thread {thread_id}. "
-                        f"Subject: {subject}, Week: {current_week}, "
-                        f"Has paths: {has_paths}. The session may have expired."
-                    )
-                except Exception as inner_e:
-                    # Fall back to simpler error if we can't get state info
-                    raise ValueError(
-                        f"No vector store found for thread {thread_id}. The session may have expired."
-                    )
+            # Perform the search
+            start = time.perf_counter()
+            with span("vector_search", thread_id=thread_id, k=k):
+                vector_search_results = vector_store.similarity_search(question, k=k)
+            VECTOR_SEARCH_DURATION.observe(time.perf_counter() - start)
 
-            vector_store = current_app.vector_stores[thread_id]
+            return self.format_search_results(vector_search_results)
 
-            # Perform the search
-            vector_search_results = vector_store.similarity_search(question, k=k)
+        except ValueError as e:
+            # Re-raise value errors with the original message
+            raise e
+        except Exception as e:
+            # For other errors, provide more context
+            logging.error(f"Error in vector_search: {str(e)}")
+            raise ValueError(f"Failed to search vector store: {str(e)}")
 
-            # Clean up the results before joining
-            vector_search_results_str = (
-                "\n\n".join(
-                    " ".join(doc.page_content.split())  # Clean up extra spaces
-                    for doc in vector_search_results
+    async def avector_search(self, question: str, thread_id: str, k: int = 3) -> str:
+        """
+        Async version of `vector_search`, used by the graph nodes.
+
+        Args:
+            question (str): The search query
+            thread_id (str): The thread ID to identify which vector store to use
+            k (int, optional): Number of documents to return. Defaults to 3.
+
+        Returns:
+            str: Combined content from matching documents
+
+        Raises:
+            ValueError: If vector store not found for the thread_id
+        """
+
+        try:
+            vector_store = self.get_vector_store(thread_id)
+
+            # Perform the search without blocking the event loop
+            start = time.perf_counter()
+            with span("vector_search", thread_id=thread_id, k=k):
+                vector_search_results = await vector_store.asimilarity_search(
+                    question, k=k
                 )
-                if vector_search_results
-                else "No related content"
-            )
+            VECTOR_SEARCH_DURATION.observe(time.perf_counter() - start)
 
-            logging.info(f"vector_search_results_str: {vector_search_results_str}")
-            return vector_search_results_str
+            return self.format_search_results(vector_search_results)
 
         except ValueError as e:
             # Re-raise value errors with the original message
             raise e
         except Exception as e:
             # For other errors, provide more context
-            logging.error(f"Error in vector_search: {str(e)}")
+            logging.error(f"Error in avector_search: {str(e)}")
             raise ValueError(f"Failed to search vector store: {str(e)}")
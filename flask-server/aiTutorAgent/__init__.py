@@ -3,68 +3,245 @@
 from dotenv import load_dotenv
 import os
 from aiTutorAgent.AiTutorAgent import AiTutorAgent
-from pymongo import MongoClient
+from aiTutorAgent.analysis_jobs import AnalysisJobs
+from aiTutorAgent.async_runner import AsyncRunner
+from aiTutorAgent.chart_renderer import ChartRenderer
+from aiTutorAgent.checkpoint_archive import CheckpointArchive
+from aiTutorAgent.delta_checkpoint_saver import DeltaCheckpointSaver
+from aiTutorAgent.session_aggregates import SessionAggregates
+from aiTutorAgent.session_analyzer import SessionAnalyzer
+from aiTutorAgent.session_archive import SessionArchive
+from aiTutorAgent.session_store import SessionStore
+from aiTutorAgent.student_profiles import StudentProfiles
+from aiTutorAgent.thread_registry import ThreadRegistry
+from aiTutorAgent.llm_providers import create_llm
+from aiTutorAgent.mongo_connection import (
+    LazyCheckpointSaver,
+    MongoConnection,
+    client_options_from_env,
+)
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+from telemetry import InstrumentedCheckpointSaver, LLMMetricsCallbackHandler
 import atexit
-from pymongo.errors import ConnectionFailure
+from datetime import timedelta
 import logging
 
 logging.getLogger("pymongo").setLevel(logging.INFO)
 
 # Load environment variables
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GOOGLE_MODEL_NAME = os.getenv(
-    "GOOGLE_MODEL_NAME", "gemini-1.5-pro-latest"
-)  # Use "gemini-pro" or your model name
+# LLM provider ("google" or "stub"), see aiTutorAgent/llm_providers.py
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")
+# Checkpointer of the graph state: "mongodb", or "memory" (in-process, not
+# shared by the workers) for offline load tests
+CHECKPOINTER = os.getenv("CHECKPOINTER", "mongodb")
 
-# MongoDB connection settings
+# MongoDB connection settings ("mongomock://" for offline load tests)
 logging.info(f"MONGODB_URI environment variable: {os.environ.get('MONGODB_URI')}")
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 if not MONGODB_URI or not (
-    MONGODB_URI.startswith("mongodb://") or MONGODB_URI.startswith("mongodb+srv://")
+    MONGODB_URI.startswith("mongodb://")
+    or MONGODB_URI.startswith("mongodb+srv://")
+    or MONGODB_URI.startswith("mongomock://")
 ):
     logging.error(f"Invalid MONGODB_URI: {MONGODB_URI}")
     raise ValueError("Invalid MONGODB_URI")
 
 MONGODB_DB = os.getenv("MONGODB_DB", "ai_tutor_db")
 MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "agent_checkpoints")
+MONGODB_WRITES_COLLECTION = os.getenv(
+    "MONGODB_WRITES_COLLECTION", "checkpoint_writes"
+)
+MONGODB_MESSAGES_COLLECTION = os.getenv(
+    "MONGODB_MESSAGES_COLLECTION", "checkpoint_messages"
+)
+MONGODB_THREADS_COLLECTION = os.getenv("MONGODB_THREADS_COLLECTION", "threads")
+MONGODB_ARCHIVE_COLLECTION = os.getenv(
+    "MONGODB_ARCHIVE_COLLECTION", "agent_checkpoints_archive"
+)
+MONGODB_SESSIONS_COLLECTION = os.getenv("MONGODB_SESSIONS_COLLECTION", "sessions")
+MONGODB_SESSION_COUNTS_COLLECTION = os.getenv(
+    "MONGODB_SESSION_COUNTS_COLLECTION", "session_counts"
+)
+MONGODB_SESSION_SUMMARIES_COLLECTION = os.getenv(
+    "MONGODB_SESSION_SUMMARIES_COLLECTION", "session_summaries"
+)
+# Parallel LLM calls of the session analyses
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "8"))
+MONGODB_STUDENT_PROFILES_COLLECTION = os.getenv(
+    "MONGODB_STUDENT_PROFILES_COLLECTION", "student_profiles"
+)
+MONGODB_ANALYSIS_JOBS_COLLECTION = os.getenv(
+    "MONGODB_ANALYSIS_JOBS_COLLECTION", "analysis_jobs"
+)
+# Identical analyses completed within this window are served from the cache
+ANALYSIS_CACHE_TTL_MINUTES = float(os.getenv("ANALYSIS_CACHE_TTL_MINUTES", "15"))
+# Threads rendering the analysis charts
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+# Directory of the session transcripts saved as files, before the archive
+SESSION_HISTORY_DIR = os.getenv("SESSION_HISTORY_DIR", "saved_session_history")
+# Compressed segment files of the saved sessions, sharded by course and date
+SESSION_ARCHIVE_DIR = os.getenv("SESSION_ARCHIVE_DIR", "saved_session_archive")
+SESSION_SEGMENT_MAX_MB = float(os.getenv("SESSION_SEGMENT_MAX_MB", "64"))
+# Lifetime of the superseded (intermediate) checkpoints, enforced by a TTL index
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", "86400"))
+# New messages of a thread folded into one snapshot document
+CHECKPOINT_SNAPSHOT_MESSAGES = int(os.getenv("CHECKPOINT_SNAPSHOT_MESSAGES", "50"))
+# Threads are archived after this inactivity, or this delay once their graph ended
+THREAD_ARCHIVE_AFTER_HOURS = float(os.getenv("THREAD_ARCHIVE_AFTER_HOURS", "24"))
+FINISHED_THREAD_ARCHIVE_AFTER_HOURS = float(
+    os.getenv("FINISHED_THREAD_ARCHIVE_AFTER_HOURS", "1")
+)
 
 
-# Create MongoDB client
-mongodb_client = MongoClient(MONGODB_URI)
+# MongoDB clients, created lazily in each worker process (after the gunicorn fork)
+mongo = MongoConnection(MONGODB_URI, MONGODB_DB, **client_options_from_env())
 
-try:
-    mongodb_client.admin.command("ismaster")
-    print("✅ MongoDB connection successful!")
-    # print(f"   URI: {MONGODB_URI}")
-    # print(f"   Database: {MONGODB_DB}")
-    # print(f"   Collection: {MONGODB_COLLECTION}")
-except ConnectionFailure as e:
-    print(f"❌ MongoDB connection failed: {e}")
-    mongodb_client = None
 
-# Initialize MongoDB checkpointer with specific db and collection
-memory = MongoDBSaver(
-    client=mongodb_client,
-    db_name=MONGODB_DB,
-    checkpoint_collection_name=MONGODB_COLLECTION,
-)
+def delta_checkpointer(saver):
+    """Store the messages of the checkpoints as append-only deltas, see DeltaCheckpointSaver"""
+    return DeltaCheckpointSaver(
+        InstrumentedCheckpointSaver(saver),
+        database=lambda: mongo.db,
+        messages_collection_name=MONGODB_MESSAGES_COLLECTION,
+        checkpoint_collection_name=MONGODB_COLLECTION,
+        writes_collection_name=MONGODB_WRITES_COLLECTION,
+        superseded_ttl_seconds=CHECKPOINT_TTL_SECONDS,
+        snapshot_every=CHECKPOINT_SNAPSHOT_MESSAGES,
+    )
+
+
+if CHECKPOINTER == "memory":
+    # the sync and async graphs share this checkpointer
+    memory = delta_checkpointer(MemorySaver())
+elif CHECKPOINTER == "mongodb":
+    # Initialize MongoDB checkpointer with specific db and collection
+    memory = delta_checkpointer(
+        LazyCheckpointSaver(
+            lambda: MongoDBSaver(
+                client=mongo.client,
+                db_name=MONGODB_DB,
+                checkpoint_collection_name=MONGODB_COLLECTION,
+                writes_collection_name=MONGODB_WRITES_COLLECTION,
+            )
+        )
+    )
+else:
+    raise ValueError(f"Invalid CHECKPOINTER: {CHECKPOINTER}. Available: mongodb, memory")
 
 # memory = SqliteSaver(conn=sqlite3.connect(":memory:", check_same_thread=False))
-# memory = MemorySaver()
+
+llm = create_llm(LLM_PROVIDER)
+# record latency and token usage of every LLM call
+llm.callbacks = [LLMMetricsCallbackHandler()]
+
+# Session counts by date, course and student, see SessionAggregates
+session_aggregates = SessionAggregates(lambda: mongo.db, MONGODB_SESSION_COUNTS_COLLECTION)
+
+# Saved sessions, indexed by student, course and date, see SessionStore
+session_store = SessionStore(
+    lambda: mongo.db,
+    MONGODB_SESSIONS_COLLECTION,
+    aggregates=session_aggregates,
+    archive=SessionArchive(
+        SESSION_ARCHIVE_DIR, max_segment_bytes=int(SESSION_SEGMENT_MAX_MB * 1024**2)
+    ),
+)
+
+# Map-reduce analysis of the saved sessions, see SessionAnalyzer
+session_analyzer = SessionAnalyzer(
+    llm,
+    lambda: mongo.db,
+    session_store,
+    MONGODB_SESSION_SUMMARIES_COLLECTION,
+    max_concurrency=ANALYSIS_MAX_CONCURRENCY,
+)
+
+# Learning-progress profile of each student, see StudentProfiles
+student_profiles = StudentProfiles(lambda: mongo.db, MONGODB_STUDENT_PROFILES_COLLECTION)
 
 aiTutorAgent = AiTutorAgent(
-    GOOGLE_MODEL_NAME=GOOGLE_MODEL_NAME, GOOGLE_API_KEY=GOOGLE_API_KEY, memory=memory
+    llm=llm,
+    memory=memory,
+    session_store=session_store,
+    session_analyzer=session_analyzer,
+    chart_renderer=ChartRenderer(max_workers=CHART_RENDER_WORKERS),
+    student_profiles=student_profiles,
 )
 
+# Parameters of each kind of analysis, also the filters of its session counts
+ANALYSIS_PARAMS = {
+    "general": [],
+    "student": ["student_id"],
+    "course": ["course_code"],
+    "day": ["date"],
+}
+
+
+def run_analysis(kind, params, progress):
+    """Run an analysis job, see AnalysisJobs"""
+    if kind == "general":
+        return aiTutorAgent.general_analysis(progress=progress)
+    if kind == "student":
+        return aiTutorAgent.student_analysis(params["student_id"], progress=progress)
+    if kind == "course":
+        return aiTutorAgent.course_analysis(params["course_code"], progress=progress)
+    if kind == "day":
+        return aiTutorAgent.day_analysis(params["date"], progress=progress)
+    raise ValueError(f"Unknown analysis: {kind}")
+
+
+# Background analysis jobs, deduplicated and cached, see AnalysisJobs
+analysis_jobs = AnalysisJobs(
+    lambda: mongo.db,
+    run_analysis,
+    MONGODB_ANALYSIS_JOBS_COLLECTION,
+    fresh_for=timedelta(minutes=ANALYSIS_CACHE_TTL_MINUTES),
+)
+
+# Sessions of each student, see ThreadRegistry
+thread_registry = ThreadRegistry(lambda: mongo.db, MONGODB_THREADS_COLLECTION)
+
+# Archive of the finished and abandoned threads, see CheckpointArchive
+checkpoint_archive = CheckpointArchive(
+    lambda: mongo.db,
+    thread_registry,
+    checkpoint_collection_name=MONGODB_COLLECTION,
+    writes_collection_name=MONGODB_WRITES_COLLECTION,
+    archive_collection_name=MONGODB_ARCHIVE_COLLECTION,
+)
 
 # Register cleanup function to close MongoDB connection
-def close_mongodb_connection():
-    if mongodb_client:
-        mongodb_client.close()
-        print("MongoDB connection closed")
+atexit.register(mongo.close)
+
+# Event loop used by the synchronous Flask views to execute the async graph
+async_runner = AsyncRunner()
+
 
+async def init_async_graph():
+    """
+    Compile the async graph with an async MongoDB checkpointer.
 
-atexit.register(close_mongodb_connection)
+    Must be awaited on the event loop that executes the graph (the ASGI server
+    loop or `async_runner`), as the motor client is bound to that loop.
+    The async checkpointer shares the collections of the sync checkpointer,
+    so `aiTutorAgent.graph` sees the same state. The in-memory checkpointer
+    supports both APIs and is shared as is.
+    """
+    if aiTutorAgent.async_graph is None:
+        if CHECKPOINTER == "memory":
+            async_memory = memory
+        else:
+            # the graph runs buffer their checkpoints until `aflush`
+            async_memory = delta_checkpointer(
+                AsyncMongoDBSaver(
+                    client=mongo.async_client,
+                    db_name=MONGODB_DB,
+                    checkpoint_collection_name=MONGODB_COLLECTION,
+                    writes_collection_name=MONGODB_WRITES_COLLECTION,
+                )
+            )
+        aiTutorAgent.compile_async_graph(async_memory)
+    return aiTutorAgent.async_graph
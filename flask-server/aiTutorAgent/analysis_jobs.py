@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+
+class AnalysisJobs:
+    """
+    Session analyses run as background jobs, with their results persisted.
+
+    A job is identified by a hash of its kind and parameters, so identical
+    requests share one job: a request while the job is queued or running gets
+    that job, and a request within `fresh_for` of its completion gets its
+    result without running it again. The job documents are shared by the
+    workers, which claim a job atomically, so a job runs once across workers.
+    A job not updated for `stale_after` (its worker died) can be claimed again.
+
+    Job document:
+        {_id, kind, params, status, progress, result, error, submitted_at,
+         updated_at, completed_at}
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        database: Callable[[], Database],
+        run: Callable[[str, dict, Callable[[str], None]], dict],
+        collection_name: str = "analysis_jobs",
+        fresh_for: timedelta = timedelta(minutes=15),
+        stale_after: timedelta = timedelta(minutes=10),
+        retention: timedelta = timedelta(days=7),
+        max_workers: int = 2,
+    ):
+        """
+        Args:
+            database: Returns the database of the jobs (resolved on use)
+            run: Runs an analysis: (kind, params, progress callback) -> result
+            collection_name: The job collection
+            fresh_for: Results completed since then are served from the cache
+            stale_after: Unfinished jobs not updated since then are run again
+            retention: Job documents are deleted this long after their last update
+            max_workers: Number of analyses running in parallel in this process
+        """
+        self.database = database
+        self.run = run
+        self.collection_name = collection_name
+        self.fresh_for = fresh_for
+        self.stale_after = stale_after
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="analysis-job"
+        )
+        self._indexes_created = False
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.collection.create_index(
+                [("updated_at", ASCENDING)],
+                expireAfterSeconds=int(self.retention.total_seconds()),
+            )
+            self._indexes_created = True
+
+    @staticmethod
+    def job_id(kind: str, params: dict) -> str:
+        key = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode()).hexdigest()[:24]
+
+    def _reusable(self, job: Optional[dict], now: datetime) -> bool:
+        if job is None:
+            return False
+        if job["status"] == self.DONE:
+            return job["completed_at"] > now - self.fresh_for
+        if job["status"] in (self.QUEUED, self.RUNNING):
+            return job["updated_at"] > now - self.stale_after
+        return False
+
+    def submit(self, kind: str, params: dict) -> dict:
+        """
+        Return the job of an analysis, starting it unless an identical job is
+        in progress or completed within the freshness window.
+
+        Args:
+            kind (str): The analysis ("general", "student", "course" or "day")
+            params (dict): The parameters of the analysis
+
+        Returns:
+            dict: The job document
+        """
+        self.ensure_indexes()
+        job_id = self.job_id(kind, params)
+        now = datetime.now()
+        job = self.collection.find_one({"_id": job_id})
+        if self._reusable(job, now):
+            return job
+
+        # claim the job, unless another request claimed it in the meantime
+        try:
+            job = self.collection.find_one_and_update(
+                {
+                    "_id": job_id,
+                    "$or": [
+                        {"status": {"$in": [self.DONE, self.FAILED]}},
+                        {"updated_at": {"$lte": now - self.stale_after}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "kind": kind,
+                        "params": params,
+                        "status": self.QUEUED,
+                        "progress": "Queued",
+                        "submitted_at": now,
+                        "updated_at": now,
+                    },
+                    "$unset": {"error": ""},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return self.collection.find_one({"_id": job_id})
+
+        self._executor.submit(self._run, job_id, kind, params)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.collection.find_one({"_id": job_id})
+
+    def _update(self, job_id: str, **fields):
+        self.collection.update_one(
+            {"_id": job_id}, {"$set": {**fields, "updated_at": datetime.now()}}
+        )
+
+    def _run(self, job_id: str, kind: str, params: dict):
+        def progress(message: str):
+            self._update(job_id, progress=message)
+
+        try:
+            self._update(job_id, status=self.RUNNING, progress="Started")
+            result = self.run(kind, params, progress)
+            self._update(
+                job_id,
+                status=self.DONE,
+                progress="Done",
+                result=result,
+                completed_at=datetime.now(),
+            )
+        except Exception as e:
+            logging.error(f"Error in analysis job {job_id} ({kind}): {str(e)}")
+            self._update(job_id, status=self.FAILED, progress="Failed", error=str(e))
+
+    @staticmethod
+    def to_json(job: dict) -> dict:
+        """The job fields returned to the client"""
+        completed_at = job.get("completed_at")
+        return {
+            "job_id": job["_id"],
+            "kind": job.get("kind"),
+            "status": job["status"],
+            "progress": job.get("progress"),
+            "result": job.get("result") if job["status"] == AnalysisJobs.DONE else None,
+            "error": job.get("error"),
+            "completed_at": completed_at.isoformat() if completed_at else None,
+        }
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncRunner:
+    """
+    Runs coroutines on a dedicated event loop thread.
+
+    Used by the synchronous (WSGI) Flask views to execute the async tutor graph.
+    All coroutines share one loop per process, so async clients bound to the
+    loop (the Mongo checkpointer, the LLM client) are reused between requests.
+    The loop is started lazily, i.e. after gunicorn forked the worker.
+    """
+
+    def __init__(self, name: str = "ai-tutor-event-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name=self.name, daemon=True
+                )
+                self._thread.start()
+        return self._loop
+
+    def run(self, coroutine: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Run a coroutine on the event loop thread and wait for its result.
+
+        Args:
+            coroutine: The coroutine to run
+            timeout: Maximum number of seconds to wait for the result
+
+        Returns:
+            The result of the coroutine
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+        return future.result(timeout)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from matplotlib.figure import Figure
+
+
+def chart(
+    kind: str,
+    data: Dict[str, int],
+    title: str,
+    xlabel: str = "",
+    ylabel: str = "",
+    color: Union[str, List[str], None] = None,
+    figsize: tuple = (10, 6),
+) -> dict:
+    """
+    Specification of a chart: everything that determines the rendered image.
+
+    Args:
+        kind (str): "bar", "line" or "pie"
+        data (Dict[str, int]): Value of each label, in display order
+        title (str): The chart title
+        xlabel (str): The x axis label (bar and line charts)
+        ylabel (str): The y axis label (bar and line charts)
+        color: Color of the bars or the line, colors of the pie slices
+        figsize (tuple): Size of the figure in inches
+
+    Returns:
+        dict: The chart specification
+    """
+    return {
+        "kind": kind,
+        "labels": [str(label) for label in data],
+        "values": list(data.values()),
+        "title": title,
+        "xlabel": xlabel,
+        "ylabel": ylabel,
+        "color": color,
+        "figsize": list(figsize),
+    }
+
+
+class ChartRenderer:
+    """
+    Content-addressed chart images.
+
+    A chart is rendered to <output_dir>/<hash of its specification>.png, so it
+    is only rendered when its data changes and the image of a given URL never
+    changes, which lets it be served with an ETag and cached by the browsers.
+    Charts are drawn with the object-oriented Figure API (no pyplot global
+    state) in a pool of worker threads, and concurrent requests for the same
+    chart wait for a single rendering.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "static/visualizations",
+        url_prefix: str = "visualizations",
+        max_workers: int = 2,
+    ):
+        """
+        Args:
+            output_dir: Directory of the chart images
+            url_prefix: Path of the images returned to the client, relative to /static
+            max_workers: Number of charts rendered in parallel
+        """
+        self.output_dir = output_dir
+        self.url_prefix = url_prefix
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chart-renderer"
+        )
+        self._lock = threading.Lock()
+        self._rendering: Dict[str, Future] = {}
+
+    @staticmethod
+    def chart_hash(spec: dict) -> str:
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _path(self, chart_hash: str) -> str:
+        return os.path.join(self.output_dir, f"{chart_hash}.png")
+
+    @staticmethod
+    def _draw(spec: dict, path: str):
+        figure = Figure(figsize=spec["figsize"])
+        axes = figure.subplots()
+        labels, values = spec["labels"], spec["values"]
+        if spec["kind"] == "pie":
+            axes.pie(values, labels=labels, autopct="%1.1f%%", colors=spec["color"])
+        else:
+            if spec["kind"] == "line":
+                axes.plot(labels, values, marker="o", color=spec["color"])
+            else:
+                axes.bar(labels, values, color=spec["color"])
+            axes.set_xlabel(spec["xlabel"])
+            axes.set_ylabel(spec["ylabel"])
+            axes.set_xticks(range(len(labels)))
+            axes.set_xticklabels(labels, rotation=45, ha="right")
+            figure.tight_layout()
+        axes.set_title(spec["title"])
+
+        # write then rename, so a partially written image is never served
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        figure.savefig(temporary_path, format="png")
+        os.replace(temporary_path, path)
+
+    def _render(self, chart_hash: str, spec: dict):
+        try:
+            self._draw(spec, self._path(chart_hash))
+        finally:
+            with self._lock:
+                self._rendering.pop(chart_hash, None)
+
+    def _submit(self, spec: dict) -> Optional[Future]:
+        chart_hash = self.chart_hash(spec)
+        if os.path.exists(self._path(chart_hash)):
+            return None
+        with self._lock:
+            future = self._rendering.get(chart_hash)
+            if future is None:
+                future = self._executor.submit(self._render, chart_hash, spec)
+                self._rendering[chart_hash] = future
+            return future
+
+    def render_all(self, specs: Dict[str, dict]) -> Dict[str, str]:
+        """
+        Render the charts not rendered yet, in parallel.
+
+        Args:
+            specs (Dict[str, dict]): Specification of each chart, by name
+
+        Returns:
+            Dict[str, str]: Image path of each chart, relative to /static
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        futures = {name: self._submit(spec) for name, spec in specs.items()}
+        images = {}
+        for name, spec in specs.items():
+            if futures[name] is not None:
+                futures[name].result()
+            images[name] = f"{self.url_prefix}/{self.chart_hash(spec)}.png"
+        logging.info(
+            f"Charts: {sum(future is not None for future in futures.values())} rendered, "
+            f"{sum(future is None for future in futures.values())} cached"
+        )
+        return images
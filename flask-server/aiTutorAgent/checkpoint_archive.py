@@ -0,0 +1,166 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+
+from pymongo import DESCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from aiTutorAgent.thread_registry import ThreadRegistry
+
+
+class CheckpointArchive:
+    """
+    Moves the checkpoints of finished or abandoned threads out of the checkpoint
+    collection.
+
+    An archived thread keeps a single document in the archive collection: its
+    final checkpoint and the pending writes of that checkpoint (the interrupt),
+    which is enough to restore and resume it. Its messages stay in the message
+    collection, so the chat history of the thread is still readable.
+    """
+
+    def __init__(
+        self,
+        database: Callable[[], Database],
+        registry: ThreadRegistry,
+        checkpoint_collection_name: str,
+        writes_collection_name: str,
+        archive_collection_name: str,
+    ):
+        """
+        Args:
+            database: Returns the database of the collections (resolved on use)
+            registry: The thread registry, holding the status of each thread
+            checkpoint_collection_name: The checkpoint collection
+            writes_collection_name: The checkpoint writes collection
+            archive_collection_name: The archive collection
+        """
+        self.database = database
+        self.registry = registry
+        self.checkpoint_collection_name = checkpoint_collection_name
+        self.writes_collection_name = writes_collection_name
+        self.archive_collection_name = archive_collection_name
+        self._indexes_created = False
+
+    @property
+    def checkpoint_collection(self) -> Collection:
+        return self.database()[self.checkpoint_collection_name]
+
+    @property
+    def writes_collection(self) -> Collection:
+        return self.database()[self.writes_collection_name]
+
+    @property
+    def archive_collection(self) -> Collection:
+        return self.database()[self.archive_collection_name]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.archive_collection.create_index("thread_id", unique=True)
+            self._indexes_created = True
+
+    def archive_thread(self, thread_id: str) -> bool:
+        """
+        Move the final checkpoint of a thread to the archive and delete the others.
+
+        Returns:
+            bool: Whether the thread was archived (False if another worker claimed it)
+        """
+        self.ensure_indexes()
+        if not self.registry.set_status(
+            thread_id, ThreadRegistry.ARCHIVING, expected=[ThreadRegistry.ACTIVE, None]
+        ):
+            return False
+
+        try:
+            checkpoint = self.checkpoint_collection.find_one(
+                {"thread_id": thread_id, "checkpoint_ns": ""},
+                sort=[("checkpoint_id", DESCENDING)],
+            )
+            if checkpoint is not None:
+                writes = list(
+                    self.writes_collection.find(
+                        {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": "",
+                            "checkpoint_id": checkpoint["checkpoint_id"],
+                        }
+                    )
+                )
+                self.archive_collection.replace_one(
+                    {"thread_id": thread_id},
+                    {
+                        "thread_id": thread_id,
+                        "checkpoint": checkpoint,
+                        "writes": writes,
+                        "archived_at": datetime.now(),
+                    },
+                    upsert=True,
+                )
+
+            self.checkpoint_collection.delete_many({"thread_id": thread_id})
+            self.writes_collection.delete_many({"thread_id": thread_id})
+            self.registry.set_status(thread_id, ThreadRegistry.ARCHIVED)
+            return True
+        except Exception as e:
+            logging.error(f"Error archiving thread {thread_id}: {str(e)}")
+            self.registry.set_status(thread_id, ThreadRegistry.ACTIVE)
+            return False
+
+    def restore_thread(self, thread_id: str) -> bool:
+        """
+        Move the final checkpoint of an archived thread back, so it can be resumed.
+
+        Returns:
+            bool: Whether the thread was restored
+        """
+        archived = self.archive_collection.find_one({"thread_id": thread_id})
+        if archived is None:
+            return False
+
+        self.checkpoint_collection.replace_one(
+            {"_id": archived["checkpoint"]["_id"]}, archived["checkpoint"], upsert=True
+        )
+        for write in archived["writes"]:
+            self.writes_collection.replace_one({"_id": write["_id"]}, write, upsert=True)
+        self.archive_collection.delete_one({"thread_id": thread_id})
+        self.registry.set_status(thread_id, ThreadRegistry.ACTIVE)
+        logging.info(f"Restored archived thread {thread_id}")
+        return True
+
+    def restore_if_archived(self, thread_id: str) -> bool:
+        """
+        Restore the thread if the registry marks it as archived, before it is
+        resumed or its state is read. One indexed read for an active thread.
+
+        Returns:
+            bool: Whether the thread was restored
+        """
+        thread_info = self.registry.get(thread_id, fields=["status"])
+        if thread_info and thread_info.get("status") == ThreadRegistry.ARCHIVED:
+            return self.restore_thread(thread_id)
+        return False
+
+    def archive_stale_threads(
+        self, inactive_for: timedelta, finished_for: timedelta, limit: int = 100
+    ) -> int:
+        """
+        Archive the abandoned and the finished threads.
+
+        Args:
+            inactive_for (timedelta): Inactivity after which a thread is archived
+            finished_for (timedelta): Delay after which an ended thread is archived
+            limit (int): Maximum number of threads archived in one call
+
+        Returns:
+            int: Number of archived threads
+        """
+        now = datetime.now()
+        stale_thread_ids = self.registry.stale_thread_ids(
+            now - inactive_for, finished_since=now - finished_for, limit=limit
+        )
+        archived = sum(self.archive_thread(thread_id) for thread_id in stale_thread_ids)
+        if archived:
+            logging.info(f"Archived {archived} stale threads")
+        return archived
@@ -0,0 +1,125 @@
+from typing import List, Optional
+from langchain_core.messages import AnyMessage, HumanMessage, AIMessage
+
+
+class ConversationMemory:
+    """
+    Keeps the conversation passed to the LLM bounded: a rolling summary of the
+    older messages plus the last few turns, rendered as compact role/content text.
+    """
+
+    # Rough number of characters per token, good enough for budgeting prompts
+    CHARS_PER_TOKEN: int = 4
+
+    def __init__(
+        self,
+        window_turns: int = 6,
+        max_prompt_tokens: int = 3000,
+        max_message_tokens: int = 800,
+        summarize_after_messages: int = 8,
+    ):
+        """
+        Args:
+            window_turns: Number of recent turns (AI + student message) kept verbatim
+            max_prompt_tokens: Token budget of the rendered conversation in a prompt
+            max_message_tokens: Token budget of a single rendered message
+            summarize_after_messages: Number of messages outside the window that
+                triggers a rolling summary update
+        """
+        self.window_turns = window_turns
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_message_tokens = max_message_tokens
+        self.summarize_after_messages = summarize_after_messages
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """Estimate the number of tokens of a text without calling the LLM"""
+        return (len(text) + cls.CHARS_PER_TOKEN - 1) // cls.CHARS_PER_TOKEN
+
+    def render_message(self, message: AnyMessage) -> Optional[str]:
+        """Render a single message as "AI: ..." or "Student: ...", truncated to budget"""
+        if isinstance(message, AIMessage):
+            role = "AI"
+        elif isinstance(message, HumanMessage):
+            role = "Student"
+        else:
+            return None
+
+        content = " ".join(str(message.content).split())
+        max_chars = self.max_message_tokens * self.CHARS_PER_TOKEN
+        if len(content) > max_chars:
+            content = content[:max_chars] + " ..."
+        return f"{role}: {content}"
+
+    def render(self, messages: List[AnyMessage], max_tokens: int = None) -> str:
+        """
+        Render messages as compact role/content lines within the token budget.
+        The oldest messages are dropped first when the budget is exceeded.
+        """
+        max_tokens = max_tokens if max_tokens is not None else self.max_prompt_tokens
+        lines = [
+            line
+            for line in (self.render_message(message) for message in messages)
+            if line
+        ]
+
+        kept = []
+        used_tokens = 0
+        for line in reversed(lines):
+            line_tokens = self.estimate_tokens(line)
+            if kept and used_tokens + line_tokens > max_tokens:
+                break
+            kept.append(line)
+            used_tokens += line_tokens
+
+        if len(kept) < len(lines):
+            kept.append(f"[{len(lines) - len(kept)} earlier messages omitted]")
+
+        return "\n".join(reversed(kept))
+
+    def window(self, messages: List[AnyMessage]) -> List[AnyMessage]:
+        """Return the last `window_turns` turns of the conversation"""
+        return messages[-2 * self.window_turns :]
+
+    def context(
+        self,
+        messages: List[AnyMessage],
+        summary: str = "",
+        start_index: int = 0,
+        summarized_message_count: Optional[int] = None,
+    ) -> str:
+        """
+        Build the conversation context for a prompt: the rolling summary (if any)
+        followed by the recent window of messages from `start_index` onwards.
+
+        With `summarized_message_count` (the messages covered by the summary),
+        every later message is rendered instead of the window, within the token
+        budget, so no message is left out of both the summary and the context.
+        """
+        if summarized_message_count is not None:
+            recent_messages = messages[max(start_index, summarized_message_count) :]
+        else:
+            recent_messages = self.window(messages[start_index:])
+        summary_text = ""
+        if summary:
+            summary_text = f"Summary of earlier conversation: {summary}\n\n"
+
+        remaining_tokens = max(
+            self.max_prompt_tokens - self.estimate_tokens(summary_text),
+            self.max_message_tokens,
+        )
+        return summary_text + self.render(recent_messages, max_tokens=remaining_tokens)
+
+    def messages_to_summarize(
+        self, messages: List[AnyMessage], summarized_message_count: int
+    ) -> List[AnyMessage]:
+        """
+        Messages that fell out of the window and are not yet part of the rolling
+        summary. Empty until there are at least `summarize_after_messages` of them,
+        so the summary is updated in batches rather than every turn.
+        """
+        window_start = max(len(messages) - 2 * self.window_turns, 0)
+        pending = messages[summarized_message_count:window_start]
+        if len(pending) < self.summarize_after_messages:
+            return []
+        return pending
@@ -0,0 +1,658 @@
+import asyncio
+import itertools
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from bson.binary import Binary
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+# Keys of the marker stored in place of the message list in the checkpoint documents
+MESSAGE_COUNT_KEY = "__delta_message_count__"
+MESSAGE_SEGMENTS_KEY = "__delta_message_segments__"
+MESSAGE_SNAPSHOTS_KEY = "__delta_message_snapshots__"
+LEGACY_MESSAGES_INDEX = "thread_id_1_checkpoint_ns_1_seq_1"
+
+
+@dataclass
+class MessageLog:
+    """Where the messages of a checkpoint are stored"""
+
+    count: int = 0
+    last_message_id: Optional[str] = None
+    # (lineage, first seq): the messages from that position on are in that lineage
+    segments: List[Tuple[Optional[str], int]] = field(
+        default_factory=lambda: [(None, 0)]
+    )
+    # (snapshot_id, start, end): the compacted messages, contiguous from 0
+    snapshots: List[Tuple[str, int, int]] = field(default_factory=list)
+
+    @property
+    def lineage(self) -> Optional[str]:
+        """The lineage of the next messages"""
+        return self.segments[-1][0]
+
+    @property
+    def snapshot_end(self) -> int:
+        return self.snapshots[-1][2] if self.snapshots else 0
+
+    def to_marker(self) -> dict:
+        return {
+            MESSAGE_COUNT_KEY: self.count,
+            MESSAGE_SEGMENTS_KEY: [list(segment) for segment in self.segments],
+            MESSAGE_SNAPSHOTS_KEY: [list(snapshot) for snapshot in self.snapshots],
+        }
+
+    @classmethod
+    def from_marker(cls, marker: dict) -> "MessageLog":
+        # markers written before the lineages only have the count
+        return cls(
+            count=marker[MESSAGE_COUNT_KEY],
+            segments=[tuple(segment) for segment in marker.get(MESSAGE_SEGMENTS_KEY, [[None, 0]])],
+            snapshots=[tuple(snapshot) for snapshot in marker.get(MESSAGE_SNAPSHOTS_KEY, [])],
+        )
+
+
+@dataclass
+class PendingCheckpoints:
+    """Checkpoints and writes of a thread buffered during one graph run"""
+
+    # checkpoint_id of the last durable checkpoint, parent of the flushed checkpoint
+    durable_parent_id: Optional[str] = None
+    latest: Optional[Tuple[Checkpoint, CheckpointMetadata]] = None
+    new_versions: Dict[str, Any] = field(default_factory=dict)
+    # checkpoint_id -> [(task_id, task_path, writes)]
+    writes: Dict[str, List[Tuple[str, str, Sequence[Tuple[str, Any]]]]] = field(
+        default_factory=dict
+    )
+
+
+class DeltaCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer wrapper reducing the MongoDB write volume of the tutor graph.
+
+    - Messages are stored append-only, one immutable document per message, in a
+      separate collection. Checkpoints only keep a marker (message count,
+      lineage segments and snapshots), so a turn writes its new messages
+      instead of the whole, ever-growing message list.
+    - When the message list of a thread diverges from the stored one (messages
+      replaced or removed), a new lineage starts at the first differing
+      message; the documents of the earlier checkpoints are never rewritten,
+      so `get_state_history` and time travel return their own messages.
+    - Every `snapshot_every` messages, the messages stored since the last
+      snapshot are folded into one snapshot document, so reading a long
+      session reads a few snapshots and the recent messages.
+    - The async checkpoints of one graph run (one per superstep) are buffered in
+      memory. `aflush` writes only the last one and its pending writes (the
+      interrupt) once the run stops at the interrupt boundary.
+    - When a checkpoint is written, the superseded checkpoints and writes of
+      the thread are marked with `superseded_at` and deleted by a TTL index
+      after `superseded_ttl_seconds`.
+
+    Synchronous writes (`update_state`) are not buffered.
+
+    The message collections are deliberately kept: they are the chat history of
+    the sessions (read by `list_messages`, which follows the last stored message
+    list of the thread), so they have no TTL and archiving a thread does not
+    move them.
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        database: Callable[[], Database],
+        messages_collection_name: str,
+        checkpoint_collection_name: str,
+        writes_collection_name: str,
+        messages_key: str = "messages",
+        superseded_ttl_seconds: int = 86400,
+        snapshot_every: int = 50,
+    ):
+        """
+        Args:
+            saver: The wrapped checkpointer
+            database: Returns the database of the collections (resolved on use,
+                so the MongoDB client is created in the worker process)
+            messages_collection_name: Collection storing the messages
+            checkpoint_collection_name: Checkpoint collection of the wrapped checkpointer
+            writes_collection_name: Writes collection of the wrapped checkpointer
+            messages_key: State channel holding the message list
+            superseded_ttl_seconds: Lifetime of the superseded checkpoints and writes
+            snapshot_every: Number of new messages folded into a snapshot
+        """
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.database = database
+        self.messages_collection_name = messages_collection_name
+        self.checkpoint_collection_name = checkpoint_collection_name
+        self.writes_collection_name = writes_collection_name
+        self.messages_key = messages_key
+        self.superseded_ttl_seconds = superseded_ttl_seconds
+        self.snapshot_every = snapshot_every
+
+        self._pending: Dict[Tuple[str, str], PendingCheckpoints] = {}
+        # (thread_id, checkpoint_ns) -> last stored message list
+        self._message_logs: Dict[Tuple[str, str], MessageLog] = {}
+        self._indexes_created = False
+
+    @property
+    def messages_collection(self) -> Collection:
+        return self.database()[self.messages_collection_name]
+
+    @property
+    def snapshots_collection(self) -> Collection:
+        return self.database()[f"{self.messages_collection_name}_snapshots"]
+
+    @property
+    def heads_collection(self) -> Collection:
+        """Last stored message list (MessageLog) of each thread"""
+        return self.database()[f"{self.messages_collection_name}_heads"]
+
+    @property
+    def checkpoint_collection(self) -> Collection:
+        return self.database()[self.checkpoint_collection_name]
+
+    @property
+    def writes_collection(self) -> Collection:
+        return self.database()[self.writes_collection_name]
+
+    @property
+    def config_specs(self):
+        return self.saver.config_specs
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _ensure_indexes(self):
+        if not self._indexes_created:
+            # unique by position before the lineages, which reuse the positions
+            if LEGACY_MESSAGES_INDEX in self.messages_collection.index_information():
+                self.messages_collection.drop_index(LEGACY_MESSAGES_INDEX)
+            self.messages_collection.create_index(
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("lineage", ASCENDING),
+                    ("seq", ASCENDING),
+                ],
+                unique=True,
+            )
+            self.snapshots_collection.create_index(
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("snapshot_id", ASCENDING),
+                ],
+                unique=True,
+            )
+            self.heads_collection.create_index(
+                [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING)], unique=True
+            )
+            for collection in (self.checkpoint_collection, self.writes_collection):
+                collection.create_index(
+                    [
+                        ("thread_id", ASCENDING),
+                        ("checkpoint_ns", ASCENDING),
+                        ("checkpoint_id", DESCENDING),
+                    ]
+                )
+                collection.create_index(
+                    "superseded_at", expireAfterSeconds=self.superseded_ttl_seconds
+                )
+            self._indexes_created = True
+
+    # message deltas
+
+    def _read_head(self, key: Tuple[str, str]) -> MessageLog:
+        """
+        Last stored message list of a thread, read from MongoDB when this saver
+        has not written the thread yet (another worker or saver did), so only
+        the new messages are written.
+        """
+        thread_id, checkpoint_ns = key
+        head = self.heads_collection.find_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}, projection={"_id": 0}
+        )
+        if head is not None:
+            return MessageLog(
+                count=head["count"],
+                last_message_id=head.get("last_message_id"),
+                segments=[tuple(segment) for segment in head["segments"]],
+                snapshots=[tuple(snapshot) for snapshot in head["snapshots"]],
+            )
+        # messages stored before the heads, in the root lineage
+        document = self.messages_collection.find_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "lineage": None},
+            projection={"seq": 1, "message_id": 1, "_id": 0},
+            sort=[("seq", DESCENDING)],
+        )
+        if document is None:
+            return MessageLog()
+        return MessageLog(count=document["seq"] + 1, last_message_id=document.get("message_id"))
+
+    def _read_range(
+        self, key: Tuple[str, str], log: MessageLog, start: int, end: int
+    ) -> List[Tuple[int, Optional[str], str, bytes]]:
+        """
+        Read the messages at positions [start, end) of a stored message list.
+
+        Returns:
+            List[Tuple[int, Optional[str], str, bytes]]: (position, message id,
+                serialized type, serialized message) in order
+        """
+        thread_id, checkpoint_ns = key
+        records = []
+        snapshot_ids = [
+            snapshot_id
+            for snapshot_id, first, last in log.snapshots
+            if first < end and last > start
+        ]
+        if snapshot_ids:
+            documents = self.snapshots_collection.find(
+                {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "snapshot_id": {"$in": snapshot_ids},
+                },
+                projection={"_id": 0, "start": 1, "message_ids": 1, "types": 1, "messages": 1},
+            ).sort("start", ASCENDING)
+            for document in documents:
+                for seq, message_id, message_type, message in zip(
+                    itertools.count(document["start"]),
+                    document["message_ids"],
+                    document["types"],
+                    document["messages"],
+                ):
+                    if start <= seq < end:
+                        records.append((seq, message_id, message_type, bytes(message)))
+
+        # the messages after the snapshots, from the lineage of each segment
+        spans = []
+        delta_start = max(start, log.snapshot_end)
+        for index, (lineage, first) in enumerate(log.segments):
+            last = log.segments[index + 1][1] if index + 1 < len(log.segments) else end
+            low, high = max(first, delta_start), min(last, end)
+            if low < high:
+                spans.append({"lineage": lineage, "seq": {"$gte": low, "$lt": high}})
+        if spans:
+            documents = self.messages_collection.find(
+                {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "$or": spans},
+                projection={"seq": 1, "message_id": 1, "type": 1, "message": 1, "_id": 0},
+            ).sort("seq", ASCENDING)
+            records.extend(
+                (
+                    document["seq"],
+                    document.get("message_id"),
+                    document["type"],
+                    bytes(document["message"]),
+                )
+                for document in documents
+            )
+        return records
+
+    def _fork(
+        self, key: Tuple[str, str], log: MessageLog, messages: List[Any]
+    ) -> MessageLog:
+        """Start a new lineage at the first message differing from the stored ones"""
+        stored = self._read_range(key, log, 0, min(log.count, len(messages)))
+        prefix = 0
+        for (_, message_id, _, _), message in zip(stored, messages):
+            if message_id is None or message_id != getattr(message, "id", None):
+                break
+            prefix += 1
+        return MessageLog(
+            count=prefix,
+            last_message_id=getattr(messages[prefix - 1], "id", None) if prefix else None,
+            segments=[segment for segment in log.segments if segment[1] < prefix]
+            + [(uuid.uuid4().hex, prefix)],
+            snapshots=[snapshot for snapshot in log.snapshots if snapshot[2] <= prefix],
+        )
+
+    def _store_messages(self, key: Tuple[str, str], messages: List[Any]) -> MessageLog:
+        """
+        Store the messages not stored yet and return where they are stored.
+
+        The message documents are only inserted, never updated, so a stale
+        count (e.g. another worker wrote the same thread) only skips identical
+        documents.
+        """
+        self._ensure_indexes()
+        thread_id, checkpoint_ns = key
+        log = self._message_logs.get(key) or self._read_head(key)
+
+        # the history diverged (messages replaced or removed)
+        if log.count > len(messages) or (
+            log.count and getattr(messages[log.count - 1], "id", None) != log.last_message_id
+        ):
+            log = self._fork(key, log, messages)
+
+        serialized = {}
+
+        def dumps(seq: int) -> Tuple[str, bytes]:
+            if seq not in serialized:
+                serialized[seq] = self.serde.dumps_typed(messages[seq])
+            return serialized[seq]
+
+        if len(messages) > log.count:
+            operations = []
+            for seq in range(log.count, len(messages)):
+                message_type, message_bytes = dumps(seq)
+                operations.append(
+                    UpdateOne(
+                        {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": checkpoint_ns,
+                            "lineage": log.lineage,
+                            "seq": seq,
+                        },
+                        {
+                            "$setOnInsert": {
+                                "message_id": getattr(messages[seq], "id", None),
+                                "type": message_type,
+                                "message": Binary(message_bytes),
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+            self.messages_collection.bulk_write(operations, ordered=False)
+
+        log = MessageLog(
+            count=len(messages),
+            last_message_id=getattr(messages[-1], "id", None) if messages else None,
+            segments=log.segments,
+            snapshots=log.snapshots,
+        )
+
+        # fold the messages stored since the last snapshot into a new one
+        if log.count - log.snapshot_end >= self.snapshot_every:
+            snapshot_id = uuid.uuid4().hex
+            positions = range(log.snapshot_end, log.count)
+            self.snapshots_collection.insert_one(
+                {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "snapshot_id": snapshot_id,
+                    "start": log.snapshot_end,
+                    "end": log.count,
+                    "message_ids": [getattr(messages[seq], "id", None) for seq in positions],
+                    "types": [dumps(seq)[0] for seq in positions],
+                    "messages": [Binary(dumps(seq)[1]) for seq in positions],
+                }
+            )
+            log.snapshots = log.snapshots + [(snapshot_id, log.snapshot_end, log.count)]
+
+        self.heads_collection.replace_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns},
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "count": log.count,
+                "last_message_id": log.last_message_id,
+                "segments": [list(segment) for segment in log.segments],
+                "snapshots": [list(snapshot) for snapshot in log.snapshots],
+                "updated_at": datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+        self._message_logs[key] = log
+        return log
+
+    def list_messages(
+        self,
+        thread_id: str,
+        after_seq: int = -1,
+        limit: Optional[int] = None,
+        checkpoint_ns: str = "",
+    ) -> List[Tuple[int, Any]]:
+        """
+        Read a page of the last stored messages of a thread, without its checkpoints.
+
+        Args:
+            thread_id (str): The thread ID
+            after_seq (int): Return the messages after this position
+            limit (Optional[int]): Maximum number of messages, all if None
+            checkpoint_ns (str): The checkpoint namespace
+
+        Returns:
+            List[Tuple[int, Any]]: (position, message) pairs in order
+        """
+        key = (thread_id, checkpoint_ns)
+        log = self._read_head(key)
+        end = min(log.count, after_seq + 1 + limit) if limit else log.count
+        return [
+            (seq, self.serde.loads_typed((message_type, message)))
+            for seq, _, message_type, message in self._read_range(key, log, after_seq + 1, end)
+        ]
+
+    def _strip_messages(
+        self, key: Tuple[str, str], checkpoint: Checkpoint
+    ) -> Checkpoint:
+        """Store the message deltas and return the checkpoint without its messages"""
+        channel_values = checkpoint.get("channel_values", {})
+        messages = channel_values.get(self.messages_key)
+        if not isinstance(messages, list):
+            return checkpoint
+        log = self._store_messages(key, messages)
+        return {
+            **checkpoint,
+            "channel_values": {**channel_values, self.messages_key: log.to_marker()},
+        }
+
+    def _expand(self, checkpoint_tuple: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        """Put the stored messages back into a checkpoint read from the wrapped saver"""
+        if checkpoint_tuple is None:
+            return None
+        channel_values = checkpoint_tuple.checkpoint.get("channel_values", {})
+        marker = channel_values.get(self.messages_key)
+        if not (isinstance(marker, dict) and MESSAGE_COUNT_KEY in marker):
+            return checkpoint_tuple
+        log = MessageLog.from_marker(marker)
+        messages = [
+            self.serde.loads_typed((message_type, message))
+            for _, _, message_type, message in self._read_range(
+                self._thread_key(checkpoint_tuple.config), log, 0, log.count
+            )
+        ]
+        checkpoint = {
+            **checkpoint_tuple.checkpoint,
+            "channel_values": {**channel_values, self.messages_key: messages},
+        }
+        return checkpoint_tuple._replace(checkpoint=checkpoint)
+
+    # expiry
+
+    def _expire_superseded(self, key: Tuple[str, str], checkpoint_id: str):
+        """Mark the checkpoints and writes older than `checkpoint_id` for TTL deletion"""
+        self._ensure_indexes()
+        thread_id, checkpoint_ns = key
+        query = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": {"$lt": checkpoint_id},
+            "superseded_at": {"$exists": False},
+        }
+        update = {"$set": {"superseded_at": datetime.now(timezone.utc)}}
+        self.checkpoint_collection.update_many(query, update)
+        self.writes_collection.update_many(query, update)
+
+    # sync API, used for state reads and update_state
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._expand(self.saver.get_tuple(config))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        for checkpoint_tuple in self.saver.list(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield self._expand(checkpoint_tuple)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._thread_key(config)
+        next_config = self.saver.put(
+            config, self._strip_messages(key, checkpoint), metadata, new_versions
+        )
+        self._expire_superseded(key, checkpoint["id"])
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.saver.put_writes(config, writes, task_id, task_path)
+
+    # async API, used by the graph runs, buffered until `aflush`
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = self._thread_key(config)
+        pending = self._pending.get(key)
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        if pending and pending.latest and checkpoint_id in (None, pending.latest[0]["id"]):
+            checkpoint, metadata = pending.latest
+            thread_id, checkpoint_ns = key
+            return CheckpointTuple(
+                config={
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": checkpoint["id"],
+                    }
+                },
+                checkpoint=checkpoint,
+                metadata=metadata,
+                parent_config=None,
+                pending_writes=[
+                    (task_id, channel, value)
+                    for task_id, _, writes in pending.writes.get(checkpoint["id"], [])
+                    for channel, value in writes
+                ],
+            )
+
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        return await asyncio.to_thread(self._expand, checkpoint_tuple)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield await asyncio.to_thread(self._expand, checkpoint_tuple)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._thread_key(config)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = PendingCheckpoints(
+                durable_parent_id=config["configurable"].get("checkpoint_id")
+            )
+        pending.latest = (checkpoint, metadata)
+        pending.new_versions.update(new_versions)
+
+        thread_id, checkpoint_ns = key
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        pending = self._pending.get(self._thread_key(config))
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        if pending is None or pending.latest is None:
+            # writes on a durable checkpoint (e.g. the resume value)
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+        pending.writes.setdefault(checkpoint_id, []).append(
+            (task_id, task_path, list(writes))
+        )
+
+    async def aflush(self, config: RunnableConfig) -> None:
+        """
+        Durably write the last buffered checkpoint of the thread and its pending
+        writes. Called once the graph run stopped (interrupt, end or error).
+        """
+        key = self._thread_key(config)
+        pending = self._pending.pop(key, None)
+        if pending is None or pending.latest is None:
+            return
+
+        checkpoint, metadata = pending.latest
+        thread_id, checkpoint_ns = key
+        parent_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": pending.durable_parent_id,
+            }
+        }
+        stripped_checkpoint = await asyncio.to_thread(
+            self._strip_messages, key, checkpoint
+        )
+        next_config = await self.saver.aput(
+            parent_config, stripped_checkpoint, metadata, pending.new_versions
+        )
+        for task_id, task_path, writes in pending.writes.get(checkpoint["id"], []):
+            await self.saver.aput_writes(next_config, writes, task_id, task_path)
+
+        await asyncio.to_thread(self._expire_superseded, key, checkpoint["id"])
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
@@ -0,0 +1,194 @@
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, PrivateAttr
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Local deterministic chat model for load testing and offline runs of the graph.
+
+    Responses conform to what the tutor nodes expect: the question guarding prompt
+    gets `question_type` ("Pass", "Fail" or "Question"), the answer checking prompts
+    get `answer_verdict` ("Correct" or "Wrong"), or "Wrong" if the student's answer
+    contains `wrong_answer_marker` (so that scripted sessions can take the hint
+    and explanation branches), the question breakdown prompt gets
+    pipe-separated tasks and structured output calls get every field filled in.
+
+    The latency of each call is sampled from `latency_distribution`:
+        - "fixed": always `latency_ms`
+        - "uniform": uniform in [latency_ms - latency_spread_ms, latency_ms + latency_spread_ms]
+        - "normal": normal with mean `latency_ms` and standard deviation `latency_spread_ms`
+        - "lognormal": log-normal with median `latency_ms` and
+            sigma `latency_spread_ms / latency_ms` (long tail like a real LLM API)
+    """
+
+    latency_distribution: str = "fixed"
+    latency_ms: float = 0.0
+    latency_spread_ms: float = 0.0
+    seed: int = 0
+    question_type: str = "Pass"
+    answer_verdict: str = "Correct"
+    wrong_answer_marker: str = "(wrong)"
+
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _sample_latency(self) -> float:
+        """Sample the latency of a call, in seconds"""
+        if self.latency_distribution == "fixed":
+            latency_ms = self.latency_ms
+        elif self.latency_distribution == "uniform":
+            latency_ms = self._rng.uniform(
+                self.latency_ms - self.latency_spread_ms,
+                self.latency_ms + self.latency_spread_ms,
+            )
+        elif self.latency_distribution == "normal":
+            latency_ms = self._rng.gauss(self.latency_ms, self.latency_spread_ms)
+        elif self.latency_distribution == "lognormal":
+            if self.latency_ms <= 0:
+                latency_ms = 0.0
+            else:
+                latency_ms = self._rng.lognormvariate(
+                    math.log(self.latency_ms), self.latency_spread_ms / self.latency_ms
+                )
+        else:
+            raise ValueError(
+                f"Unsupported latency distribution: {self.latency_distribution}"
+            )
+        return max(latency_ms, 0.0) / 1000
+
+    def _respond(self, prompt: str) -> str:
+        """Deterministic response to the tutor prompts"""
+        if 'respond with **"Fail"**' in prompt:
+            return self.question_type
+        if 'respond with **"Correct"**' in prompt:
+            if self.wrong_answer_marker and self.wrong_answer_marker in prompt:
+                return "Wrong"
+            return self.answer_verdict
+        if "Separate each task with a vertical bar" in prompt:
+            return (
+                "Identify the inputs and outputs of the problem | "
+                "Write the class and its attributes | "
+                "Implement and test the methods"
+            )
+        first_line = next(
+            (line.strip() for line in prompt.splitlines() if line.strip()), ""
+        )
+        return f"Stub response ({len(prompt)} characters prompt): {first_line}"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        content = self._respond(prompt)
+        input_tokens = (len(prompt) + 3) // 4
+        output_tokens = (len(content) + 3) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._sample_latency())
+        return self._result(messages)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self._sample_latency())
+        return self._result(messages)
+
+    def with_structured_output(self, schema: type, **kwargs: Any) -> Runnable:
+        """Fill every field of the pydantic schema with the stub response"""
+
+        def to_schema(message: AIMessage) -> BaseModel:
+            return schema(
+                **{
+                    name: f"{message.content} ({name})"
+                    for name in schema.model_fields
+                }
+            )
+
+        return self | RunnableLambda(to_schema)
+
+
+def create_google_llm() -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=os.getenv("GOOGLE_MODEL_NAME", "gemini-1.5-pro-latest"),
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+    )
+
+
+def create_stub_llm() -> BaseChatModel:
+    return StubChatModel(
+        latency_distribution=os.getenv("STUB_LLM_LATENCY_DISTRIBUTION", "fixed"),
+        latency_ms=float(os.getenv("STUB_LLM_LATENCY_MS", "0")),
+        latency_spread_ms=float(os.getenv("STUB_LLM_LATENCY_SPREAD_MS", "0")),
+        seed=int(os.getenv("STUB_LLM_SEED", "0")),
+        question_type=os.getenv("STUB_LLM_QUESTION_TYPE", "Pass"),
+        answer_verdict=os.getenv("STUB_LLM_ANSWER_VERDICT", "Correct"),
+        wrong_answer_marker=os.getenv("STUB_LLM_WRONG_ANSWER_MARKER", "(wrong)"),
+    )
+
+
+LLM_PROVIDERS: Dict[str, Callable[[], BaseChatModel]] = {
+    "google": create_google_llm,
+    "stub": create_stub_llm,
+}
+
+
+def create_llm(provider: Optional[str] = None) -> BaseChatModel:
+    """
+    Create the chat model of the tutor.
+
+    Args:
+        provider (Optional[str]): Name of the provider in LLM_PROVIDERS.
+            Defaults to the LLM_PROVIDER environment variable, or "google".
+
+    Raises:
+        ValueError: If the provider is unknown
+
+    Returns:
+        BaseChatModel: The chat model
+    """
+    provider = (provider or os.getenv("LLM_PROVIDER", "google")).lower()
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(
+            f"Unknown LLM provider: {provider}. Available: {', '.join(LLM_PROVIDERS)}"
+        )
+    return LLM_PROVIDERS[provider]()
@@ -0,0 +1,261 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, ReadPreference
+from pymongo.database import Database
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def client_options_from_env() -> dict:
+    """MongoClient pool and timeout options from the MONGODB_* environment variables"""
+    read_preference = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+    if read_preference not in READ_PREFERENCES:
+        raise ValueError(
+            f"Invalid MONGODB_READ_PREFERENCE: {read_preference}. Available: {', '.join(READ_PREFERENCES)}"
+        )
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000")),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(
+            os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")
+        ),
+        "socketTimeoutMS": int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+        "readPreference": read_preference,
+    }
+
+
+def mongomock_client():
+    """
+    In-memory mongomock client, for offline tests.
+
+    pymongo 4.11 passes a `sort` argument to the bulk replace and update
+    operations, which mongomock 4.3 does not accept; it is only used by
+    single-document operations with several matches, so it is dropped.
+    """
+    import mongomock
+    from mongomock.collection import BulkOperationBuilder
+
+    for name in ("add_replace", "add_update"):
+        method = getattr(BulkOperationBuilder, name)
+        if not getattr(method, "drops_sort", False):
+
+            def without_sort(self, *args, method=method, sort=None, **kwargs):
+                return method(self, *args, **kwargs)
+
+            without_sort.drops_sort = True
+            setattr(BulkOperationBuilder, name, without_sort)
+    return mongomock.MongoClient()
+
+
+class MongoConnection:
+    """
+    Lazily created, per-process MongoDB clients.
+
+    The clients are created on first use in the process using them, so each
+    gunicorn worker gets its own connection pool after the fork and importing
+    the app never blocks on MongoDB. A client inherited from a parent process
+    is never reused: the clients are recreated when the process ID changes.
+
+    A "mongomock://" URI gives an in-memory mongomock client, for offline load
+    tests; it has no async client.
+    """
+
+    def __init__(self, uri: str, db_name: str, **client_options):
+        """
+        Args:
+            uri: The MongoDB connection string
+            db_name: The database of the app
+            client_options: MongoClient options (pool size, timeouts, read preference)
+        """
+        self.uri = uri
+        self.db_name = db_name
+        self.client_options = client_options
+        self._client: Optional[MongoClient] = None
+        self._async_client: Optional[AsyncIOMotorClient] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _check_process(self):
+        """Drop the clients created by another (parent) process"""
+        if self._pid != os.getpid():
+            # the sockets belong to the parent, they must not be closed or used here
+            self._client = None
+            self._async_client = None
+            self._pid = os.getpid()
+
+    @property
+    def client(self) -> MongoClient:
+        with self._lock:
+            self._check_process()
+            if self._client is None:
+                if self.uri.startswith("mongomock://"):
+                    self._client = mongomock_client()
+                else:
+                    self._client = MongoClient(self.uri, **self.client_options)
+                logging.info(
+                    f"MongoDB client created in process {self._pid} (maxPoolSize={self.client_options.get('maxPoolSize')})"
+                )
+            return self._client
+
+    @property
+    def async_client(self) -> AsyncIOMotorClient:
+        """Motor client, bound to the event loop of its first use"""
+        with self._lock:
+            self._check_process()
+            if self._async_client is None:
+                if self.uri.startswith("mongomock://"):
+                    raise ValueError("No async client for a mongomock:// URI")
+                self._async_client = AsyncIOMotorClient(self.uri, **self.client_options)
+            return self._async_client
+
+    @property
+    def db(self) -> Database:
+        return self.client[self.db_name]
+
+    async def health_check(self) -> dict:
+        """
+        Ping the server without blocking the event loop.
+
+        Returns:
+            dict: {"status": "ok" | "error", "latency_ms", "error"}
+        """
+        start_time = time.perf_counter()
+        try:
+            await self.async_client.admin.command("ping")
+            return {
+                "status": "ok",
+                "latency_ms": (time.perf_counter() - start_time) * 1000,
+            }
+        except Exception as e:
+            logging.error(f"MongoDB health check failed: {str(e)}")
+            return {"status": "error", "error": str(e)}
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                print("MongoDB connection closed")
+            if self._async_client is not None:
+                self._async_client.close()
+                self._async_client = None
+
+
+class LazyCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer created on first use, in the process using it.
+
+    Lets the graph be compiled at import time while the checkpointer and its
+    MongoDB client are only created after gunicorn forked the worker.
+    """
+
+    def __init__(self, factory: Callable[[], BaseCheckpointSaver]):
+        super().__init__()
+        self.factory = factory
+        self._saver: Optional[BaseCheckpointSaver] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def saver(self) -> BaseCheckpointSaver:
+        with self._lock:
+            if self._saver is None or self._pid != os.getpid():
+                self._saver = self.factory()
+                self._pid = os.getpid()
+            return self._saver
+
+    @property
+    def config_specs(self):
+        return self.saver.config_specs
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.saver.get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.saver.put_writes(config, writes, task_id, task_path)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self.saver.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
@@ -0,0 +1,124 @@
+from typing import Callable, Dict, Iterable, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+
+class SessionAggregates:
+    """
+    Session counts by (date, course_code, student_id), pre-aggregated for the
+    dashboards and updated incrementally when a session is saved.
+
+    Each saved session increments one document per combination of its three
+    dimensions and the wildcard ALL (8 upserts), so any count by one dimension,
+    filtered by the others, is an indexed query returning just the result rows:
+        {date: "20250101", course_code: ALL, student_id: ALL}  sessions that day
+        {date: ALL, course_code: "COMP100", student_id: "123"}  sessions of a student in a course
+        {date: ALL, course_code: ALL, student_id: ALL}  all sessions
+    """
+
+    ALL = "*"
+    DIMENSIONS = ("date", "course_code", "student_id")
+
+    def __init__(
+        self, database: Callable[[], Database], collection_name: str = "session_counts"
+    ):
+        """
+        Args:
+            database: Returns the database of the aggregates (resolved on use)
+            collection_name: The aggregate collection
+        """
+        self.database = database
+        self.collection_name = collection_name
+        self._indexes_created = False
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.collection.create_index(
+                [(dimension, ASCENDING) for dimension in self.DIMENSIONS], unique=True
+            )
+            self.collection.create_index(
+                [("student_id", ASCENDING), ("course_code", ASCENDING), ("date", ASCENDING)]
+            )
+            self.collection.create_index(
+                [("course_code", ASCENDING), ("student_id", ASCENDING), ("date", ASCENDING)]
+            )
+            self._indexes_created = True
+
+    def _updates(self, session: dict, count: int):
+        for mask in range(2 ** len(self.DIMENSIONS)):
+            key = {
+                dimension: self.ALL if mask & (1 << i) else str(session[dimension])
+                for i, dimension in enumerate(self.DIMENSIONS)
+            }
+            yield UpdateOne(key, {"$inc": {"count": count}}, upsert=True)
+
+    def record(self, date: str, course_code: str, student_id: str, count: int = 1):
+        """Add a saved session to the counts"""
+        self.ensure_indexes()
+        session = {"date": date, "course_code": course_code, "student_id": student_id}
+        self.collection.bulk_write(list(self._updates(session, count)), ordered=False)
+
+    def counts(self, by: str, **filters: Optional[str]) -> Dict[str, int]:
+        """
+        Number of sessions for each value of a dimension.
+
+        Args:
+            by (str): The dimension ("date", "course_code" or "student_id")
+            filters: Values of the other dimensions (not set: all)
+
+        Returns:
+            Dict[str, int]: Number of sessions of each value, sorted by value
+        """
+        self.ensure_indexes()
+        query = {
+            dimension: (
+                {"$ne": self.ALL} if dimension == by else str(filters.get(dimension) or self.ALL)
+            )
+            for dimension in self.DIMENSIONS
+        }
+        documents = self.collection.find(query, projection={"_id": 0, by: 1, "count": 1})
+        return {
+            document[by]: document["count"]
+            for document in sorted(documents, key=lambda document: document[by])
+        }
+
+    def total(self, **filters: Optional[str]) -> int:
+        """Number of sessions matching the filters (not set: all)"""
+        self.ensure_indexes()
+        document = self.collection.find_one(
+            {
+                dimension: str(filters.get(dimension) or self.ALL)
+                for dimension in self.DIMENSIONS
+            }
+        )
+        return document["count"] if document else 0
+
+    def distinct_count(self, dimension: str) -> int:
+        """Number of distinct values of a dimension (e.g. students with a session)"""
+        self.ensure_indexes()
+        query = {
+            other: {"$ne": self.ALL} if other == dimension else self.ALL
+            for other in self.DIMENSIONS
+        }
+        return self.collection.count_documents(query)
+
+    def rebuild(self, sessions: Iterable[dict]):
+        """
+        Recompute the counts from the saved sessions.
+
+        Args:
+            sessions (Iterable[dict]): The session records (date, course_code, student_id)
+        """
+        self.ensure_indexes()
+        self.collection.delete_many({})
+        updates = [
+            update for session in sessions for update in self._updates(session, 1)
+        ]
+        if updates:
+            self.collection.bulk_write(updates, ordered=False)
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from aiTutorAgent.session_export import read_transcript
+from aiTutorAgent.session_store import SessionStore
+
+
+class SessionAnalyzer:
+    """
+    Map-reduce analysis of saved sessions.
+
+    Map: each session is summarized once, the summary is cached by the hash
+    of the session content. Reduce: the summaries are combined `fan_in` at a time,
+    level by level, until one remains; the combined summaries are cached by the
+    keys of their inputs. The LLM calls of a level run in parallel.
+
+    Given the sessions in chronological order, a new session only adds a map
+    call and changes the last group of each level, so the cost of an analysis
+    grows with the new sessions, and no prompt grows with the number of sessions.
+    """
+
+    SUMMARY_PROMPT = """
+        Summarize the following tutoring session transcript in at most 150 words.
+        Include the subject, the topics covered, the questions the student
+        struggled with, the number of wrong answers and how the session ended.
+
+        {transcript}
+    """
+
+    REDUCE_PROMPT = """
+        The following are summaries of tutoring sessions (or of groups of sessions).
+        Combine them into a single summary of at most 300 words that keeps the
+        recurring topics, common difficulties, notable events and counts.
+
+        {summaries}
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        database: Callable[[], Database],
+        session_store: SessionStore,
+        collection_name: str = "session_summaries",
+        fan_in: int = 8,
+        max_concurrency: int = 8,
+    ):
+        """
+        Args:
+            llm: The chat model writing the summaries
+            database: Returns the database of the summary cache (resolved on use)
+            session_store: The saved sessions, read from their archive
+            collection_name: The summary cache collection
+            fan_in: Number of summaries combined by one reduce call
+            max_concurrency: Maximum number of parallel LLM calls
+        """
+        self.llm = llm
+        self.database = database
+        self.session_store = session_store
+        self.collection_name = collection_name
+        self.fan_in = max(2, fan_in)
+        self.max_concurrency = max_concurrency
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def _cached(self, keys: List[str]) -> Dict[str, str]:
+        documents = self.collection.find({"_id": {"$in": keys}}, projection={"summary": 1})
+        return {document["_id"]: document["summary"] for document in documents}
+
+    def _summarize(
+        self, prompts: Dict[str, Union[str, Callable[[], str]]]
+    ) -> Dict[str, str]:
+        """
+        Run the prompts not answered yet, in parallel, and cache the answers.
+
+        Args:
+            prompts (Dict[str, Union[str, Callable[[], str]]]): Prompt of each
+                cache key, or a function building it (only called on a cache miss)
+
+        Returns:
+            Dict[str, str]: Summary of each cache key
+        """
+        if not prompts:
+            return {}
+        summaries = self._cached(list(prompts))
+        missing = [key for key in prompts if key not in summaries]
+        if missing:
+            logging.info(
+                f"Summarizing {len(missing)} of {len(prompts)} (cached: {len(summaries)})"
+            )
+            responses = self.llm.batch(
+                [
+                    prompts[key]() if callable(prompts[key]) else prompts[key]
+                    for key in missing
+                ],
+                config={"max_concurrency": self.max_concurrency},
+            )
+            now = datetime.now()
+            new_summaries = {
+                key: response.content for key, response in zip(missing, responses)
+            }
+            self.collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": key},
+                        {"$setOnInsert": {"summary": summary, "created_at": now}},
+                        upsert=True,
+                    )
+                    for key, summary in new_summaries.items()
+                ],
+                ordered=False,
+            )
+            summaries.update(new_summaries)
+        return summaries
+
+    def summarize_sessions(self, sessions: List[dict]) -> Dict[str, str]:
+        """
+        Map step: summary of each session, keyed by "session:<content hash>".
+
+        The content hash is in the session record, so only the sessions not
+        summarized yet are read from the archive (legacy transcripts are hashed).
+
+        Args:
+            sessions (List[dict]): Session records (SessionStore)
+
+        Returns:
+            Dict[str, str]: The summaries, in the order of the sessions
+        """
+        contents = {}
+        legacy_keys = {}
+        legacy = [session for session in sessions if not session.get("content_hash")]
+        for session, content in self.session_store.read_sessions(legacy):
+            key = f"session:{self.content_hash(content)}"
+            legacy_keys[session["filename"]] = key
+            contents[key] = (session, content)
+
+        keys = {}
+        for session in sessions:
+            key = (
+                f"session:{session['content_hash']}"
+                if session.get("content_hash")
+                else legacy_keys.get(session["filename"])
+            )
+            if key:
+                keys.setdefault(key, session)
+
+        summaries = self._cached(list(keys))
+        unread = [
+            session
+            for key, session in keys.items()
+            if key not in summaries and key not in contents
+        ]
+        for session, content in self.session_store.read_sessions(unread):
+            contents[f"session:{session['content_hash']}"] = (session, content)
+
+        prompts = {
+            key: self.SUMMARY_PROMPT.format(
+                transcript=read_transcript(session["filename"], content)
+            )
+            for key, (session, content) in contents.items()
+            if key not in summaries
+        }
+        summaries.update(self._summarize(prompts))
+        return {key: summaries[key] for key in keys}
+
+    def reduce(self, summaries: Dict[str, str]) -> str:
+        """
+        Reduce step: combine the summaries, `fan_in` at a time, into one.
+
+        Args:
+            summaries (Dict[str, str]): Summary of each key, in order
+
+        Returns:
+            str: The combined summary, empty if there is no summary
+        """
+        summaries = dict(summaries)
+        keys = list(summaries)
+        while len(keys) > 1:
+            prompts = {}
+            parent_keys = []
+            for i in range(0, len(keys), self.fan_in):
+                group = keys[i : i + self.fan_in]
+                if len(group) == 1:
+                    parent_keys.append(group[0])
+                    continue
+                key = f"reduce:{self.content_hash('|'.join(group).encode())}"
+                prompts[key] = lambda group=group: self.REDUCE_PROMPT.format(
+                    summaries="\n\n".join(summaries[child] for child in group)
+                )
+                parent_keys.append(key)
+            summaries.update(self._summarize(prompts))
+            keys = parent_keys
+        return summaries[keys[0]] if keys else ""
+
+    def analyze(self, sessions: List[dict]) -> str:
+        """
+        Summary of the given sessions.
+
+        Args:
+            sessions (List[dict]): Session records (SessionStore), in chronological order
+
+        Returns:
+            str: The combined summary of the sessions
+        """
+        return self.reduce(self.summarize_sessions(sessions))
@@ -0,0 +1,127 @@
+import gzip
+import os
+import re
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server appends the segments
+    fcntl = None
+
+
+class SessionArchive:
+    """
+    Compressed, append-only segment files of the saved sessions.
+
+    Sessions are sharded by course and date:
+        <root>/<course_code>/<date>/segment-<n>.gz
+    Each session is appended to the current segment of its shard as its own
+    gzip member, and its location (segment, offset, length) is kept in the
+    session index (SessionStore), so a session is read with one seek and one
+    read, and the sessions of a day or a course are read in segment order with
+    sequential reads of a few files. A segment is closed when it exceeds
+    `max_segment_bytes`. Saving a session again appends a new copy; the index
+    points to the latest one.
+    """
+
+    SEGMENT_PATTERN = re.compile(r"segment-(\d+)\.gz")
+
+    def __init__(self, root: str, max_segment_bytes: int = 64 * 1024**2):
+        """
+        Args:
+            root: Root directory of the archive
+            max_segment_bytes: Size after which a shard starts a new segment
+        """
+        self.root = root
+        self.max_segment_bytes = max_segment_bytes
+
+    @staticmethod
+    def _safe(name: str) -> str:
+        return re.sub(r"[^\w.-]", "_", str(name)) or "_"
+
+    def _shard_dir(self, course_code: str, date: str) -> str:
+        return os.path.join(self.root, self._safe(course_code), self._safe(date))
+
+    @contextmanager
+    def _locked(self, shard_dir: str):
+        """Exclusive lock of a shard, held while appending (across workers)"""
+        with open(os.path.join(shard_dir, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current_segment(self, shard_dir: str) -> str:
+        numbers = [
+            int(match.group(1))
+            for match in map(self.SEGMENT_PATTERN.fullmatch, os.listdir(shard_dir))
+            if match
+        ]
+        number = max(numbers, default=0)
+        path = os.path.join(shard_dir, f"segment-{number}.gz")
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            path = os.path.join(shard_dir, f"segment-{number + 1}.gz")
+        return path
+
+    def append(self, course_code: str, date: str, content: bytes) -> Dict:
+        """
+        Append a session to the segment of its shard.
+
+        Args:
+            course_code (str): The course of the session
+            date (str): The day of the session, "YYYYMMDD"
+            content (bytes): The session export
+
+        Returns:
+            Dict: The location of the session: {segment, offset, length},
+                the segment path being relative to the archive root
+        """
+        shard_dir = self._shard_dir(course_code, date)
+        os.makedirs(shard_dir, exist_ok=True)
+        member = gzip.compress(content)
+        with self._locked(shard_dir):
+            path = self._current_segment(shard_dir)
+            with open(path, "ab") as segment:
+                offset = segment.seek(0, os.SEEK_END)
+                segment.write(member)
+                segment.flush()
+                os.fsync(segment.fileno())
+        return {
+            "segment": os.path.relpath(path, self.root),
+            "offset": offset,
+            "length": len(member),
+        }
+
+    def read(self, location: Dict) -> bytes:
+        """Content of the session at a location returned by `append`"""
+        return next(self.read_many([location]))[1]
+
+    def read_many(self, locations: Iterable[Dict]) -> Iterator[Tuple[Dict, bytes]]:
+        """
+        Read sessions, in segment and offset order: each segment is opened once
+        and read forward.
+
+        Args:
+            locations (Iterable[Dict]): Locations returned by `append`
+
+        Returns:
+            Iterator[Tuple[Dict, bytes]]: Each location with its session content
+        """
+        ordered = sorted(locations, key=lambda location: (location["segment"], location["offset"]))
+        segment, segment_path = None, None
+        try:
+            for location in ordered:
+                if location["segment"] != segment_path:
+                    if segment is not None:
+                        segment.close()
+                    segment_path = location["segment"]
+                    segment = open(os.path.join(self.root, segment_path), "rb")
+                segment.seek(location["offset"])
+                yield location, gzip.decompress(segment.read(location["length"]))
+        finally:
+            if segment is not None:
+                segment.close()
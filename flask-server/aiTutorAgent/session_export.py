@@ -0,0 +1,83 @@
+import json
+from typing import Iterator, List
+
+from langchain_core.messages import AIMessage, AnyMessage
+
+from aiTutorAgent.conversation_memory import ConversationMemory
+
+# A saved session is exported as JSON lines: a "session" record, then one
+# "message" record per message, stored in the SessionArchive. The text
+# transcript is rendered from it on download.
+SESSION_EXPORT_EXTENSION = ".jsonl"
+TRANSCRIPT_WIDTH = 80
+
+
+def message_record(seq: int, message: AnyMessage) -> dict:
+    """Structured record of a message: role, content, producing node, time and tokens"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    usage = getattr(message, "usage_metadata", None)
+    return {
+        "type": "message",
+        "seq": seq,
+        "role": "AI" if isinstance(message, AIMessage) else "Human",
+        "content": content,
+        # stamped by telemetry.traced_node, missing on messages saved before
+        "node": message.additional_kwargs.get("node"),
+        "timestamp": message.additional_kwargs.get("timestamp"),
+        "tokens": (
+            usage["output_tokens"]
+            if usage
+            else ConversationMemory.estimate_tokens(content)
+        ),
+    }
+
+
+def session_bytes(session: dict, messages: List[AnyMessage]) -> bytes:
+    """
+    Export a saved session as JSON lines.
+
+    Args:
+        session (dict): The session fields (subject, start_time, end_time, ...)
+        messages (List[AnyMessage]): The messages of the session
+
+    Returns:
+        bytes: The export, UTF-8 encoded
+    """
+    lines = [json.dumps({"type": "session", **session}, default=str)]
+    lines.extend(
+        json.dumps(message_record(seq, message), ensure_ascii=False)
+        for seq, message in enumerate(messages)
+    )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def parse_records(content: bytes) -> Iterator[dict]:
+    """Stream the records of a saved session"""
+    for line in content.decode("utf-8").splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def render_transcript(records: Iterator[dict]) -> str:
+    """Text transcript of a saved session, the format of the downloads"""
+    lines = []
+    for record in records:
+        if record["type"] == "session":
+            lines.append(f"Subject: {record.get('subject')}")
+            lines.append(f"Start Time: {record.get('start_time')}")
+            lines.append(f"End Time: {record.get('end_time')}")
+            lines.append("-" * TRANSCRIPT_WIDTH)
+        elif record["type"] == "message":
+            role = "AI Message" if record["role"] == "AI" else "Human Message"
+            header = f" {role} "
+            separator = "=" * ((TRANSCRIPT_WIDTH - len(header)) // 2)
+            lines.append(f"{separator}{header}{separator}")
+            lines.append(f"{record['content']}\n")
+    return "\n".join(lines) + "\n"
+
+
+def read_transcript(filename: str, content: bytes) -> str:
+    """Text transcript of a saved session, from its export or a legacy .txt transcript"""
+    if filename.endswith(SESSION_EXPORT_EXTENSION):
+        return render_transcript(parse_records(content))
+    return content.decode("utf-8", errors="replace")
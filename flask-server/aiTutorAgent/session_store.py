@@ -0,0 +1,278 @@
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from aiTutorAgent.session_aggregates import SessionAggregates
+from aiTutorAgent.session_archive import SessionArchive
+
+# <date>_<time>_<course_code>_<student_id>.jsonl (.txt before the structured
+# export), the student ID has no underscore
+SESSION_FILENAME_PATTERN = re.compile(r"(\d{8})_(\d{4})_(.+)_([^_]+)\.(?:jsonl|txt)")
+
+
+class SessionStore:
+    """
+    Index of the saved tutoring sessions, one document per saved session:
+        {filename, thread_id, student_id, course_code, subject, date, time,
+         saved_at, content_hash, segment, offset, length}
+
+    Written by /save-session. The session export (see session_export) is
+    appended to the SessionArchive and its location is kept here, so the
+    sessions are looked up with indexed queries on the student, the course and
+    the date and read from the archive, instead of listing the session
+    directory. Sessions saved before the archive keep a `filepath` instead of a
+    location; `read_sessions` reads both. Each new session is also added to the
+    session counts (SessionAggregates) read by the dashboards.
+    """
+
+    # fields returned by the session listing
+    LISTING_PROJECTION = {
+        "_id": 0,
+        "filename": 1,
+        "filepath": 1,
+        "student_id": 1,
+        "course_code": 1,
+        "date": 1,
+        "time": 1,
+        "content_hash": 1,
+        "segment": 1,
+        "offset": 1,
+        "length": 1,
+    }
+
+    def __init__(
+        self,
+        database: Callable[[], Database],
+        collection_name: str = "sessions",
+        aggregates: Optional[SessionAggregates] = None,
+        archive: Optional[SessionArchive] = None,
+    ):
+        """
+        Args:
+            database: Returns the database of the store (resolved on use)
+            collection_name: The session collection
+            aggregates: Session counts updated with each new session
+            archive: Segment files holding the session exports
+        """
+        self.database = database
+        self.collection_name = collection_name
+        self.aggregates = aggregates
+        self.archive = archive
+        self._indexes_created = False
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.collection.create_index([("filename", ASCENDING)], unique=True)
+            self.collection.create_index(
+                [("student_id", ASCENDING), ("date", DESCENDING), ("time", DESCENDING)]
+            )
+            self.collection.create_index(
+                [("course_code", ASCENDING), ("date", DESCENDING), ("time", DESCENDING)]
+            )
+            self.collection.create_index([("date", DESCENDING), ("time", DESCENDING)])
+            self._indexes_created = True
+
+    def save(
+        self,
+        filename: str,
+        content: bytes,
+        student_id: str,
+        course_code: str,
+        time_stamp: str,
+        thread_id: Optional[str] = None,
+        subject: Optional[str] = None,
+    ) -> dict:
+        """
+        Append a session export to the archive and record its location.
+
+        Args:
+            filename (str): Name of the session (unique), also its download name
+            content (bytes): The session export
+            student_id (str): The student ID
+            course_code (str): The course (topic) code
+            time_stamp (str): Start of the session, "YYYYMMDD_HHMM"
+            thread_id (Optional[str]): The thread of the session
+            subject (Optional[str]): The subject of the session
+
+        Returns:
+            dict: The session record
+        """
+        date = str(time_stamp).partition("_")[0]
+        location = self.archive.append(course_code, date, content)
+        return self.record(
+            filename,
+            student_id,
+            course_code,
+            time_stamp,
+            thread_id=thread_id,
+            subject=subject,
+            content_hash=hashlib.sha256(content).hexdigest(),
+            **location,
+        )
+
+    def record(
+        self,
+        filename: str,
+        student_id: str,
+        course_code: str,
+        time_stamp: str,
+        thread_id: Optional[str] = None,
+        subject: Optional[str] = None,
+        **location,
+    ) -> dict:
+        """
+        Record a saved session. Saving the same session again updates its record.
+
+        Args:
+            filename (str): Name of the session (unique)
+            student_id (str): The student ID
+            course_code (str): The course (topic) code
+            time_stamp (str): Start of the session, "YYYYMMDD_HHMM"
+            thread_id (Optional[str]): The thread of the session
+            subject (Optional[str]): The subject of the session
+            location: Where the session is stored: segment, offset, length and
+                content_hash in the archive, or filepath (legacy transcripts)
+
+        Returns:
+            dict: The session record
+        """
+        self.ensure_indexes()
+        date, _, time = str(time_stamp).partition("_")
+        session = {
+            **location,
+            "filename": filename,
+            "thread_id": thread_id,
+            "student_id": str(student_id),
+            "course_code": str(course_code),
+            "subject": subject,
+            "date": date,
+            "time": time,
+            "saved_at": datetime.now(),
+        }
+        result = self.collection.replace_one(
+            {"filename": session["filename"]}, session, upsert=True
+        )
+        # saving a session again must not count it twice
+        if self.aggregates is not None and result.upserted_id is not None:
+            self.aggregates.record(date, session["course_code"], session["student_id"])
+        return session
+
+    def find(
+        self,
+        student_id: Optional[str] = None,
+        course_code: Optional[str] = None,
+        date: Optional[str] = None,
+    ) -> List[dict]:
+        """
+        Saved sessions matching the given filters, newest first.
+
+        Args:
+            student_id (Optional[str]): Only the sessions of this student
+            course_code (Optional[str]): Only the sessions of this course
+            date (Optional[str]): Only the sessions of this day, "YYYYMMDD"
+
+        Returns:
+            List[dict]: The session records (listing fields only)
+        """
+        self.ensure_indexes()
+        query = {}
+        if student_id:
+            query["student_id"] = str(student_id)
+        if course_code:
+            query["course_code"] = str(course_code)
+        if date:
+            query["date"] = str(date)
+        return list(
+            self.collection.find(query, projection=self.LISTING_PROJECTION).sort(
+                [("date", DESCENDING), ("time", DESCENDING)]
+            )
+        )
+
+    def get(self, filename: str) -> Optional[dict]:
+        self.ensure_indexes()
+        return self.collection.find_one(
+            {"filename": filename}, projection=self.LISTING_PROJECTION
+        )
+
+    def read_sessions(self, sessions: Iterable[dict]) -> Iterator[Tuple[dict, bytes]]:
+        """
+        Read the content of saved sessions: the archived sessions in segment
+        order, then the legacy transcript files.
+
+        Args:
+            sessions (Iterable[dict]): Session records returned by `find` or `get`
+
+        Returns:
+            Iterator[Tuple[dict, bytes]]: Each session record with its content
+        """
+        archived, legacy = [], []
+        for session in sessions:
+            (archived if "segment" in session else legacy).append(session)
+
+        by_location = {
+            (session["segment"], session["offset"]): session for session in archived
+        }
+        for location, content in self.archive.read_many(archived):
+            yield by_location[(location["segment"], location["offset"])], content
+
+        for session in legacy:
+            try:
+                with open(session["filepath"], "rb") as file:
+                    yield session, file.read()
+            except Exception as e:
+                logging.error(f"Error reading file {session['filepath']}: {str(e)}")
+
+    def backfill(self, directory: str) -> int:
+        """
+        Move the transcripts saved as files (before the archive) to the archive.
+
+        Args:
+            directory (str): The session history directory
+
+        Returns:
+            int: Number of archived sessions
+        """
+        if not os.path.exists(directory):
+            return 0
+        self.ensure_indexes()
+        archived = set(
+            self.collection.distinct("filename", {"segment": {"$exists": True}})
+        )
+        count = 0
+        for filename in sorted(os.listdir(directory)):
+            if filename in archived:
+                continue
+            match = SESSION_FILENAME_PATTERN.fullmatch(filename)
+            if not match:
+                logging.warning(f"Skipping session file {filename}: unexpected name")
+                continue
+            date, time, course_code, student_id = match.groups()
+            with open(os.path.join(directory, filename), "rb") as file:
+                content = file.read()
+            self.save(filename, content, student_id, course_code, f"{date}_{time}")
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    # python -m aiTutorAgent.session_store
+    from aiTutorAgent import SESSION_HISTORY_DIR, session_store
+
+    print(f"Archived {session_store.backfill(SESSION_HISTORY_DIR)} saved sessions")
+    # sessions recorded before the aggregates existed
+    session_store.aggregates.rebuild(
+        session_store.collection.find(
+            projection={"_id": 0, "date": 1, "course_code": 1, "student_id": 1}
+        )
+    )
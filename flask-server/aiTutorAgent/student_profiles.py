@@ -0,0 +1,158 @@
+import re
+from datetime import datetime
+from typing import Callable, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+
+class StudentProfiles:
+    """
+    Learning-progress profile of each student, folded from the per-turn events
+    of the tutor graph as they happen, one document per student:
+        {student_id, created_at, updated_at, last_subject,
+         totals: {<counter>: n},
+         subjects: {<subject>: {<counter>: n, topics: {<topic>: n}}},
+         recent_difficulties: [{subject, question, at}]}
+
+    Each event is a single upsert with `$inc`, so the profile stays O(1) to
+    update and to read, whatever the length of the student's history.
+
+    Study time is added with every event, not only when a session ends, so
+    abandoned and timed-out sessions count too: the minutes already counted for
+    each session are kept in the sessions collection (expired after
+    `session_ttl_seconds`) and each event adds the time elapsed since.
+    """
+
+    # counter incremented by each event, plus the "correct_" variant for answers
+    EVENT_COUNTERS = {
+        "question": "questions",
+        "answer": "answers",
+        "subtask_answer": "subtask_answers",
+        "hint": "hints",
+        "explanation": "explanations",
+        "session_end": "sessions_completed",
+    }
+    # wrong answers kept in the profile, newest last
+    MAX_RECENT_DIFFICULTIES = 10
+
+    def __init__(
+        self,
+        database: Callable[[], Database],
+        collection_name: str = "student_profiles",
+        session_ttl_seconds: int = 7 * 86400,
+    ):
+        """
+        Args:
+            database: Returns the database of the profiles (resolved on use)
+            collection_name: The profile collection
+            session_ttl_seconds: Lifetime of the counted minutes of a session
+                after its last event
+        """
+        self.database = database
+        self.collection_name = collection_name
+        self.session_ttl_seconds = session_ttl_seconds
+        self._indexes_created = False
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    @property
+    def sessions_collection(self) -> Collection:
+        return self.database()[f"{self.collection_name}_sessions"]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.collection.create_index([("student_id", ASCENDING)], unique=True)
+            self.sessions_collection.create_index(
+                [("thread_id", ASCENDING)], unique=True
+            )
+            self.sessions_collection.create_index(
+                "updated_at", expireAfterSeconds=self.session_ttl_seconds
+            )
+            self._indexes_created = True
+
+    def _new_minutes(self, thread_id: str, session_minutes: float) -> float:
+        """Minutes of a session not counted yet, and mark them as counted"""
+        counted = self.sessions_collection.find_one_and_update(
+            {"thread_id": str(thread_id)},
+            {"$max": {"minutes": session_minutes}, "$set": {"updated_at": datetime.now()}},
+            projection={"minutes": 1, "_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        return max(session_minutes - (counted or {}).get("minutes", 0), 0)
+
+    @staticmethod
+    def _key(name: Optional[str]) -> str:
+        # "." and a leading "$" are not allowed in field names
+        return re.sub(r"^\$|\.", "_", str(name or "Unknown"))
+
+    def record_event(
+        self,
+        student_id: str,
+        event: str,
+        subject: Optional[str] = None,
+        topic: Optional[str] = None,
+        correct: Optional[bool] = None,
+        question: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        session_minutes: Optional[float] = None,
+    ):
+        """
+        Fold a tutoring event into the profile of a student.
+
+        Args:
+            student_id (str): The student ID
+            event (str): "question", "answer", "subtask_answer", "hint",
+                "explanation" or "session_end"
+            subject (Optional[str]): The subject of the session
+            topic (Optional[str]): The topic of a question
+            correct (Optional[bool]): Whether an answer was correct
+            question (Optional[str]): The question of a wrong answer
+            thread_id (Optional[str]): The session of the event
+            session_minutes (Optional[float]): Time elapsed since the session
+                started, the time not counted yet is added to the profile
+        """
+        self.ensure_indexes()
+        counter = self.EVENT_COUNTERS[event]
+        subject_path = f"subjects.{self._key(subject)}"
+        counters = [counter]
+        if correct is not None:
+            counters.append(f"{'correct' if correct else 'wrong'}_{counter}")
+
+        increments = {}
+        for name in counters:
+            increments[f"totals.{name}"] = 1
+            increments[f"{subject_path}.{name}"] = 1
+        if topic:
+            increments[f"{subject_path}.topics.{self._key(topic)}"] = 1
+        minutes = 0
+        if thread_id and session_minutes is not None:
+            minutes = self._new_minutes(thread_id, session_minutes)
+        if minutes:
+            increments["totals.minutes"] = minutes
+            increments[f"{subject_path}.minutes"] = minutes
+
+        now = datetime.now()
+        update = {
+            "$inc": increments,
+            "$set": {"updated_at": now, "last_subject": subject},
+            "$setOnInsert": {"student_id": str(student_id), "created_at": now},
+        }
+        if correct is False and question:
+            update["$push"] = {
+                "recent_difficulties": {
+                    "$each": [{"subject": subject, "question": question, "at": now}],
+                    "$slice": -self.MAX_RECENT_DIFFICULTIES,
+                }
+            }
+        self.collection.update_one({"student_id": str(student_id)}, update, upsert=True)
+
+    def get(self, student_id: str) -> Optional[dict]:
+        self.ensure_indexes()
+        return self.collection.find_one(
+            {"student_id": str(student_id)}, projection={"_id": 0}
+        )
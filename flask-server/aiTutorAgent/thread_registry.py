@@ -0,0 +1,297 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+
+class ThreadRegistry:
+    """
+    Registry of the tutoring sessions (threads), one document per thread:
+        {thread_id, student_id, subject, created_at, last_activity, message_count,
+         next_state, status}
+
+    Written when a session starts and updated after every graph run, so the
+    sessions of a student are listed with one indexed query instead of reading
+    the state of every thread in the checkpoint collection.
+
+    `status` is "active" while the checkpoints of the thread are in the checkpoint
+    collection and "archived" once they are moved to the archive collection.
+    """
+
+    ACTIVE = "active"
+    ARCHIVING = "archiving"
+    ARCHIVED = "archived"
+
+    # fields returned by the session listing
+    LISTING_PROJECTION = {
+        "_id": 0,
+        "thread_id": 1,
+        "student_id": 1,
+        "subject": 1,
+        "created_at": 1,
+        "last_activity": 1,
+        "message_count": 1,
+        "next_state": 1,
+        "status": 1,
+    }
+
+    def __init__(self, database: Callable[[], Database], collection_name: str = "threads"):
+        """
+        Args:
+            database: Returns the database of the registry (resolved on use)
+            collection_name: The registry collection
+        """
+        self.database = database
+        self.collection_name = collection_name
+        self._indexes_created = False
+
+    @property
+    def collection(self) -> Collection:
+        return self.database()[self.collection_name]
+
+    def ensure_indexes(self):
+        if not self._indexes_created:
+            self.collection.create_index([("thread_id", ASCENDING)], unique=True)
+            self.collection.create_index(
+                [
+                    ("student_id", ASCENDING),
+                    ("created_at", DESCENDING),
+                    ("thread_id", DESCENDING),
+                ]
+            )
+            # inactive threads to archive, see stale_thread_ids
+            self.collection.create_index(
+                [("status", ASCENDING), ("last_activity", ASCENDING)]
+            )
+            self._indexes_created = True
+
+    def register(
+        self,
+        thread_id: str,
+        student_id: str,
+        subject: str,
+        created_at: Optional[datetime] = None,
+        message_count: int = 0,
+        vector_store_paths: Optional[List[str]] = None,
+    ):
+        """
+        Register a new tutoring session.
+
+        The week index paths of the session let any worker load its vector store
+        without reading the graph state.
+        """
+        self.ensure_indexes()
+        created_at = created_at or datetime.now()
+        self.collection.update_one(
+            {"thread_id": thread_id},
+            {
+                "$setOnInsert": {
+                    "thread_id": thread_id,
+                    "student_id": student_id,
+                    "subject": subject,
+                    "created_at": created_at,
+                    "vector_store_paths": vector_store_paths or [],
+                },
+                "$set": {
+                    "last_activity": created_at,
+                    "message_count": message_count,
+                    "status": self.ACTIVE,
+                },
+            },
+            upsert=True,
+        )
+
+    def record_activity(self, thread_id: str, message_count: int, next_state: str = ""):
+        """Update the summary fields of a session after a graph run"""
+        self.collection.update_one(
+            {"thread_id": thread_id},
+            {
+                "$set": {
+                    "last_activity": datetime.now(),
+                    "message_count": message_count,
+                    "next_state": next_state,
+                    "status": self.ACTIVE,
+                }
+            },
+        )
+
+    @staticmethod
+    def encode_cursor(document: dict) -> str:
+        """Opaque cursor pointing after a session of the listing"""
+        position = {
+            "created_at": document["created_at"].isoformat(),
+            "thread_id": document["thread_id"],
+        }
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(position["created_at"]), position["thread_id"]
+        except (KeyError, TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def list_for_student(
+        self, student_id: str, cursor: Optional[str] = None, limit: int = 20
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        List the sessions of a student, newest first, one page at a time.
+
+        Args:
+            student_id (str): The student ID
+            cursor (Optional[str]): Cursor returned with the previous page
+            limit (int): Maximum number of sessions to return
+
+        Returns:
+            Tuple[List[dict], Optional[str]]: The registry documents (metadata
+                fields only) and the cursor of the next page, None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        self.ensure_indexes()
+        query = {"student_id": student_id}
+        if cursor:
+            created_at, thread_id = self.decode_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "thread_id": {"$lt": thread_id}},
+            ]
+
+        # one extra document tells whether there is a next page
+        documents = list(
+            self.collection.find(query, projection=self.LISTING_PROJECTION)
+            .sort([("created_at", DESCENDING), ("thread_id", DESCENDING)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = self.encode_cursor(documents[-1])
+        return documents, next_cursor
+
+    def get(self, thread_id: str, fields: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        Registry document of a session.
+
+        Args:
+            thread_id (str): The thread ID
+            fields (Optional[List[str]]): Fields to read, the listing fields by default
+
+        Returns:
+            Optional[dict]: The document, None if the session is not registered
+        """
+        projection = (
+            {"_id": 0, **{field: 1 for field in fields}}
+            if fields
+            else self.LISTING_PROJECTION
+        )
+        return self.collection.find_one({"thread_id": thread_id}, projection=projection)
+
+    def count_for_student(self, student_id: str) -> int:
+        self.ensure_indexes()
+        return self.collection.count_documents({"student_id": student_id})
+
+    def stale_thread_ids(
+        self,
+        inactive_since: datetime,
+        finished_since: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[str]:
+        """
+        Active threads to archive, oldest first.
+
+        Args:
+            inactive_since (datetime): Threads without activity since then (abandoned)
+            finished_since (Optional[datetime]): Threads whose graph ended before then
+            limit (int): Maximum number of thread IDs
+
+        Returns:
+            List[str]: The thread IDs
+        """
+        self.ensure_indexes()
+        # an ended graph has no next state
+        finished = (
+            [{"next_state": "", "last_activity": {"$lt": finished_since}}]
+            if finished_since
+            else []
+        )
+        documents = (
+            self.collection.find(
+                {
+                    # registered before the status existed: no status field
+                    "status": {"$in": [self.ACTIVE, None]},
+                    "$or": [{"last_activity": {"$lt": inactive_since}}, *finished],
+                },
+                projection={"thread_id": 1, "_id": 0},
+            )
+            .sort("last_activity", ASCENDING)
+            .limit(limit)
+        )
+        return [document["thread_id"] for document in documents]
+
+    def set_status(
+        self, thread_id: str, status: str, expected: Optional[List[Optional[str]]] = None
+    ) -> bool:
+        """
+        Change the status of a thread.
+
+        Args:
+            thread_id (str): The thread ID
+            status (str): The new status
+            expected (Optional[List[Optional[str]]]): Only change it if the current
+                status is one of these (None: no status), so a single worker claims a thread
+
+        Returns:
+            bool: Whether the status was changed
+        """
+        query = {"thread_id": thread_id}
+        if expected is not None:
+            query["status"] = {"$in": expected}
+        return self.collection.update_one(query, {"$set": {"status": status}}).modified_count == 1
+
+    def backfill(self, checkpoint_collection: Collection, get_state: Callable):
+        """
+        Register the threads created before the registry existed.
+
+        Args:
+            checkpoint_collection (Collection): The checkpoint collection
+            get_state (Callable): Returns the state snapshot of a thread config
+        """
+        registered = set(self.collection.distinct("thread_id"))
+        for thread_id in checkpoint_collection.distinct("thread_id"):
+            if thread_id in registered:
+                continue
+            try:
+                state = get_state({"configurable": {"thread_id": thread_id}})
+                student_id = state.metadata.get("user_id")
+                if not student_id:
+                    continue
+                created_at = state.values.get("start_time")
+                self.register(
+                    thread_id,
+                    student_id,
+                    state.values.get("subject", "Unknown"),
+                    created_at=created_at,
+                    message_count=len(state.values.get("messages", [])),
+                    vector_store_paths=state.values.get("vector_store_paths"),
+                )
+            except Exception as e:
+                logging.warning(f"Could not register thread {thread_id}: {str(e)}")
+
+
+if __name__ == "__main__":
+    # python -m aiTutorAgent.thread_registry
+    from aiTutorAgent import MONGODB_COLLECTION, aiTutorAgent, mongo, thread_registry
+
+    thread_registry.backfill(mongo.db[MONGODB_COLLECTION], aiTutorAgent.graph.get_state)
@@ -0,0 +1,126 @@
+"""
+ASGI entry point of the AI Tutor server.
+
+The tutoring endpoints (/start-tutoring, /continue-tutoring) are served natively
+on the event loop, so a session waiting for the LLM does not hold a worker.
+All the other routes are served by the Flask app, mounted as a WSGI application.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+or, in production:
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 asgi:app
+"""
+
+import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from langgraph.types import Command
+from aiTutorAgent import init_async_graph, mongo
+
+# the Flask module name is not a valid identifier
+flask_server = importlib.import_module("agentic-rag-ai-tutor-LangGraph")
+flask_app = flask_server.app
+
+
+def json_response(payload, status_code: int = 200) -> Response:
+    """Serialize the payload with the Flask JSON provider, as `jsonify` does"""
+    return Response(
+        flask_app.json.dumps(payload),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def tutoring_json_response(tutoring_response, endpoint: str) -> Response:
+    return Response(
+        flask_server.encode_tutoring_response(tutoring_response, endpoint),
+        media_type="application/json",
+    )
+
+
+async def start_tutoring(request: Request) -> Response:
+    data = await request.json()
+    try:
+        # loading and merging the vector stores is blocking work
+        thread_id, thread, initial_input = await asyncio.to_thread(
+            flask_server.prepare_tutoring_session, data
+        )
+    except flask_server.TutoringRequestError as e:
+        return json_response({"error": str(e)}, e.status_code)
+
+    response, state = await flask_server.run_tutor_graph(initial_input, thread)
+
+    return tutoring_json_response(
+        flask_server.tutoring_response(
+            response, thread_id, state, include_state=bool(data.get("debug"))
+        ),
+        "/start-tutoring",
+    )
+
+
+async def continue_tutoring(request: Request) -> Response:
+    data = await request.json()
+    student_response = data.get("student_response", "")
+    thread_id = data.get("thread_id")
+    student_id = data.get("student_id")
+    thread = {"configurable": {"thread_id": str(thread_id), "user_id": str(student_id)}}
+
+    await asyncio.to_thread(flask_server.recover_vector_store, thread_id, thread)
+
+    try:
+        response, state = await flask_server.run_tutor_graph(
+            Command(resume=student_response), thread
+        )
+        return tutoring_json_response(
+            flask_server.tutoring_response(
+                response,
+                thread_id,
+                state,
+                message_cursor=data.get("message_cursor"),
+                include_state=bool(data.get("debug")),
+            ),
+            "/continue-tutoring",
+        )
+    except Exception as e:
+        logging.error(f"Error in continue_tutoring: {str(e)}")
+        return json_response(
+            {"error": "Failed to continue tutoring session", "details": str(e)}, 500
+        )
+
+
+async def health(request: Request) -> Response:
+    body, status_code = flask_server.health_response(await mongo.health_check())
+    return json_response(body, status_code)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # the async checkpointer must be created on the server event loop
+    await init_async_graph()
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/start-tutoring", start_tutoring, methods=["POST"]),
+        Route("/continue-tutoring", continue_tutoring, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
+        )
+    ],
+    lifespan=lifespan,
+)
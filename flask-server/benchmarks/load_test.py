@@ -0,0 +1,221 @@
+"""
+Concurrency vs. latency load test for the tutoring endpoints.
+
+Drives scripted student sessions (/start-tutoring followed by /continue-tutoring
+turns) against a running server at increasing concurrency levels and reports
+the p50/p95/p99 latency and throughput of each level.
+
+Compare the WSGI and the ASGI servers by running it against both, e.g.:
+    gunicorn --workers 4 --timeout 120 agentic-rag-ai-tutor-LangGraph:app
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 asgi:app
+
+    python benchmarks/load_test.py --base-url http://localhost:5001 \
+        --folder COMP228_Java_Programming_By_Week --concurrency 1,4,16,64 \
+        --output results/wsgi.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+# a wrong answer then a correct one (hint), a further question, then wrong answers
+# until the tutor explains the answer; the stub LLM judges the answers marked
+# "(wrong)" as wrong (STUB_LLM_WRONG_ANSWER_MARKER)
+STUDENT_TURNS = [
+    "What is a class in Java?",
+    "A class is a loop that repeats a block of code. (wrong)",
+    "A class is a blueprint for creating objects.",
+    "yes",
+    "What is an interface in Java?",
+    "An interface is a class with a main method. (wrong)",
+    "An interface is a variable holding an object. (wrong)",
+    "An interface is a package of classes. (wrong)",
+    "An interface is a compiled Java file. (wrong)",
+    "no",
+]
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def timed_post(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    body: dict,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+) -> Optional[dict]:
+    """
+    POST a request, recording its latency if it succeeded.
+
+    Failed requests are only counted, so that fast errors do not lower the
+    latency percentiles.
+
+    Returns:
+        Optional[dict]: The response body, None if the request failed
+    """
+    start = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=body)
+    except httpx.HTTPError:
+        errors[endpoint] += 1
+        return None
+    if response.status_code != 200:
+        errors[endpoint] += 1
+        return None
+    latencies[endpoint].append(time.perf_counter() - start)
+    return response.json()
+
+
+async def run_session(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    session_index: int,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+):
+    """Run one scripted student session, recording the latency of each request"""
+    student_id = f"loadtest-{session_index}"
+
+    response = await timed_post(
+        client,
+        "/start-tutoring",
+        {
+            "folder_name": args.folder,
+            "topic": "ALL",
+            "current_week": args.week,
+            "duration": 60,
+            "student_id": student_id,
+        },
+        latencies,
+        errors,
+    )
+    if response is None:
+        return
+
+    thread_id = response["thread_id"]
+    for student_response in STUDENT_TURNS[: args.turns]:
+        response = await timed_post(
+            client,
+            "/continue-tutoring",
+            {
+                "thread_id": thread_id,
+                "student_id": student_id,
+                "student_response": student_response,
+            },
+            latencies,
+            errors,
+        )
+        if response is None:
+            return
+
+
+async def run_level(args: argparse.Namespace, concurrency: int) -> dict:
+    """Run `concurrency` sessions at the same time and summarize the latencies"""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited_session(session_index):
+        async with semaphore:
+            await run_session(client, args, session_index, latencies, errors)
+
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=args.timeout
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                limited_session(i)
+                for i in range(concurrency * args.sessions_per_worker)
+            ),
+            return_exceptions=True,
+        )
+        elapsed = time.perf_counter() - start
+
+    # successful requests only
+    requests_count = sum(len(values) for values in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": requests_count / elapsed if elapsed else 0.0,
+        "errors": sum(errors.values()),
+        "endpoints": {
+            endpoint: {
+                "count": len(latencies[endpoint]),
+                "errors": errors[endpoint],
+                "p50": percentile(latencies[endpoint], 50),
+                "p95": percentile(latencies[endpoint], 95),
+                "p99": percentile(latencies[endpoint], 99),
+                "mean": (
+                    statistics.mean(latencies[endpoint]) if latencies[endpoint] else 0.0
+                ),
+            }
+            for endpoint in sorted({*latencies, *errors})
+        },
+    }
+
+
+def print_report(results: List[dict]):
+    print(
+        f"{'concurrency':>11} {'endpoint':<20} {'count':>6} {'errors':>6} "
+        f"{'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'rps':>7}"
+    )
+    for level in results:
+        for endpoint, stats in level["endpoints"].items():
+            print(
+                f"{level['concurrency']:>11} {endpoint:<20} {stats['count']:>6} "
+                f"{stats['errors']:>6} {stats['p50']:>8.2f} {stats['p95']:>8.2f} "
+                f"{stats['p99']:>8.2f} {level['throughput_rps']:>7.2f}"
+            )
+    errors = sum(level["errors"] for level in results)
+    if errors:
+        print(
+            f"\n{errors} failed requests, left out of the latency percentiles and throughput"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:5001")
+    parser.add_argument("--folder", required=True, help="Course folder name")
+    parser.add_argument("--week", type=int, default=1, help="Current week")
+    parser.add_argument(
+        "--concurrency", default="1,4,16,64", help="Comma separated concurrency levels"
+    )
+    parser.add_argument("--sessions-per-worker", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=len(STUDENT_TURNS))
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Save the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = []
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        results.append(asyncio.run(run_level(args, concurrency)))
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"base_url": args.base_url, "levels": results}, file, indent=2)
+    if any(level["errors"] for level in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Offline end-to-end load test of the tutoring endpoints.
+
+Serves the ASGI app (asgi.py) with uvicorn in this process, with the stub LLM
+(LLM_PROVIDER=stub),
+the hashing embeddings (EMBEDDING_PROVIDER=hashing), the in-memory
+checkpointer (CHECKPOINTER=memory) and mongomock (MONGODB_URI=mongomock://),
+so no API key, network access or MongoDB server is needed, and drives the
+scripted sessions of load_test.py against it at each concurrency level.
+
+Reports the throughput, the p50/p95/p99 latency of each endpoint, the RSS of
+the worker and the checkpoint bytes written (checkpoints, writes and message
+deltas) by each level, and saves the results as benchmarks/results/<commit>.json
+so that commits can be compared. The peak RSS is read once, after the run:
+
+    python benchmarks/offline_load_test.py \
+        --folder COMP228_Java_Programming_By_Week --concurrency 1,4,16 \
+        --stub-latency-ms 200 --baseline benchmarks/results/<commit>.json
+
+The vector stores are built with the hashing embeddings in --workdir (a
+temporary directory by default; reuse one to skip the embedding step).
+The load generator runs in the same process as the worker, so the RSS
+includes its (small, constant) share. Exits with status 1 if any request
+failed; install the mongomock of requirements-dev.txt.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import bson
+
+from bench_utils import RESULTS_DIR, SERVER_DIR, change, git_commit, peak_rss_mb, rss_mb
+from load_test import STUDENT_TURNS, print_report, run_level
+
+sys.path.insert(0, SERVER_DIR)
+
+
+def configure_offline(args: argparse.Namespace):
+    """Select the offline providers, before the app reads its settings"""
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["EMBEDDING_PROVIDER"] = "hashing"
+    os.environ["CHECKPOINTER"] = "memory"
+    os.environ["MONGODB_URI"] = "mongomock://localhost"
+    os.environ["STUB_LLM_LATENCY_DISTRIBUTION"] = args.stub_latency_distribution
+    os.environ["STUB_LLM_LATENCY_MS"] = str(args.stub_latency_ms)
+    os.environ["STUB_LLM_LATENCY_SPREAD_MS"] = str(args.stub_latency_spread_ms)
+    os.environ["STUB_LLM_SEED"] = str(args.seed)
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    os.environ.pop("SPAN_LOG_DIR", None)
+
+
+def prepare_workdir(workdir: Optional[str], folder: str) -> str:
+    """
+    Working directory of the app: the course folder is linked from the server
+    directory, the vector stores and saved sessions are written here.
+    """
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix="ai-tutor-load-"))
+    course_folder = os.path.join(workdir, "course_material", folder)
+    if not os.path.exists(course_folder):
+        os.makedirs(os.path.dirname(course_folder), exist_ok=True)
+        os.symlink(os.path.join(SERVER_DIR, "course_material", folder), course_folder)
+    return workdir
+
+
+def start_server(app, log_level: str) -> str:
+    """Serve the ASGI app with uvicorn on a free local port in a background thread"""
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level=log_level.lower())
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def payload_bytes(value) -> int:
+    """Total size of the serialized values nested in dicts, lists and tuples"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(payload_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(item) for item in value)
+    return 0
+
+
+def checkpoint_bytes(memory) -> int:
+    """
+    Bytes written by the checkpointer: the serialized checkpoints and writes
+    held by the in-memory saver (it never deletes them), the message deltas,
+    their snapshots and the heads of the threads.
+
+    Args:
+        memory (DeltaCheckpointSaver): The checkpointer of the app
+    """
+    saver = memory.saver.saver  # DeltaCheckpointSaver -> Instrumented -> MemorySaver
+    total = payload_bytes(saver.storage) + payload_bytes(saver.writes)
+    total += payload_bytes(getattr(saver, "blobs", {}))
+    for collection in (
+        memory.messages_collection,
+        memory.snapshots_collection,
+        memory.heads_collection,
+    ):
+        total += sum(len(bson.encode(document)) for document in collection.find())
+    return total
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Relative change of the p95 latency and throughput from a baseline run"""
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nCompared to {baseline.get('commit')}:")
+    print(f"{'concurrency':>11} {'endpoint':<20} {'p95':>8} {'rps':>8} {'ckpt bytes':>11}")
+    for level in results["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for endpoint, stats in level["endpoints"].items():
+            base_stats = base["endpoints"].get(endpoint)
+            if not base_stats:
+                continue
+            print(
+                f"{level['concurrency']:>11} {endpoint:<20} "
+                f"{change(stats['p95'], base_stats['p95']):>8} "
+                f"{change(level['throughput_rps'], base['throughput_rps']):>8} "
+                f"{change(level['checkpoint_bytes_written'], base['checkpoint_bytes_written']):>11}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--folder", required=True, help="Course folder name")
+    parser.add_argument("--week", type=int, default=1, help="Current week")
+    parser.add_argument(
+        "--concurrency", default="1,4,16", help="Comma separated concurrency levels"
+    )
+    parser.add_argument("--sessions-per-worker", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=len(STUDENT_TURNS))
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--stub-latency-distribution", default="fixed")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-latency-spread-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workdir", help="Working directory of the app (default: a temporary one)"
+    )
+    parser.add_argument(
+        "--output", help="Results file (default: benchmarks/results/<commit>.json)"
+    )
+    parser.add_argument("--baseline", help="Results file of a run to compare with")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # relative to the current directory, not the working directory of the app
+    output = os.path.abspath(args.output or os.path.join(RESULTS_DIR, "{commit}.json"))
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    configure_offline(args)
+    os.chdir(prepare_workdir(args.workdir, args.folder))
+
+    start = time.perf_counter()
+    asgi = importlib.import_module("asgi")
+    # the app configures DEBUG logging on import
+    logging.getLogger().setLevel(args.log_level)
+    import_seconds = time.perf_counter() - start
+
+    args.base_url = start_server(asgi.app, args.log_level)
+    memory = asgi.flask_server.memory
+
+    # one untimed session builds the vector stores and compiles the async graph
+    warmup = argparse.Namespace(**{**vars(args), "sessions_per_worker": 1})
+    start = time.perf_counter()
+    asyncio.run(run_level(warmup, 1))
+    warmup_seconds = time.perf_counter() - start
+
+    levels = []
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        bytes_before = checkpoint_bytes(memory)
+        level = asyncio.run(run_level(args, concurrency))
+        sessions = concurrency * args.sessions_per_worker
+        level["checkpoint_bytes_written"] = checkpoint_bytes(memory) - bytes_before
+        level["checkpoint_bytes_per_session"] = (
+            level["checkpoint_bytes_written"] / sessions if sessions else 0
+        )
+        level["rss_mb"] = rss_mb()
+        levels.append(level)
+    peak_rss = peak_rss_mb()
+
+    print_report(levels)
+    print(f"\n{'concurrency':>11} {'rss (MB)':>9} {'ckpt bytes':>11} {'per session':>12}")
+    for level in levels:
+        print(
+            f"{level['concurrency']:>11} {level['rss_mb']:>9.1f} "
+            f"{level['checkpoint_bytes_written']:>11} {level['checkpoint_bytes_per_session']:>12.0f}"
+        )
+    print(f"peak RSS of the run: {peak_rss:.1f} MB")
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "base_url", "workdir", "log_level")
+        },
+        "import_seconds": import_seconds,
+        "warmup_seconds": warmup_seconds,
+        "peak_rss_mb": peak_rss,
+        "levels": levels,
+    }
+    output = output.format(commit=commit)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as file:
+            print_comparison(results, json.load(file))
+
+    # the latencies of a run with failed requests are not comparable
+    if any(level["errors"] for level in levels):
+        print("\nSome requests failed, see the errors column and the server log")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
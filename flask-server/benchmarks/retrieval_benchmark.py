@@ -0,0 +1,397 @@
+"""
+Retrieval micro-benchmark over the course material.
+
+Runs the ingestion and retrieval pipeline of the vector stores on the shipped
+course PDFs, week by week as /update-vector-store and /start-tutoring do,
+with the deterministic hashing embeddings, so it needs no network access:
+
+    load               MultiDocumentDirectoryLoaderFactory, one week folder at a time
+    split              the text splitter of rag
+    embed              HashingEmbeddings.embed_documents of the chunks
+    build              FAISS index of the embedded chunks
+    save_local         FAISS.save_local of each week
+    load_local         FAISS.load_local of the weeks of a course
+    merge_from         merge of the weeks into the course store
+    get_titles         RAG.get_titles of the merged store
+    similarity_search  the QUERIES against the merged store
+
+Time is the median of --repeat runs. Memory is measured in two more runs,
+each in a fresh process so that the memory freed by the timed runs is not
+reused: the peak of the Python allocations of each stage (tracemalloc), and
+the growth of the RSS of each stage, which includes the native memory of
+FAISS and numpy that tracemalloc does not see. The size of the FAISS indexes
+(vectors x dimensions x 4 bytes) is reported as well. With --baseline, exits
+with status 1 if a stage is slower or takes more memory, or the indexes are
+larger, than in the baseline by more than --threshold:
+
+    python benchmarks/retrieval_benchmark.py --repeat 3 \
+        --baseline benchmarks/results/retrieval-<commit>.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from typing import Dict, List
+
+from bench_utils import RESULTS_DIR, SERVER_DIR, change, git_commit, peak_rss_mb, rss_mb
+
+sys.path.insert(0, SERVER_DIR)
+# rag creates its embeddings on import
+os.environ["EMBEDDING_PROVIDER"] = "hashing"
+
+from langchain_community.vectorstores import FAISS  # noqa: E402
+
+from rag import text_splitter  # noqa: E402
+from rag.embedding_providers import HashingEmbeddings  # noqa: E402
+from rag.FAISS_vector_stores import (  # noqa: E402
+    FAISSVectorStoreFactory,
+    MultiDocumentDirectoryLoaderFactory,
+)
+from rag.RAG import RAG  # noqa: E402
+
+COURSE_MATERIAL_DIR = os.path.join(SERVER_DIR, "course_material")
+STAGES = [
+    "load",
+    "split",
+    "embed",
+    "build",
+    "save_local",
+    "load_local",
+    "merge_from",
+    "get_titles",
+    "similarity_search",
+]
+QUERIES = [
+    "What is the difference between a class and an object?",
+    "How does method overloading work in Java?",
+    "Explain inheritance and the super keyword",
+    "What is an interface and how is it different from an abstract class?",
+    "How do you handle exceptions with try catch finally?",
+    "How do I connect to a database with JDBC?",
+    "How do you create and start a thread?",
+    "What is the difference between a stack and a queue?",
+    "How does a heap implement a priority queue?",
+    "What is the running time of binary search?",
+    "How do hash tables resolve collisions?",
+    "How do you traverse a binary search tree in order?",
+]
+
+
+class StageRecorder:
+    """
+    Wall time, number of runs and, if enabled, Python allocation peak (traced)
+    or RSS growth (summed over the calls) of each stage
+    """
+
+    def __init__(self, trace_memory: bool = False, measure_rss: bool = False):
+        self.trace_memory = trace_memory
+        self.measure_rss = measure_rss
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.peak_mb: Dict[str, float] = defaultdict(float)
+        self.rss_mb: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name: str, calls: int = 1):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+        if self.measure_rss:
+            rss_before = rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += calls
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                self.peak_mb[name] = max(self.peak_mb[name], (peak - baseline) / 1024**2)
+            if self.measure_rss:
+                self.rss_mb[name] += max(rss_mb() - rss_before, 0.0)
+
+
+def week_folders(course: str) -> List[str]:
+    """The week folders of a course that contain files, in week order"""
+    course_dir = os.path.join(COURSE_MATERIAL_DIR, course)
+    weeks = sorted(
+        (name for name in os.listdir(course_dir) if name.isdigit()), key=int
+    )
+    return [
+        os.path.join(course_dir, week)
+        for week in weeks
+        if os.listdir(os.path.join(course_dir, week))
+    ]
+
+
+def run_pipeline(
+    recorder: StageRecorder, courses: List[str], args: argparse.Namespace
+) -> dict:
+    """
+    Ingest the weeks of each course and query the merged course stores.
+
+    Returns:
+        dict: The size of the corpus: documents, chunks and vectors
+    """
+    embeddings = HashingEmbeddings(size=args.embedding_size)
+    loader_factory = MultiDocumentDirectoryLoaderFactory()
+    corpus = defaultdict(int)
+
+    with tempfile.TemporaryDirectory(prefix="retrieval-benchmark-") as store_root:
+        for course in courses:
+            paths = []
+            for week_folder in week_folders(course):
+                with recorder.stage("load"), redirect_stdout(io.StringIO()):
+                    documents = loader_factory.create_loader(week_folder).load()
+                    # the cleaning of embed_documents in the app
+                    for document in documents:
+                        document.page_content = " ".join(document.page_content.split())
+                with recorder.stage("split"):
+                    chunks = text_splitter.split_documents(documents)
+                if not chunks:
+                    continue
+                texts = [chunk.page_content for chunk in chunks]
+                with recorder.stage("embed"):
+                    vectors = embeddings.embed_documents(texts)
+                with recorder.stage("build"):
+                    store = FAISS.from_embeddings(
+                        list(zip(texts, vectors)),
+                        embeddings,
+                        metadatas=[chunk.metadata for chunk in chunks],
+                    )
+                path = os.path.join(store_root, course, os.path.basename(week_folder))
+                with recorder.stage("save_local"):
+                    store.save_local(path)
+                paths.append(path)
+                corpus["documents"] += len(documents)
+                corpus["chunks"] += len(chunks)
+            if not paths:
+                continue
+
+            with recorder.stage("load_local", calls=len(paths)):
+                stores = [
+                    FAISS.load_local(
+                        path, embeddings, allow_dangerous_deserialization=True
+                    )
+                    for path in paths
+                ]
+            merged = stores[0]
+            with recorder.stage("merge_from", calls=len(stores) - 1):
+                for store in stores[1:]:
+                    merged.merge_from(store)
+            corpus["vectors"] += merged.index.ntotal
+            # float32 vectors, allocated by FAISS outside of the Python heap
+            corpus["index_mb"] += merged.index.ntotal * merged.index.d * 4 / 1024**2
+
+            rag = RAG(embeddings, text_splitter, loader_factory, FAISSVectorStoreFactory())
+            with recorder.stage("get_titles"):
+                rag.get_titles(vector_store=merged)
+            with recorder.stage("similarity_search", calls=len(QUERIES)):
+                for query in QUERIES:
+                    merged.similarity_search(query, k=args.k)
+    return dict(corpus)
+
+
+def memory_run(courses: List[str], args: argparse.Namespace, trace: bool) -> dict:
+    """Python allocation peaks (trace) or RSS growth of the stages of one run"""
+    recorder = StageRecorder(trace_memory=trace, measure_rss=not trace)
+    if trace:
+        tracemalloc.start()
+    try:
+        run_pipeline(recorder, courses, args)
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return dict(recorder.peak_mb if trace else recorder.rss_mb)
+
+
+def benchmark(courses: List[str], args: argparse.Namespace) -> dict:
+    """Median time of `args.repeat` runs and memory of the stages"""
+    runs = []
+    for _ in range(max(1, args.repeat)):
+        recorder = StageRecorder()
+        corpus = run_pipeline(recorder, courses, args)
+        runs.append(recorder)
+
+    # fresh processes, the RSS of this one already holds the memory of the runs
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        peak_mb = pool.apply(memory_run, (courses, args, True))
+        rss_growth_mb = pool.apply(memory_run, (courses, args, False))
+
+    stages = {}
+    for name in STAGES:
+        seconds = statistics.median(run.seconds[name] for run in runs)
+        calls = runs[0].calls[name]
+        stages[name] = {
+            "seconds": seconds,
+            "calls": calls,
+            "ms_per_call": seconds / calls * 1000 if calls else 0.0,
+            "peak_mb": peak_mb.get(name, 0.0),
+            "rss_mb": rss_growth_mb.get(name, 0.0),
+        }
+    return {"corpus": corpus, "stages": stages}
+
+
+def find_regressions(
+    results: dict, baseline: dict, args: argparse.Namespace
+) -> List[str]:
+    """Stages slower or larger, or indexes larger, than in the baseline beyond the threshold"""
+
+    def grew(value: float, base: float, minimum: float) -> bool:
+        return value > base * (1 + args.threshold) and value - base > minimum
+
+    regressions = []
+    index_mb = results["corpus"].get("index_mb", 0.0)
+    base_index_mb = baseline["corpus"].get("index_mb")
+    if base_index_mb is not None and grew(index_mb, base_index_mb, args.min_mb):
+        regressions.append(
+            f"index size: {index_mb:.1f} MB vs {base_index_mb:.1f} MB "
+            f"({change(index_mb, base_index_mb)})"
+        )
+    for name, stats in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if not base:
+            continue
+        if (
+            stats["seconds"] > base["seconds"] * (1 + args.threshold)
+            and stats["seconds"] - base["seconds"] > args.min_seconds
+        ):
+            regressions.append(
+                f"{name}: {stats['seconds']:.3f}s vs {base['seconds']:.3f}s "
+                f"({change(stats['seconds'], base['seconds'])})"
+            )
+        for key, label in (("peak_mb", "Python"), ("rss_mb", "RSS")):
+            if key in base and grew(stats[key], base[key], args.min_mb):
+                regressions.append(
+                    f"{name}: {stats[key]:.1f} MB vs {base[key]:.1f} MB {label} "
+                    f"({change(stats[key], base[key])})"
+                )
+    return regressions
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(
+        f"{'stage':<18} {'time (s)':>9} {'calls':>6} {'ms/call':>9} {'peak (MB)':>10}"
+        f" {'rss (MB)':>9}"
+        + (f" {'time':>8} {'memory':>8} {'rss':>8}" if baseline else "")
+    )
+    for name, stats in results["stages"].items():
+        line = (
+            f"{name:<18} {stats['seconds']:>9.3f} {stats['calls']:>6} "
+            f"{stats['ms_per_call']:>9.2f} {stats['peak_mb']:>10.1f} {stats['rss_mb']:>9.1f}"
+        )
+        base = (baseline or {}).get("stages", {}).get(name)
+        if base:
+            line += (
+                f" {change(stats['seconds'], base['seconds']):>8}"
+                f" {change(stats['peak_mb'], base['peak_mb']):>8}"
+                f" {change(stats['rss_mb'], base.get('rss_mb', 0.0)):>8}"
+            )
+        print(line)
+    corpus = results["corpus"]
+    print(
+        f"\n{corpus.get('documents', 0)} pages, {corpus.get('chunks', 0)} chunks, "
+        f"{corpus.get('vectors', 0)} vectors ({corpus.get('index_mb', 0.0):.1f} MB of index), "
+        f"peak RSS {results['peak_rss_mb']:.1f} MB"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--courses",
+        help="Comma separated course folders (default: all of course_material)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--embedding-size", type=int, default=384)
+    parser.add_argument(
+        "--output",
+        help="Results file (default: benchmarks/results/retrieval-<commit>.json)",
+    )
+    parser.add_argument("--baseline", help="Results file of a run to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Relative increase of a stage time or memory reported as a regression",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.01,
+        help="Time increases below this are never regressions (timer noise)",
+    )
+    parser.add_argument(
+        "--min-mb",
+        type=float,
+        default=1.0,
+        help="Memory increases below this are never regressions",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    courses = (
+        args.courses.split(",")
+        if args.courses
+        else sorted(
+            name
+            for name in os.listdir(COURSE_MATERIAL_DIR)
+            if os.path.isdir(os.path.join(COURSE_MATERIAL_DIR, name))
+        )
+    )
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "courses": courses,
+            "repeat": args.repeat,
+            "k": args.k,
+            "embedding_size": args.embedding_size,
+            "chunk_size": text_splitter._chunk_size,
+            "chunk_overlap": text_splitter._chunk_overlap,
+        },
+        **benchmark(courses, args),
+    }
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"retrieval-{results['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {output}")
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Retrieval quality vs. latency of the vector store configurations.
+
+Evaluates the labeled questions of retrieval_eval_set.json (questions on the
+course material with the PDF pages that answer them) against the course
+vector stores built with each configuration of the grid:
+
+    chunk size   --chunk-sizes, overlap --chunk-overlap of the chunk size
+    splitter     --splitters: character (the splitter of rag) or recursive
+    index        --indexes: flat (exact, the FAISS default), hnsw or ivf
+    k            --ks: number of chunks returned by similarity_search
+
+For each configuration it reports recall@k (share of the questions with a
+chunk of a relevant page in the top k), MRR (mean reciprocal rank of the
+first relevant chunk within the top k), the p50/p95 search latency and the
+index build time, then the fastest configuration whose recall@k and MRR are
+within --tolerance of the best ones.
+
+Runs offline with the hashing embeddings (default), or with real embeddings
+cached on disk: --embeddings google embeds the chunks and the questions once,
+later runs read them from --cache-dir.
+
+    python benchmarks/retrieval_eval.py --chunk-sizes 300,500,1000 --ks 1,3,5
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from itertools import product
+from typing import Dict, List, Tuple
+
+from bench_utils import BENCHMARKS_DIR, RESULTS_DIR, SERVER_DIR, git_commit
+
+sys.path.insert(0, SERVER_DIR)
+# rag creates its embeddings on import
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+
+import faiss  # noqa: E402
+import numpy as np  # noqa: E402
+from langchain.embeddings.base import Embeddings  # noqa: E402
+from langchain.schema import Document  # noqa: E402
+from langchain.text_splitter import (  # noqa: E402
+    CharacterTextSplitter,
+    RecursiveCharacterTextSplitter,
+    TextSplitter,
+)
+from langchain_community.docstore.in_memory import InMemoryDocstore  # noqa: E402
+from langchain_community.vectorstores import FAISS  # noqa: E402
+
+from rag.embedding_providers import create_embeddings  # noqa: E402
+from rag.FAISS_vector_stores import MultiDocumentDirectoryLoaderFactory  # noqa: E402
+
+COURSE_MATERIAL_DIR = os.path.join(SERVER_DIR, "course_material")
+EVAL_SET_PATH = os.path.join(BENCHMARKS_DIR, "retrieval_eval_set.json")
+SPLITTERS = {
+    "character": CharacterTextSplitter,
+    "recursive": RecursiveCharacterTextSplitter,
+}
+INDEXES = ["flat", "hnsw", "ivf"]
+
+
+def load_embeddings(args: argparse.Namespace) -> Embeddings:
+    """The embeddings of the evaluation, cached on disk unless they are local"""
+    embeddings = create_embeddings(args.embeddings)
+    if args.embeddings == "hashing":
+        return embeddings
+    from langchain.embeddings import CacheBackedEmbeddings
+    from langchain.storage import LocalFileStore
+
+    return CacheBackedEmbeddings.from_bytes_store(
+        embeddings,
+        LocalFileStore(os.path.join(args.cache_dir, args.embeddings)),
+        namespace=args.embeddings,
+        query_embedding_cache=True,
+    )
+
+
+def load_course(course: str) -> List[Document]:
+    """The pages of the week folders of a course, cleaned as embed_documents does"""
+    course_dir = os.path.join(COURSE_MATERIAL_DIR, course)
+    loader_factory = MultiDocumentDirectoryLoaderFactory()
+    documents = []
+    for week in sorted(os.listdir(course_dir), key=lambda name: (len(name), name)):
+        week_dir = os.path.join(course_dir, week)
+        if not week.isdigit() or not os.listdir(week_dir):
+            continue
+        with redirect_stdout(io.StringIO()):
+            documents.extend(loader_factory.create_loader(week_dir).load())
+    for document in documents:
+        document.page_content = " ".join(document.page_content.split())
+    return documents
+
+
+def build_index(
+    name: str, dimension: int, vectors: np.ndarray, args: argparse.Namespace
+) -> faiss.Index:
+    if name == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if name == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, args.hnsw_m)
+        index.hnsw.efSearch = args.hnsw_ef_search
+        return index
+    if name == "ivf":
+        nlist = max(1, min(args.ivf_nlist, len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+        index.train(vectors)
+        index.nprobe = min(args.ivf_nprobe, nlist)
+        return index
+    raise ValueError(f"Unknown index: {name}. Available: {', '.join(INDEXES)}")
+
+
+def build_store(
+    chunks: List[Document],
+    vectors: List[List[float]],
+    embeddings: Embeddings,
+    index_name: str,
+    args: argparse.Namespace,
+) -> Tuple[FAISS, float]:
+    """
+    Vector store of the embedded chunks with the given index.
+
+    Returns:
+        Tuple[FAISS, float]: The store and its build time
+    """
+    texts = [chunk.page_content for chunk in chunks]
+    start = time.perf_counter()
+    array = np.asarray(vectors, dtype=np.float32)
+    index = build_index(index_name, array.shape[1], array, args)
+    store = FAISS(embeddings, index, InMemoryDocstore(), {})
+    store.add_embeddings(
+        list(zip(texts, vectors)), metadatas=[chunk.metadata for chunk in chunks]
+    )
+    return store, time.perf_counter() - start
+
+
+def first_relevant_rank(results: List[Document], question: dict) -> int:
+    """1-based rank of the first chunk of a relevant page, 0 if there is none"""
+    pages = set(question["pages"])
+    for rank, document in enumerate(results, 1):
+        if (
+            os.path.basename(document.metadata.get("source", "")) == question["file"]
+            and document.metadata.get("page") in pages
+        ):
+            return rank
+    return 0
+
+
+def evaluate(
+    stores: Dict[str, FAISS], questions: List[dict], k: int
+) -> Dict[str, float]:
+    """recall@k, MRR and search latency of the questions against their course store"""
+    ranks, latencies = [], []
+    for question in questions:
+        start = time.perf_counter()
+        results = stores[question["course"]].similarity_search(question["question"], k=k)
+        latencies.append(time.perf_counter() - start)
+        ranks.append(first_relevant_rank(results, question))
+    latencies.sort()
+    return {
+        "recall": sum(1 for rank in ranks if rank) / len(ranks),
+        "mrr": sum(1 / rank for rank in ranks if rank) / len(ranks),
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": latencies[max(0, round(0.95 * len(latencies)) - 1)] * 1000,
+    }
+
+
+def pick_fastest(configurations: List[dict], tolerance: float) -> dict:
+    """The fastest configuration within `tolerance` of the best recall and MRR, for each k"""
+    picks = {}
+    for k in sorted({configuration["k"] for configuration in configurations}):
+        candidates = [c for c in configurations if c["k"] == k]
+        best_recall = max(c["recall"] for c in candidates)
+        best_mrr = max(c["mrr"] for c in candidates)
+        holding = [
+            c
+            for c in candidates
+            if c["recall"] >= best_recall - tolerance and c["mrr"] >= best_mrr - tolerance
+        ]
+        picks[k] = min(holding, key=lambda c: c["latency_p50_ms"])
+    return picks
+
+
+def describe(configuration: dict) -> str:
+    return (
+        f"{configuration['splitter']:<10} {configuration['chunk_size']:>6} "
+        f"{configuration['index']:<5} {configuration['k']:>3}"
+    )
+
+
+def print_report(configurations: List[dict], picks: dict):
+    print(
+        f"{'splitter':<10} {'chunk':>6} {'index':<5} {'k':>3} {'chunks':>7} "
+        f"{'recall@k':>9} {'MRR':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'build (s)':>10}"
+    )
+    for c in configurations:
+        print(
+            f"{describe(c)} {c['chunks']:>7} {c['recall']:>9.3f} {c['mrr']:>6.3f} "
+            f"{c['latency_p50_ms']:>9.2f} {c['latency_p95_ms']:>9.2f} {c['build_seconds']:>10.2f}"
+        )
+    print("\nFastest configuration holding quality:")
+    for k, c in picks.items():
+        print(f"  k={k}: {describe(c)}  recall@k {c['recall']:.3f}, MRR {c['mrr']:.3f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--eval-set", default=EVAL_SET_PATH)
+    parser.add_argument("--chunk-sizes", default="300,500,1000")
+    parser.add_argument(
+        "--chunk-overlap", type=float, default=0.2, help="Overlap, share of the chunk size"
+    )
+    parser.add_argument("--splitters", default=",".join(SPLITTERS))
+    parser.add_argument("--indexes", default=",".join(INDEXES))
+    parser.add_argument("--ks", default="1,3,5,10")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--hnsw-ef-search", type=int, default=64)
+    parser.add_argument("--ivf-nlist", type=int, default=64)
+    parser.add_argument("--ivf-nprobe", type=int, default=8)
+    parser.add_argument(
+        "--embeddings",
+        default="hashing",
+        help="Embedding provider (rag/embedding_providers.py); other than hashing, "
+        "cached in --cache-dir",
+    )
+    parser.add_argument(
+        "--cache-dir", default=os.path.join(BENCHMARKS_DIR, "embedding_cache")
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="Recall and MRR loss accepted for a faster configuration",
+    )
+    parser.add_argument(
+        "--output",
+        help="Results file (default: benchmarks/results/retrieval-eval-<commit>.json)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.eval_set, encoding="utf-8") as file:
+        questions = json.load(file)["questions"]
+    embeddings = load_embeddings(args)
+    documents = {
+        course: load_course(course)
+        for course in sorted({question["course"] for question in questions})
+    }
+    ks = [int(k) for k in args.ks.split(",")]
+
+    configurations = []
+    for splitter_name, chunk_size in product(
+        args.splitters.split(","), [int(size) for size in args.chunk_sizes.split(",")]
+    ):
+        chunk_overlap = int(chunk_size * args.chunk_overlap)
+        splitter: TextSplitter = SPLITTERS[splitter_name](
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        # the chunks are embedded once, then indexed with each index type
+        embedded = {}
+        for course, course_documents in documents.items():
+            chunks = splitter.split_documents(course_documents)
+            embedded[course] = (
+                chunks,
+                embeddings.embed_documents([chunk.page_content for chunk in chunks]),
+            )
+        for index_name in args.indexes.split(","):
+            stores, build_seconds = {}, 0.0
+            for course, (chunks, vectors) in embedded.items():
+                stores[course], seconds = build_store(
+                    chunks, vectors, embeddings, index_name, args
+                )
+                build_seconds += seconds
+            for k in ks:
+                configurations.append(
+                    {
+                        "splitter": splitter_name,
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "index": index_name,
+                        "k": k,
+                        "chunks": sum(len(chunks) for chunks, _ in embedded.values()),
+                        "build_seconds": build_seconds,
+                        **evaluate(stores, questions, k),
+                    }
+                )
+
+    picks = pick_fastest(configurations, args.tolerance)
+    print_report(configurations, picks)
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"retrieval-eval-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": datetime.now().isoformat(),
+                "embeddings": args.embeddings,
+                "questions": len(questions),
+                "configurations": configurations,
+                "picks": {str(k): c for k, c in picks.items()},
+            },
+            file,
+            indent=2,
+        )
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -66,12 +66,17 @@ class RAG:
     def save_vector_store(self, folder_path: str):
         self.vector_store.save_local(folder_path)
 
-    def get_titles(self, file_name: Optional[str] = None) -> List[str]:
+    def get_titles(
+        self,
+        file_name: Optional[str] = None,
+        vector_store: Optional[VectorStore] = None,
+    ) -> List[str]:
         """
         Get the titles of the documents in the vector store.
 
         Args:
             file_name (Optional[str], optional): Get the titles of the documents with this file name (extension not included). Defaults to None.
+            vector_store (Optional[VectorStore], optional): The vector store to read, instead of the one of this instance. Defaults to None.
 
         Raises:
             ValueError: If no vector store is available.
@@ -100,11 +105,12 @@ class RAG:
         #                 for document in self.documents
         #             ]
         #         )
-        if self.vector_store:
+        vector_store = vector_store or self.vector_store
+        if vector_store:
             # Get titles from vector store
             # For Chroma:
-            if hasattr(self.vector_store, "get"):
-                docs = self.vector_store.get()
+            if hasattr(vector_store, "get"):
+                docs = vector_store.get()
                 if file_name:
                     titles_set = set(
                         [
@@ -120,8 +126,8 @@ class RAG:
                         [doc.page_content.split("\n")[0] for doc in docs["documents"]]
                     )
             # For FAISS:
-            elif hasattr(self.vector_store, "docstore"):
-                docs = list(self.vector_store.docstore._dict.values())
+            elif hasattr(vector_store, "docstore"):
+                docs = list(vector_store.docstore._dict.values())
                 if file_name:
                     titles_set = set(
                         [
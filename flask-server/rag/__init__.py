@@ -5,14 +5,15 @@ from rag.FAISS_vector_stores import (
     MultiDocumentDirectoryLoaderFactory,
 )
 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
 from rag.RAG import RAG
+from rag.embedding_providers import create_embeddings
 
 load_dotenv()
 
 # Initialize dependencies
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+# "google", or "hashing" for offline runs, see rag/embedding_providers.py
+embeddings = create_embeddings()
 
 text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
 vector_store_factory = FAISSVectorStoreFactory()
@@ -0,0 +1,98 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+@lru_cache(maxsize=65536)
+def _token_bucket(token: str, size: int) -> tuple:
+    # stable across processes, unlike hash()
+    digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+    return digest % size, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings for offline runs (benchmarks, load tests).
+
+    Each word (and each pair of consecutive words) is hashed into one of
+    `size` signed buckets, weighted by its log frequency, and the vector is
+    L2-normalized. Texts sharing words are close, so similarity search still
+    ranks lexically relevant chunks first; the same text always gets the same
+    vector, with no model download or API call.
+    """
+
+    def __init__(self, size: int = 384, bigrams: bool = True):
+        """
+        Args:
+            size: Dimension of the vectors
+            bigrams: Whether pairs of consecutive words are also hashed
+        """
+        self.size = size
+        self.bigrams = bigrams
+
+    def _features(self, text: str) -> Counter:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = Counter(tokens)
+        if self.bigrams:
+            features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for feature, count in self._features(text).items():
+            bucket, sign = _token_bucket(feature, self.size)
+            vector[bucket] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def create_google_embeddings() -> Embeddings:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+
+
+def create_hashing_embeddings() -> Embeddings:
+    return HashingEmbeddings(size=int(os.getenv("HASHING_EMBEDDING_SIZE", "384")))
+
+
+EMBEDDING_PROVIDERS: Dict[str, Callable[[], Embeddings]] = {
+    "google": create_google_embeddings,
+    "hashing": create_hashing_embeddings,
+}
+
+
+def create_embeddings(provider: Optional[str] = None) -> Embeddings:
+    """
+    Create the embeddings of the vector stores.
+
+    Args:
+        provider (Optional[str]): Name of the provider in EMBEDDING_PROVIDERS.
+            Defaults to the EMBEDDING_PROVIDER environment variable, or "google".
+
+    Raises:
+        ValueError: If the provider is unknown
+
+    Returns:
+        Embeddings: The embeddings
+    """
+    provider = (provider or os.getenv("EMBEDDING_PROVIDER", "google")).lower()
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(
+            f"Unknown embedding provider: {provider}. Available: {', '.join(EMBEDDING_PROVIDERS)}"
+        )
+    return EMBEDDING_PROVIDERS[provider]()
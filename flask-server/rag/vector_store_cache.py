@@ -0,0 +1,280 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.vectorstores import VectorStore
+
+from telemetry import CACHE_BYTES, CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS
+
+
+def estimate_vector_store_bytes(vector_store: VectorStore) -> int:
+    """
+    Estimate the memory used by a vector store.
+
+    For FAISS: the vectors (float32) plus the text and metadata of the documents.
+    """
+    index = getattr(vector_store, "index", None)
+    docstore = getattr(vector_store, "docstore", None)
+    if index is None or docstore is None:
+        return sys.getsizeof(vector_store)
+
+    vectors_bytes = index.ntotal * index.d * 4
+    documents_bytes = sum(
+        len(document.page_content) + len(str(document.metadata))
+        for document in getattr(docstore, "_dict", {}).values()
+    )
+    return vectors_bytes + documents_bytes
+
+
+@dataclass
+class CacheEntry:
+    vector_store: VectorStore
+    size_bytes: int
+    last_access: float
+
+
+class VectorStoreCache:
+    """
+    LRU cache of vector stores, with a TTL since the last access.
+
+    Bounded by the number of entries and by the estimated bytes of the entries.
+    Expired and least recently used entries are evicted when an entry is added,
+    and expired entries are also dropped on lookup, so no periodic scan is needed.
+    All operations are O(1) (amortized for the evictions) and thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        max_bytes: int = 2 * 1024**3,
+        ttl_seconds: float = 2 * 3600,
+        name: str = "vector_store",
+    ):
+        """
+        Args:
+            max_entries: Maximum number of vector stores
+            max_bytes: Maximum estimated bytes of the vector stores
+            ttl_seconds: Vector stores not accessed for this long are evicted
+            name: Name of the cache in the metrics
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+
+        # least recently used first
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._resident_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions: Dict[str, int] = {"ttl": 0, "entries": 0, "bytes": 0, "removed": 0}
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.last_access > self.ttl_seconds
+
+    def _evict(self, key: str, reason: str):
+        entry = self._entries.pop(key)
+        self._resident_bytes -= entry.size_bytes
+        self._evictions[reason] += 1
+        CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
+        logging.info(f"Evicted vector store {key} ({reason})")
+
+    def _evict_expired(self, now: float):
+        # entries are ordered by last access, the expired ones are at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._expired(entry, now):
+                break
+            self._evict(key, "ttl")
+
+    def _report(self):
+        CACHE_ENTRIES.labels(cache=self.name).set(len(self._entries))
+        CACHE_BYTES.labels(cache=self.name).set(self._resident_bytes)
+
+    def _record_miss(self):
+        self._misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+
+    def record_miss(self):
+        """Record a lookup that missed before reaching the cache"""
+        with self._lock:
+            self._record_miss()
+
+    def get(self, key: str) -> Optional[VectorStore]:
+        """Return the vector store of a key and mark it as recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and self._expired(entry, now):
+                self._evict(key, "ttl")
+                self._report()
+                entry = None
+
+            if entry is None:
+                self._record_miss()
+                return None
+
+            entry.last_access = now
+            self._entries.move_to_end(key)
+            self._hits += 1
+            CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+            return entry.vector_store
+
+    def put(self, key: str, vector_store: VectorStore):
+        """Add a vector store, evicting entries to stay within the bounds"""
+        size_bytes = estimate_vector_store_bytes(vector_store)
+        with self._lock:
+            if key in self._entries:
+                self._resident_bytes -= self._entries.pop(key).size_bytes
+            now = time.monotonic()
+            self._entries[key] = CacheEntry(vector_store, size_bytes, now)
+            self._resident_bytes += size_bytes
+
+            self._evict_expired(now)
+            # keep the new entry even if it exceeds the byte bound alone
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)), "entries")
+            while self._resident_bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict(next(iter(self._entries)), "bytes")
+            self._report()
+
+    def peek(self, key: str) -> Optional[VectorStore]:
+        """Return the vector store of a key without recording a lookup"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry, time.monotonic()):
+                return None
+            return entry.vector_store
+
+    def remove(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._evict(key, "removed")
+                self._report()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry, time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self._resident_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": dict(self._evictions),
+            }
+
+
+class SessionVectorStores:
+    """
+    Vector stores of the tutoring sessions, shared between the sessions using
+    the same week indexes.
+
+    The merged vector store of a session only depends on its week index paths,
+    so the stores are cached by paths and each session (thread) points to its
+    paths. A session continued on a worker that did not start it reuses the
+    store of any other session of the same course and weeks in that worker,
+    and concurrent loads of the same paths are done once.
+
+    The stores are per process: there is no thread affinity between workers, so
+    a session continued on a worker without a store of its paths reloads it.
+    """
+
+    def __init__(self, stores: VectorStoreCache, max_threads: int = 10000):
+        """
+        Args:
+            stores: Cache of the vector stores, by paths
+            max_threads: Maximum number of remembered sessions (LRU)
+        """
+        self.stores = stores
+        self.max_threads = max_threads
+        # thread_id -> paths key, least recently used first
+        self._threads: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def paths_key(vector_store_paths: List[str]) -> str:
+        return "|".join(str(path) for path in vector_store_paths)
+
+    def _bind(self, thread_id: str, key: str):
+        with self._lock:
+            self._threads[thread_id] = key
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def __contains__(self, thread_id: str) -> bool:
+        """Whether the session used a vector store of this process"""
+        with self._lock:
+            return thread_id in self._threads
+
+    def get(self, thread_id: str) -> Optional[VectorStore]:
+        """Return the vector store of a session, or None if it is not cached"""
+        with self._lock:
+            key = self._threads.get(thread_id)
+        if key is None:
+            self.stores.record_miss()
+            return None
+        return self.stores.get(key)
+
+    def load(
+        self,
+        thread_id: str,
+        vector_store_paths: List[str],
+        loader: Callable[[List[str]], VectorStore],
+    ) -> Tuple[VectorStore, bool]:
+        """
+        Return the vector store of the paths, loading it if no session uses it.
+
+        Args:
+            thread_id: The session using the vector store
+            vector_store_paths: Paths of the week indexes to merge
+            loader: Loads and merges the week indexes
+
+        Returns:
+            Tuple[VectorStore, bool]: The vector store, and whether it was loaded
+        """
+        key = self.paths_key(vector_store_paths)
+        self._bind(thread_id, key)
+        vector_store = self.stores.get(key)
+        if vector_store is not None:
+            return vector_store, False
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # loaded by another request while waiting for the lock
+            vector_store = self.stores.peek(key)
+            if vector_store is not None:
+                return vector_store, False
+            vector_store = loader(vector_store_paths)
+            self.stores.put(key, vector_store)
+        with self._lock:
+            self._load_locks.pop(key, None)
+        return vector_store, True
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = len(self._threads)
+        return {**self.stores.stats(), "sessions": sessions}
@@ -0,0 +1,20 @@
+from telemetry.metrics import (
+    CACHE_BYTES,
+    CACHE_ENTRIES,
+    CACHE_EVICTIONS,
+    CACHE_REQUESTS,
+    CHECKPOINT_DURATION,
+    LLM_ANSWER_ATTEMPTS,
+    LLM_DURATION,
+    LLM_RETRIES,
+    LLM_TOKENS,
+    NODE_DURATION,
+    PROMPT_TOKENS_ESTIMATE,
+    RESPONSE_BYTES,
+    VECTOR_SEARCH_DURATION,
+    VECTOR_STORE_RECOVERIES,
+    render_metrics,
+)
+from telemetry.tracing import record_span, span, traced_node
+from telemetry.callbacks import LLMMetricsCallbackHandler
+from telemetry.checkpoint import InstrumentedCheckpointSaver
@@ -0,0 +1,84 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from telemetry.metrics import LLM_DURATION, LLM_TOKENS
+from telemetry.tracing import record_span
+
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records the wall time and the token usage of every LLM call, labelled with the
+    graph node which made it (from the LangGraph run metadata).
+    """
+
+    # cheap bookkeeping only, no need to run in a thread pool for async calls
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> (start time, perf counter, node, thread_id)
+        self._runs: Dict[UUID, Tuple[float, float, str, Optional[str]]] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        self._runs[run_id] = (
+            time.time(),
+            time.perf_counter(),
+            metadata.get("langgraph_node", "none"),
+            metadata.get("thread_id"),
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start_time, start, node, thread_id = run
+        duration = time.perf_counter() - start
+
+        prompt_tokens = 0
+        completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+
+        LLM_DURATION.labels(node=node, status="ok").observe(duration)
+        LLM_TOKENS.labels(node=node, kind="prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(node=node, kind="completion").inc(completion_tokens)
+        record_span(
+            "llm",
+            thread_id,
+            start_time,
+            duration,
+            node=node,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            status="ok",
+        )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start_time, start, node, thread_id = run
+        duration = time.perf_counter() - start
+        LLM_DURATION.labels(node=node, status="error").observe(duration)
+        record_span(
+            "llm", thread_id, start_time, duration, node=node, status="error"
+        )
@@ -0,0 +1,133 @@
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+
+from telemetry.metrics import CHECKPOINT_DURATION
+from telemetry.tracing import record_span
+
+
+class InstrumentedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpointer wrapper recording the wall time of the checkpoint reads and
+    writes of the wrapped checkpointer.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+
+    @property
+    def config_specs(self):
+        return self.saver.config_specs
+
+    def _record(
+        self,
+        operation: str,
+        config: Optional[RunnableConfig],
+        start_time: float,
+        start: float,
+    ):
+        duration = time.perf_counter() - start
+        CHECKPOINT_DURATION.labels(operation=operation).observe(duration)
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        record_span(f"checkpoint:{operation}", thread_id, start_time, duration)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return self.saver.get_tuple(config)
+        finally:
+            self._record("get_tuple", config, start_time, start)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return self.saver.put(config, checkpoint, metadata, new_versions)
+        finally:
+            self._record("put", config, start_time, start)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return self.saver.put_writes(config, writes, task_id, task_path)
+        finally:
+            self._record("put_writes", config, start_time, start)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return await self.saver.aget_tuple(config)
+        finally:
+            self._record("get_tuple", config, start_time, start)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+        finally:
+            self._record("put", config, start_time, start)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        start_time, start = time.time(), time.perf_counter()
+        try:
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+        finally:
+            self._record("put_writes", config, start_time, start)
+
+    def get_next_version(self, current: Optional[Any], channel: Any) -> Any:
+        return self.saver.get_next_version(current, channel)
@@ -0,0 +1,115 @@
+import os
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# LLM calls take from a few hundred milliseconds up to tens of seconds
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+NODE_DURATION = Histogram(
+    "ai_tutor_node_duration_seconds",
+    "Wall time of a tutor graph node",
+    ["node", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "ai_tutor_llm_duration_seconds",
+    "Wall time of an LLM call",
+    ["node", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "ai_tutor_llm_tokens",
+    "Tokens reported by the LLM, by kind (prompt or completion)",
+    ["node", "kind"],
+)
+PROMPT_TOKENS_ESTIMATE = Histogram(
+    "ai_tutor_prompt_tokens_estimate",
+    "Estimated size of the prompt built by a node, in tokens",
+    ["node"],
+    buckets=TOKEN_BUCKETS,
+)
+LLM_RETRIES = Counter(
+    "ai_tutor_llm_retries",
+    "Failed attempts retried by a node",
+    ["function"],
+)
+LLM_ANSWER_ATTEMPTS = Histogram(
+    "ai_tutor_llm_answer_attempts",
+    "LLM calls needed by llm_answer_question to get a well-formed answer",
+    buckets=(1, 2, 3, 4, 5),
+)
+VECTOR_SEARCH_DURATION = Histogram(
+    "ai_tutor_vector_search_duration_seconds",
+    "Wall time of a vector store similarity search",
+    buckets=LATENCY_BUCKETS,
+)
+CHECKPOINT_DURATION = Histogram(
+    "ai_tutor_checkpoint_duration_seconds",
+    "Wall time of a checkpointer operation",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "ai_tutor_cache_requests",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+RESPONSE_BYTES = Histogram(
+    "ai_tutor_response_bytes",
+    "Size of the encoded response body of an endpoint",
+    ["endpoint"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+VECTOR_STORE_RECOVERIES = Counter(
+    "ai_tutor_vector_store_recoveries",
+    "Vector stores missing when a session is continued, by result (shared: "
+    "store of another session reused, loaded: reloaded after an eviction, "
+    "loaded_other_worker: reloaded for a session served by another worker, failed)",
+    ["result"],
+)
+CACHE_EVICTIONS = Counter(
+    "ai_tutor_cache_evictions",
+    "Cache evictions by cache and reason (ttl, entries, bytes, removed)",
+    ["cache", "reason"],
+)
+CACHE_ENTRIES = Gauge(
+    "ai_tutor_cache_entries",
+    "Entries resident in a cache",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+CACHE_BYTES = Gauge(
+    "ai_tutor_cache_bytes",
+    "Estimated bytes resident in a cache",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render the metrics in the Prometheus text format.
+
+    When PROMETHEUS_MULTIPROC_DIR is set (gunicorn with several workers),
+    the metrics of all the worker processes are aggregated.
+
+    Returns:
+        Tuple[bytes, str]: The metrics and their content type
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
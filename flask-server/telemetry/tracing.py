@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from langchain_core.messages import BaseMessage
+from langgraph.config import get_config
+from langgraph.errors import GraphInterrupt
+from langgraph.types import Command
+
+from telemetry.metrics import NODE_DURATION
+
+# Directory of the per-thread span logs (one JSON lines file per thread_id),
+# span logging to files is disabled if not set
+SPAN_LOG_DIR = os.getenv("SPAN_LOG_DIR")
+
+span_logger = logging.getLogger("ai_tutor.spans")
+_span_log_lock = threading.Lock()
+
+R = TypeVar("R")
+
+
+def record_span(
+    name: str,
+    thread_id: Optional[str],
+    start_time: float,
+    duration: float,
+    **attributes: Any,
+):
+    """
+    Record a finished span in the span log of its thread.
+
+    Args:
+        name: Name of the span (node, LLM call, vector search, ...)
+        thread_id: Thread of the tutoring session, if known
+        start_time: Start of the span, as returned by time.time()
+        duration: Duration of the span in seconds
+        attributes: Additional attributes of the span
+    """
+    span = {
+        "name": name,
+        "thread_id": thread_id,
+        "start": datetime.fromtimestamp(start_time).isoformat(),
+        "duration_ms": round(duration * 1000, 2),
+        **attributes,
+    }
+    line = json.dumps(span, default=str)
+    span_logger.debug(line)
+
+    if SPAN_LOG_DIR and thread_id:
+        with _span_log_lock:
+            os.makedirs(SPAN_LOG_DIR, exist_ok=True)
+            with open(
+                os.path.join(SPAN_LOG_DIR, f"{thread_id}.jsonl"), "a", encoding="utf-8"
+            ) as file:
+                file.write(line + "\n")
+
+
+def current_thread_id() -> Optional[str]:
+    """Thread ID of the graph run in progress, None outside of a graph run"""
+    try:
+        return get_config()["configurable"].get("thread_id")
+    except Exception:
+        return None
+
+
+@contextmanager
+def span(name: str, thread_id: Optional[str] = None, **attributes: Any):
+    """
+    Time a block of code and record it as a span.
+
+    Yields a dictionary of attributes which the block can add to.
+    """
+    start_time = time.time()
+    start = time.perf_counter()
+    attributes["status"] = "ok"
+    try:
+        yield attributes
+    except Exception:
+        attributes["status"] = "error"
+        raise
+    finally:
+        record_span(
+            name,
+            thread_id or current_thread_id(),
+            start_time,
+            time.perf_counter() - start,
+            **attributes,
+        )
+
+
+def stamp_messages(result: Any, node: str, timestamp: str):
+    """
+    Record the node and the time that produced the messages of a node update,
+    in their `additional_kwargs` (kept in the checkpoints and the session exports).
+    """
+    update = result.update if isinstance(result, Command) else result
+    if not isinstance(update, dict) or update.get("messages") is None:
+        return
+    messages = update["messages"]
+    for message in messages if isinstance(messages, list) else [messages]:
+        if isinstance(message, BaseMessage):
+            message.additional_kwargs.setdefault("node", node)
+            message.additional_kwargs.setdefault("timestamp", timestamp)
+
+
+def traced_node(
+    func: Callable[..., Awaitable[R]],
+) -> Callable[..., Awaitable[R]]:
+    """
+    Decorator recording the wall time of an async graph node, as a metric and a span.
+    A node stopped by `interrupt` is recorded with the "interrupted" status.
+    The messages returned by the node are stamped with its name, see stamp_messages.
+    """
+    node = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs) -> R:
+        start_time = time.time()
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            result = await func(*args, **kwargs)
+            stamp_messages(result, node, datetime.now().isoformat())
+            return result
+        except GraphInterrupt:
+            status = "interrupted"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            NODE_DURATION.labels(node=node, status=status).observe(duration)
+            record_span(
+                f"node:{node}",
+                current_thread_id(),
+                start_time,
+                duration,
+                status=status,
+            )
+
+    return wrapper
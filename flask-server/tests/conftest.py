@@ -0,0 +1,29 @@
+"""
+Shared fixtures of the tests.
+
+The tests run offline: the app package is imported with the stub LLM, the
+hashing embeddings, the in-memory checkpointer and mongomock, and each test
+gets an empty mongomock database.
+"""
+
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# read when aiTutorAgent and rag are imported
+os.environ["LLM_PROVIDER"] = "stub"
+os.environ["EMBEDDING_PROVIDER"] = "hashing"
+os.environ["CHECKPOINTER"] = "memory"
+os.environ["MONGODB_URI"] = "mongomock://localhost"
+
+from aiTutorAgent.mongo_connection import mongomock_client  # noqa: E402
+
+
+@pytest.fixture
+def database():
+    """An empty mongomock database"""
+    return mongomock_client()["ai_tutor_test"]
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from aiTutorAgent.analysis_jobs import AnalysisJobs
+
+
+class Analyses:
+    """Analysis runner, each run blocking until released"""
+
+    def __init__(self):
+        self.runs = []
+        self.release = threading.Event()
+        self.fail = False
+
+    def __call__(self, kind, params, progress):
+        self.runs.append((kind, params))
+        progress("Summarizing")
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        return {"analysis": f"{kind} {len(self.runs)}"}
+
+
+@pytest.fixture
+def analyses():
+    analyses = Analyses()
+    yield analyses
+    analyses.release.set()
+
+
+def make_jobs(database, analyses, **kwargs):
+    return AnalysisJobs(lambda: database, analyses, **kwargs)
+
+
+def wait_for(jobs, job_id, status):
+    jobs._executor.shutdown(wait=True)
+    job = jobs.get(job_id)
+    assert job["status"] == status
+    return job
+
+
+def test_identical_requests_share_one_job(database, analyses):
+    jobs = make_jobs(database, analyses)
+    first = jobs.submit("student", {"student_id": "100"})
+    second = jobs.submit("student", {"student_id": "100"})
+    other = jobs.submit("student", {"student_id": "200"})
+    analyses.release.set()
+
+    assert first["_id"] == second["_id"] != other["_id"]
+    job = wait_for(jobs, first["_id"], AnalysisJobs.DONE)
+    assert len(analyses.runs) == 2
+    assert AnalysisJobs.to_json(job)["result"] == job["result"]
+
+
+def test_serves_a_fresh_result_without_running_again(database, analyses):
+    analyses.release.set()
+    jobs = make_jobs(database, analyses)
+    job_id = jobs.submit("general", {})["_id"]
+    wait_for(jobs, job_id, AnalysisJobs.DONE)
+
+    rerun = make_jobs(database, analyses)
+    assert rerun.submit("general", {})["status"] == AnalysisJobs.DONE
+    assert len(analyses.runs) == 1
+
+    # completed before the freshness window
+    expired = make_jobs(database, analyses, fresh_for=timedelta(0))
+    assert expired.submit("general", {})["status"] == AnalysisJobs.QUEUED
+    wait_for(expired, job_id, AnalysisJobs.DONE)
+    assert len(analyses.runs) == 2
+
+
+def test_reclaims_a_stale_job(database, analyses):
+    jobs = make_jobs(database, analyses)
+    job_id = AnalysisJobs.job_id("day", {"date": "20250101"})
+    # claimed by a worker that died
+    jobs.collection.insert_one(
+        {
+            "_id": job_id,
+            "kind": "day",
+            "params": {"date": "20250101"},
+            "status": AnalysisJobs.RUNNING,
+            "updated_at": datetime.now() - timedelta(minutes=30),
+        }
+    )
+
+    job = jobs.submit("day", {"date": "20250101"})
+    analyses.release.set()
+
+    assert job["status"] == AnalysisJobs.QUEUED
+    assert wait_for(jobs, job_id, AnalysisJobs.DONE)["result"] == {"analysis": "day 1"}
+
+
+def test_runs_a_failed_job_again(database, analyses):
+    analyses.fail = True
+    analyses.release.set()
+    jobs = make_jobs(database, analyses)
+    job_id = jobs.submit("course", {"course_code": "COMP228"})["_id"]
+    failed = wait_for(jobs, job_id, AnalysisJobs.FAILED)
+    assert AnalysisJobs.to_json(failed)["error"] == "LLM unavailable"
+
+    analyses.fail = False
+    retry = make_jobs(database, analyses)
+    retry.submit("course", {"course_code": "COMP228"})
+    job = wait_for(retry, job_id, AnalysisJobs.DONE)
+    assert "error" not in job
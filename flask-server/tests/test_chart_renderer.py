@@ -0,0 +1,62 @@
+import os
+import threading
+
+from aiTutorAgent.chart_renderer import ChartRenderer, chart
+
+
+def make_renderer(tmp_path, monkeypatch):
+    renderer = ChartRenderer(output_dir=str(tmp_path), max_workers=4)
+    draws = []
+    draw = ChartRenderer._draw
+
+    def counting_draw(spec, path):
+        draws.append(spec["title"])
+        draw(spec, path)
+
+    monkeypatch.setattr(renderer, "_draw", counting_draw)
+    return renderer, draws
+
+
+def test_renders_a_chart_once_per_data(tmp_path, monkeypatch):
+    renderer, draws = make_renderer(tmp_path, monkeypatch)
+    sessions = chart("bar", {"COMP228": 3, "COMP254": 1}, "Sessions per course")
+    share = chart("pie", {"COMP228": 3, "COMP254": 1}, "Share of sessions")
+
+    images = renderer.render_all({"sessions": sessions, "share": share})
+    again = renderer.render_all({"sessions": sessions})
+    changed = renderer.render_all(
+        {"sessions": chart("bar", {"COMP228": 4, "COMP254": 1}, "Sessions per course")}
+    )
+
+    assert sorted(draws) == [
+        "Sessions per course",
+        "Sessions per course",
+        "Share of sessions",
+    ]
+    assert again["sessions"] == images["sessions"]
+    assert changed["sessions"] != images["sessions"]
+    for image in (*images.values(), changed["sessions"]):
+        assert image.startswith("visualizations/")
+        assert os.path.exists(tmp_path / os.path.basename(image))
+    # no temporary image left
+    assert all(name.endswith(".png") for name in os.listdir(tmp_path))
+
+
+def test_concurrent_requests_wait_for_one_rendering(tmp_path, monkeypatch):
+    renderer, draws = make_renderer(tmp_path, monkeypatch)
+    spec = chart("line", {"20250101": 2, "20250102": 5}, "Sessions per day")
+    barrier = threading.Barrier(4)
+    images = []
+
+    def request():
+        barrier.wait(5)
+        images.append(renderer.render_all({"daily": spec})["daily"])
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert draws == ["Sessions per day"]
+    assert len(set(images)) == 1 and len(images) == 4
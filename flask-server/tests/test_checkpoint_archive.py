@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from aiTutorAgent.checkpoint_archive import CheckpointArchive
+from aiTutorAgent.thread_registry import ThreadRegistry
+
+
+@pytest.fixture
+def registry(database):
+    return ThreadRegistry(lambda: database)
+
+
+@pytest.fixture
+def archive(database, registry):
+    return CheckpointArchive(
+        lambda: database,
+        registry,
+        checkpoint_collection_name="checkpoints",
+        writes_collection_name="writes",
+        archive_collection_name="archive",
+    )
+
+
+def add_thread(database, registry, thread_id, last_activity, next_state="student_input"):
+    registry.register(thread_id, "student-1", "COMP228", created_at=last_activity)
+    registry.collection.update_one(
+        {"thread_id": thread_id}, {"$set": {"next_state": next_state}}
+    )
+    for checkpoint_id in ("0001", "0002"):
+        database["checkpoints"].insert_one(
+            {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}
+        )
+        database["writes"].insert_one(
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": "",
+                "checkpoint_id": checkpoint_id,
+                "channel": "__interrupt__",
+            }
+        )
+
+
+def test_archives_the_abandoned_and_finished_threads(database, registry, archive):
+    now = datetime.now()
+    add_thread(database, registry, "abandoned", now - timedelta(hours=30))
+    add_thread(database, registry, "finished", now - timedelta(hours=2), next_state="")
+    add_thread(database, registry, "active", now - timedelta(minutes=5))
+
+    archived = archive.archive_stale_threads(
+        inactive_for=timedelta(hours=24), finished_for=timedelta(hours=1)
+    )
+
+    assert archived == 2
+    assert sorted(database["checkpoints"].distinct("thread_id")) == ["active"]
+    assert sorted(database["writes"].distinct("thread_id")) == ["active"]
+    document = database["archive"].find_one({"thread_id": "abandoned"})
+    # only the final checkpoint and its writes are kept
+    assert document["checkpoint"]["checkpoint_id"] == "0002"
+    assert [write["checkpoint_id"] for write in document["writes"]] == ["0002"]
+    assert registry.get("abandoned")["status"] == ThreadRegistry.ARCHIVED
+    assert registry.get("active")["status"] == ThreadRegistry.ACTIVE
+
+
+def test_restores_an_archived_thread(database, registry, archive):
+    add_thread(database, registry, "thread-1", datetime.now() - timedelta(days=2))
+    assert archive.archive_thread("thread-1")
+
+    assert archive.restore_if_archived("thread-1")
+
+    assert database["checkpoints"].find_one({"thread_id": "thread-1"})["checkpoint_id"] == "0002"
+    assert database["writes"].count_documents({"thread_id": "thread-1"}) == 1
+    assert database["archive"].count_documents({}) == 0
+    assert registry.get("thread-1")["status"] == ThreadRegistry.ACTIVE
+    # an active thread is not restored again
+    assert not archive.restore_if_archived("thread-1")
+
+
+def test_a_thread_is_archived_by_one_worker(database, registry, archive):
+    add_thread(database, registry, "thread-1", datetime.now() - timedelta(days=2))
+    # claimed by another worker
+    assert registry.set_status(
+        "thread-1", ThreadRegistry.ARCHIVING, expected=[ThreadRegistry.ACTIVE, None]
+    )
+
+    assert not archive.archive_thread("thread-1")
+    assert database["checkpoints"].count_documents({"thread_id": "thread-1"}) == 2
@@ -0,0 +1,175 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+
+from aiTutorAgent.delta_checkpoint_saver import (
+    MESSAGE_COUNT_KEY,
+    DeltaCheckpointSaver,
+)
+
+THREAD = {"configurable": {"thread_id": "thread-1", "checkpoint_ns": ""}}
+
+
+def make_saver(database, snapshot_every=50):
+    return DeltaCheckpointSaver(
+        MemorySaver(),
+        database=lambda: database,
+        messages_collection_name="messages",
+        checkpoint_collection_name="checkpoints",
+        writes_collection_name="writes",
+        snapshot_every=snapshot_every,
+    )
+
+
+def make_checkpoint(version, messages):
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = f"{version:08d}"
+    checkpoint["channel_versions"] = {"messages": version}
+    checkpoint["channel_values"] = {"messages": list(messages)}
+    return checkpoint
+
+
+def put(saver, version, messages):
+    return saver.put(THREAD, make_checkpoint(version, messages), {}, {"messages": version})
+
+
+def contents(saver, config):
+    checkpoint = saver.get_tuple(config).checkpoint
+    return [message.content for message in checkpoint["channel_values"]["messages"]]
+
+
+def conversation(count, prefix="m"):
+    return [
+        HumanMessage(content=f"{prefix}{index}", id=f"{prefix}{index}")
+        for index in range(count)
+    ]
+
+
+def test_stores_only_the_new_messages(database):
+    saver = make_saver(database)
+    messages = conversation(5)
+    put(saver, 1, messages[:2])
+    config = put(saver, 2, messages)
+
+    assert database["messages"].count_documents({}) == 5
+    assert contents(saver, config) == ["m0", "m1", "m2", "m3", "m4"]
+    stored = saver.saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+    assert stored[MESSAGE_COUNT_KEY] == 5
+
+
+def test_round_trip_after_a_divergence(database):
+    saver = make_saver(database)
+    messages = conversation(5)
+    first = put(saver, 1, messages[:3])
+    second = put(saver, 2, messages)
+    replaced = messages[:3] + [AIMessage(content="x3", id="x3")]
+    third = put(saver, 3, replaced)
+    truncated = put(saver, 4, messages[:2])
+    appended = put(saver, 5, messages[:2] + [AIMessage(content="y2", id="y2")])
+
+    # every checkpoint reads its own messages, not the rewritten ones
+    assert contents(saver, first) == ["m0", "m1", "m2"]
+    assert contents(saver, second) == ["m0", "m1", "m2", "m3", "m4"]
+    assert contents(saver, third) == ["m0", "m1", "m2", "x3"]
+    assert contents(saver, truncated) == ["m0", "m1"]
+    assert contents(saver, appended) == ["m0", "m1", "y2"]
+    assert [len(t.checkpoint["channel_values"]["messages"]) for t in saver.list(THREAD)] == [
+        3, 2, 4, 5, 3
+    ]
+    assert [(seq, message.content) for seq, message in saver.list_messages("thread-1")] == [
+        (0, "m0"),
+        (1, "m1"),
+        (2, "y2"),
+    ]
+
+
+def test_another_saver_continues_the_thread(database):
+    messages = conversation(4)
+    put(make_saver(database), 1, messages[:2])
+
+    # e.g. another worker, which did not write the thread
+    saver = make_saver(database)
+    config = put(saver, 2, messages)
+
+    assert database["messages"].count_documents({}) == 4
+    assert contents(saver, config) == ["m0", "m1", "m2", "m3"]
+
+
+def test_snapshots_fold_the_messages(database):
+    saver = make_saver(database, snapshot_every=4)
+    messages = conversation(10)
+    for count in range(1, 11):
+        config = put(saver, count, messages[:count])
+
+    snapshots = list(database["messages_snapshots"].find({}, {"_id": 0, "start": 1, "end": 1}))
+    assert snapshots == [{"start": 0, "end": 4}, {"start": 4, "end": 8}]
+    # the snapshots are read instead of the messages they hold
+    database["messages"].delete_many({"seq": {"$lt": 8}})
+    assert contents(saver, config) == [f"m{index}" for index in range(10)]
+    page = saver.list_messages("thread-1", after_seq=2, limit=3)
+    assert [(seq, message.content) for seq, message in page] == [
+        (3, "m3"),
+        (4, "m4"),
+        (5, "m5"),
+    ]
+
+
+def test_reads_messages_stored_before_the_lineages(database):
+    saver = make_saver(database)
+    message = HumanMessage(content="legacy", id="legacy")
+    message_type, message_bytes = saver.serde.dumps_typed(message)
+    database["messages"].insert_one(
+        {
+            "thread_id": "thread-1",
+            "checkpoint_ns": "",
+            "seq": 0,
+            "message_id": "legacy",
+            "type": message_type,
+            "message": message_bytes,
+        }
+    )
+    checkpoint = make_checkpoint(1, [])
+    checkpoint["channel_values"] = {"messages": {MESSAGE_COUNT_KEY: 1}}
+    config = saver.saver.put(THREAD, checkpoint, {}, {"messages": 1})
+    assert contents(saver, config) == ["legacy"]
+
+    config = put(saver, 2, [message, AIMessage(content="new", id="new")])
+    assert contents(saver, config) == ["legacy", "new"]
+    assert database["messages"].count_documents({}) == 2
+
+
+def test_async_run_writes_only_the_last_checkpoint(database):
+    saver = make_saver(database)
+    messages = conversation(3)
+
+    async def run():
+        config = THREAD
+        for version in range(1, 4):
+            config = await saver.aput(
+                config, make_checkpoint(version, messages[:version]), {}, {"messages": version}
+            )
+        # buffered until the flush
+        assert saver.saver.get_tuple(THREAD) is None
+        assert len((await saver.aget_tuple(THREAD)).checkpoint["channel_values"]["messages"]) == 3
+        await saver.aflush(THREAD)
+
+    asyncio.run(run())
+    assert len(list(saver.saver.list(THREAD))) == 1
+    assert contents(saver, THREAD) == ["m0", "m1", "m2"]
+
+
+def test_marks_superseded_checkpoints(database):
+    saver = make_saver(database)
+    # written by the wrapped MongoDB saver
+    database["checkpoints"].insert_many(
+        [
+            {"thread_id": "thread-1", "checkpoint_ns": "", "checkpoint_id": "00000001"},
+            {"thread_id": "thread-2", "checkpoint_ns": "", "checkpoint_id": "00000001"},
+        ]
+    )
+    put(saver, 2, conversation(1))
+
+    superseded = database["checkpoints"].find({"superseded_at": {"$exists": True}})
+    assert [document["thread_id"] for document in superseded] == ["thread-1"]
@@ -0,0 +1,63 @@
+from aiTutorAgent.session_aggregates import SessionAggregates
+from aiTutorAgent.session_store import SessionStore
+
+
+def saved_sessions(database):
+    aggregates = SessionAggregates(lambda: database)
+    store = SessionStore(lambda: database, aggregates=aggregates)
+    for filename, student_id, course_code, time_stamp in [
+        ("a.jsonl", "100", "COMP228", "20250101_0900"),
+        ("b.jsonl", "100", "COMP254", "20250102_0900"),
+        ("c.jsonl", "200", "COMP228", "20250101_1000"),
+        # saved again
+        ("a.jsonl", "100", "COMP228", "20250101_0900"),
+    ]:
+        store.record(filename, student_id, course_code, time_stamp, filepath=filename)
+    return store, aggregates
+
+
+def test_counts_each_session_once_after_save(database):
+    _, aggregates = saved_sessions(database)
+
+    assert aggregates.total() == 3
+    assert aggregates.total(student_id="100") == 2
+    assert aggregates.total(course_code="COMP228", date="20250101") == 2
+    assert aggregates.total(course_code="COMP100") == 0
+
+
+def test_counts_by_dimension(database):
+    _, aggregates = saved_sessions(database)
+
+    assert aggregates.counts("date") == {"20250101": 2, "20250102": 1}
+    assert aggregates.counts("course_code", student_id="100") == {
+        "COMP228": 1,
+        "COMP254": 1,
+    }
+    assert aggregates.counts("student_id", course_code="COMP228") == {
+        "100": 1,
+        "200": 1,
+    }
+    assert aggregates.distinct_count("student_id") == 2
+    assert aggregates.distinct_count("course_code") == 2
+
+
+def test_rebuild_matches_the_incremental_counts(database):
+    store, aggregates = saved_sessions(database)
+    incremental = list(
+        aggregates.collection.find(projection={"_id": 0}).sort(
+            [("date", 1), ("course_code", 1), ("student_id", 1)]
+        )
+    )
+
+    aggregates.rebuild(
+        store.collection.find(
+            projection={"_id": 0, "date": 1, "course_code": 1, "student_id": 1}
+        )
+    )
+
+    rebuilt = list(
+        aggregates.collection.find(projection={"_id": 0}).sort(
+            [("date", 1), ("course_code", 1), ("student_id", 1)]
+        )
+    )
+    assert rebuilt == incremental
@@ -0,0 +1,55 @@
+import os
+
+from aiTutorAgent.session_archive import SessionArchive
+from aiTutorAgent.session_store import SessionStore
+
+
+def test_reads_back_the_appended_sessions(tmp_path):
+    archive = SessionArchive(str(tmp_path))
+    first = archive.append("COMP228", "20250101", b"first session")
+    second = archive.append("COMP228", "20250101", b"second session")
+    other = archive.append("COMP 254/x", "20250101", b"other course")
+
+    assert first["segment"] == second["segment"]
+    assert second["offset"] == first["offset"] + first["length"]
+    assert other["segment"] == os.path.join("COMP_254_x", "20250101", "segment-0.gz")
+    assert archive.read(second) == b"second session"
+    assert [content for _, content in archive.read_many([other, second, first])] == [
+        b"first session",
+        b"second session",
+        b"other course",
+    ]
+
+
+def test_starts_a_new_segment_past_the_size(tmp_path):
+    archive = SessionArchive(str(tmp_path), max_segment_bytes=1)
+    first = archive.append("COMP228", "20250101", b"first session")
+    second = archive.append("COMP228", "20250101", b"second session")
+
+    assert first["segment"].endswith("segment-0.gz")
+    assert second["segment"].endswith("segment-1.gz")
+    assert archive.read(first) == b"first session"
+
+
+def test_store_reads_the_archived_and_legacy_sessions(database, tmp_path):
+    archive = SessionArchive(str(tmp_path / "archive"))
+    store = SessionStore(lambda: database, archive=archive)
+    transcript = tmp_path / "legacy.txt"
+    transcript.write_bytes(b"legacy")
+    store.record("legacy.txt", "100", "COMP228", "20250101_0800", filepath=str(transcript))
+    store.save("a.jsonl", b"session a", "100", "COMP228", "20250101_0900")
+    store.save("b.jsonl", b"session b", "200", "COMP228", "20250101_1000")
+    # saving again points the index to the new copy
+    store.save("a.jsonl", b"session a, again", "100", "COMP228", "20250101_0900")
+
+    read = {
+        session["filename"]: content
+        for session, content in store.read_sessions(store.find())
+    }
+
+    assert read == {
+        "a.jsonl": b"session a, again",
+        "b.jsonl": b"session b",
+        "legacy.txt": b"legacy",
+    }
+    assert store.get("a.jsonl")["content_hash"] != store.get("b.jsonl")["content_hash"]
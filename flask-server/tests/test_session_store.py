@@ -0,0 +1,54 @@
+from aiTutorAgent.session_archive import SessionArchive
+from aiTutorAgent.session_store import SessionStore
+
+
+def make_store(database):
+    return SessionStore(lambda: database)
+
+
+def test_finds_the_sessions_newest_first(database):
+    store = make_store(database)
+    store.record("a.jsonl", "100", "COMP228", "20250101_0900", filepath="a.jsonl")
+    store.record("b.jsonl", "100", "COMP254", "20250102_0900", filepath="b.jsonl")
+    store.record("c.jsonl", "200", "COMP228", "20250101_1000", filepath="c.jsonl")
+
+    assert [s["filename"] for s in store.find()] == ["b.jsonl", "c.jsonl", "a.jsonl"]
+    assert [s["filename"] for s in store.find(student_id="100")] == [
+        "b.jsonl",
+        "a.jsonl",
+    ]
+    assert [s["filename"] for s in store.find(course_code="COMP228")] == [
+        "c.jsonl",
+        "a.jsonl",
+    ]
+    assert [s["filename"] for s in store.find(date="20250102")] == ["b.jsonl"]
+
+
+def test_saving_a_session_again_updates_its_record(database):
+    store = make_store(database)
+    store.record("a.jsonl", "100", "COMP228", "20250101_0900", filepath="old.jsonl")
+    store.record("a.jsonl", "100", "COMP228", "20250101_0900", filepath="new.jsonl")
+
+    assert store.collection.count_documents({}) == 1
+    session = store.get("a.jsonl")
+    assert session["filepath"] == "new.jsonl"
+    assert (session["date"], session["time"]) == ("20250101", "0900")
+    assert "_id" not in session
+
+
+def test_reads_the_legacy_transcripts(database, tmp_path):
+    transcript = tmp_path / "20250101_0900_COMP228_100.txt"
+    transcript.write_bytes(b"Tutor: Hello")
+    store = SessionStore(lambda: database, archive=SessionArchive(str(tmp_path)))
+    store.record(
+        transcript.name, "100", "COMP228", "20250101_0900", filepath=str(transcript)
+    )
+    store.record(
+        "missing.txt", "100", "COMP228", "20250101_0800", filepath="missing.txt"
+    )
+
+    read = list(store.read_sessions(store.find()))
+
+    assert [(s["filename"], content) for s, content in read] == [
+        (transcript.name, b"Tutor: Hello")
+    ]
@@ -0,0 +1,57 @@
+from aiTutorAgent.student_profiles import StudentProfiles
+
+
+def test_counts_the_events_per_subject_and_topic(database):
+    profiles = StudentProfiles(lambda: database)
+    profiles.record_event("100", "question", subject="Java", topic="Classes")
+    profiles.record_event("100", "hint", subject="Java")
+    profiles.record_event(
+        "100", "answer", subject="Java", correct=False, question="What is a class?"
+    )
+    profiles.record_event("100", "answer", subject="Java", correct=True)
+    profiles.record_event("100", "question", subject="Data.Structures", topic="$Stacks")
+
+    profile = profiles.get("100")
+    assert profile["totals"] == {
+        "questions": 2,
+        "hints": 1,
+        "answers": 2,
+        "wrong_answers": 1,
+        "correct_answers": 1,
+    }
+    assert profile["subjects"]["Java"]["topics"] == {"Classes": 1}
+    assert profile["subjects"]["Data_Structures"]["topics"] == {"_Stacks": 1}
+    assert [d["question"] for d in profile["recent_difficulties"]] == [
+        "What is a class?"
+    ]
+    assert profile["last_subject"] == "Data.Structures"
+
+
+def test_adds_the_minutes_of_a_session_once(database):
+    profiles = StudentProfiles(lambda: database)
+    for minutes in (2, 5, 4):
+        profiles.record_event(
+            "100", "hint", subject="Java", thread_id="thread-1", session_minutes=minutes
+        )
+    # abandoned without a session end, then another session
+    profiles.record_event(
+        "100", "session_end", subject="Java", thread_id="thread-2", session_minutes=3
+    )
+
+    profile = profiles.get("100")
+    assert profile["totals"]["minutes"] == 8
+    assert profile["subjects"]["Java"]["minutes"] == 8
+    assert profile["totals"]["sessions_completed"] == 1
+
+
+def test_keeps_the_recent_difficulties(database):
+    profiles = StudentProfiles(lambda: database)
+    for i in range(StudentProfiles.MAX_RECENT_DIFFICULTIES + 2):
+        profiles.record_event(
+            "100", "answer", subject="Java", correct=False, question=f"Question {i}"
+        )
+
+    difficulties = profiles.get("100")["recent_difficulties"]
+    assert len(difficulties) == StudentProfiles.MAX_RECENT_DIFFICULTIES
+    assert difficulties[-1]["question"] == "Question 11"
+    assert profiles.get("200") is None
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from aiTutorAgent.thread_registry import ThreadRegistry
+
+START = datetime(2025, 3, 3, 9, 0)
+
+
+@pytest.fixture
+def registry(database):
+    registry = ThreadRegistry(lambda: database)
+    # two sessions created at the same time, ordered by thread ID
+    for index, minutes in enumerate([0, 10, 10, 20, 30]):
+        registry.register(
+            f"thread-{index}",
+            "student-1",
+            "COMP228",
+            created_at=START + timedelta(minutes=minutes),
+        )
+    registry.register("thread-other", "student-2", "COMP254", created_at=START)
+    return registry
+
+
+def test_lists_the_sessions_of_a_student_in_pages(registry):
+    pages = []
+    cursor = None
+    while True:
+        documents, cursor = registry.list_for_student("student-1", cursor=cursor, limit=2)
+        pages.append([document["thread_id"] for document in documents])
+        if cursor is None:
+            break
+
+    assert pages == [
+        ["thread-4", "thread-3"],
+        ["thread-2", "thread-1"],
+        ["thread-0"],
+    ]
+    assert registry.count_for_student("student-1") == 5
+
+
+def test_last_full_page_has_no_cursor(registry):
+    documents, cursor = registry.list_for_student("student-1", limit=5)
+    assert len(documents) == 5
+    assert cursor is None
+
+
+def test_rejects_a_malformed_cursor(registry):
+    with pytest.raises(ValueError):
+        registry.list_for_student("student-1", cursor="not-a-cursor")
+
+
+def test_records_the_activity_of_a_session(registry):
+    registry.record_activity("thread-0", message_count=7, next_state="student_input")
+
+    document = registry.get("thread-0")
+    assert document["message_count"] == 7
+    assert document["next_state"] == "student_input"
+    assert document["created_at"] == START
+    assert registry.get("thread-0", fields=["subject"]) == {"subject": "COMP228"}
+    assert registry.get("thread-missing") is None
+
+
+def test_registering_again_keeps_the_creation(registry):
+    registry.register("thread-0", "student-1", "COMP228", created_at=START + timedelta(days=1))
+
+    document = registry.get("thread-0")
+    assert document["created_at"] == START
+    assert document["last_activity"] == START + timedelta(days=1)
@@ -0,0 +1,77 @@
+import importlib
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+@pytest.fixture(scope="module")
+def server():
+    # the Flask module name is not a valid identifier
+    return importlib.import_module("agentic-rag-ai-tutor-LangGraph")
+
+
+def make_state(values=None, next_nodes=("student_answer",)):
+    return SimpleNamespace(
+        values=values
+        or {
+            "answer_trials": 1,
+            "current_task_index": 2,
+            "task_breakdown": ["first", "second", "third"],
+        },
+        next=next_nodes,
+    )
+
+
+def make_response():
+    return {
+        "messages": [
+            AIMessage(content="Which topic?"),
+            HumanMessage(content="Classes"),
+            AIMessage(content="What is a class?"),
+        ]
+    }
+
+
+def test_sends_the_messages_after_the_cursor(server):
+    response = server.tutoring_response(
+        make_response(), "thread-1", make_state(), message_cursor=2
+    )
+
+    assert response.messages == [
+        server.TutoringMessage(role="ai", content="What is a class?")
+    ]
+    assert response.message_cursor == 3
+    assert response.next_state == "student_answer"
+    assert (response.answer_trials, response.current_task_index) == (1, 2)
+    assert response.task_count == 3
+    assert response.state is None
+
+
+@pytest.mark.parametrize("message_cursor, sent", [(None, 3), (-4, 3), (10, 0)])
+def test_clamps_the_cursor(server, message_cursor, sent):
+    response = server.tutoring_response(
+        make_response(), "thread-1", make_state(), message_cursor=message_cursor
+    )
+
+    assert len(response.messages) == sent
+    assert response.message_cursor == 3
+
+
+def test_encodes_without_the_state_unless_debug(server):
+    state = make_state(next_nodes=())
+    body = server.encode_tutoring_response(
+        server.tutoring_response(make_response(), "thread-1", state),
+        "/continue-tutoring",
+    )
+
+    payload = orjson.loads(body)
+    assert "state" not in payload
+    assert payload["next_state"] == ""
+    assert payload["thread_id"] == "thread-1"
+    assert [message["role"] for message in payload["messages"]] == [
+        "ai",
+        "student",
+        "ai",
+    ]
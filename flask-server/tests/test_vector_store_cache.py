@@ -0,0 +1,139 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from rag import vector_store_cache
+from rag.vector_store_cache import SessionVectorStores, VectorStoreCache
+
+
+def fake_store(vectors=10, dimensions=4):
+    """Vector store of vectors x dimensions x 4 bytes, without documents"""
+    return SimpleNamespace(
+        index=SimpleNamespace(ntotal=vectors, d=dimensions),
+        docstore=SimpleNamespace(_dict={}),
+    )
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vector_store_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_the_least_recently_used_entry(clock):
+    cache = VectorStoreCache(max_entries=2)
+    cache.put("a", fake_store())
+    cache.put("b", fake_store())
+    assert cache.get("a") is not None
+    cache.put("c", fake_store())
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"]["entries"] == 1
+
+
+def test_evicts_to_stay_within_the_bytes(clock):
+    # 160 bytes per store
+    cache = VectorStoreCache(max_bytes=400)
+    for key in ("a", "b", "c"):
+        cache.put(key, fake_store())
+
+    assert list(cache) == ["b", "c"]
+    assert cache.stats()["resident_bytes"] == 320
+    assert cache.stats()["evictions"]["bytes"] == 1
+
+
+def test_keeps_an_entry_larger_than_the_bytes(clock):
+    cache = VectorStoreCache(max_bytes=100)
+    cache.put("a", fake_store())
+    cache.put("b", fake_store())
+
+    assert list(cache) == ["b"]
+
+
+def test_expires_the_entries_not_used_within_the_ttl(clock):
+    cache = VectorStoreCache(ttl_seconds=60)
+    cache.put("a", fake_store())
+    cache.put("b", fake_store())
+    clock.now += 45
+    assert cache.get("a") is not None
+    clock.now += 30
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["evictions"]["ttl"] == 1
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+
+
+def test_sessions_share_the_store_of_the_same_weeks(clock):
+    sessions = SessionVectorStores(VectorStoreCache())
+    loads = []
+
+    def loader(paths):
+        loads.append(paths)
+        return fake_store()
+
+    first, loaded_first = sessions.load("thread-1", ["week1", "week2"], loader)
+    second, loaded_second = sessions.load("thread-2", ["week1", "week2"], loader)
+
+    assert first is second
+    assert (loaded_first, loaded_second) == (True, False)
+    assert loads == [["week1", "week2"]]
+    assert sessions.get("thread-2") is first
+    assert "thread-1" in sessions
+    assert sessions.get("thread-3") is None
+
+
+def test_reloads_a_store_after_its_eviction(clock):
+    sessions = SessionVectorStores(VectorStoreCache(max_entries=1))
+    sessions.load("thread-1", ["week1"], lambda paths: fake_store())
+    sessions.load("thread-2", ["week2"], lambda paths: fake_store())
+
+    assert sessions.get("thread-1") is None
+    # the session is known, its store was evicted
+    assert "thread-1" in sessions
+    _, loaded = sessions.load("thread-1", ["week1"], lambda paths: fake_store())
+    assert loaded
+
+
+def test_concurrent_loads_of_the_same_weeks_load_once(clock):
+    sessions = SessionVectorStores(VectorStoreCache())
+    loads = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_loader(paths):
+        loads.append(paths)
+        started.set()
+        release.wait(5)
+        return fake_store()
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda thread_id=thread_id: results.append(
+                sessions.load(thread_id, ["week1"], slow_loader)
+            )
+        )
+        for thread_id in ("thread-1", "thread-2")
+    ]
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(loads) == 1
+    assert results[0][0] is results[1][0]
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from "react";
 import { Home, BarChart, BookOpen, ChevronDown, ChevronUp, Trash, Edit } from "lucide-react";
 import axios from "axios";
 import Modal from "./Modal";
+import { runAnalysisJob } from "../utils/analysisJobs";
 import "../../styles/Admin.css";
 
 const AdminDashboard = () => {
@@ -9,6 +10,7 @@ const AdminDashboard = () => {
   const [analysisType, setAnalysisType] = useState(null);
   const [filters, setFilters] = useState({});
   const [analysisResult, setAnalysisResult] = useState(null);
+  const [analysisProgress, setAnalysisProgress] = useState(null);
   const [statistics, setStatistics] = useState({
     totalSessions: 0,
     totalStudents: 0,
@@ -163,10 +165,13 @@ const AdminDashboard = () => {
           throw new Error("Invalid analysis type");
       }
 
-      const response = await axios.post(endpoint, payload);
-      setAnalysisResult(response.data);
-      console.log(response.data);
+      // The analysis runs as a background job: poll it until it is done
+      const result = await runAnalysisJob(endpoint, payload, setAnalysisProgress);
+      setAnalysisProgress(null);
+      setAnalysisResult(result);
+      console.log(result);
     } catch (error) {
+      setAnalysisProgress(null);
       console.error("Error fetching analysis:", error);
       alert("Failed to fetch analysis. Please try again.");
     }
@@ -294,10 +299,15 @@ const AdminDashboard = () => {
         />
       )}
       {analysisType && (
-        <button className="fetch-button" onClick={fetchAnalysis}>
+        <button
+          className="fetch-button"
+          onClick={fetchAnalysis}
+          disabled={analysisProgress !== null}
+        >
           Fetch Analysis
         </button>
       )}
+      {analysisProgress && <p className="analysis-progress">{analysisProgress}...</p>}
     </div>
   );
 
@@ -5,13 +5,16 @@ import TutorInteraction from "./TutorInteraction";
 import axios from "axios";
 import "../App.css";
 import PropTypes from 'prop-types';
+import { useConfig } from "../utils/config";
 
 function TutorChat({ studentId: propStudentId }) {
   const [isLoading, setIsLoading] = useState(false);
   const [aiMessages, setAiMessages] = useState([]);
-  const [llmPrompt, setLlmPrompt] = useState("");
+  const [llmPrompt, setLlmPrompt] = useState([]);
   const [isTutoringStarted, setIsTutoringStarted] = useState(false);
   const [threadId, setThreadId] = useState(null);
+  // number of session messages received, the server only sends the messages after it
+  const [messageCursor, setMessageCursor] = useState(0);
   const [nextState, setNextState] = useState("");
   const [remainingTime, setRemainingTime] = useState(0);
   const [showWarning, setShowWarning] = useState(false);
@@ -24,6 +27,10 @@ function TutorChat({ studentId: propStudentId }) {
   const [savedTimestamp, setSavedTimestamp] = useState("");
   const [topicCode, setTopicCode] = useState("");
 
+  // the full graph state is only sent for the debug view
+  const config = useConfig();
+  const debugMode = Boolean(config.DEBUG_MODE);
+
   // Get studentId from session storage if not provided as prop
   const studentId = propStudentId || sessionStorage.getItem('userId');
 
@@ -58,15 +65,17 @@ function TutorChat({ studentId: propStudentId }) {
         duration: selectedDuration,
         topic: selectedTopic,
         current_week: currentWeek,
+        debug: debugMode,
       });
       setIsLoading(false);
 
       const messages = response.data.messages;
       setThreadId(response.data.thread_id);
       setAiMessages(messages);
+      setMessageCursor(response.data.message_cursor);
 
       const state = response.data.state;
-      setLlmPrompt(state);
+      setLlmPrompt(state ?? []);
       setNextState(response.data.next_state);
 
       setIsTutoringStarted(true);
@@ -81,6 +90,7 @@ function TutorChat({ studentId: propStudentId }) {
 
 
   const handleSend = async (userMessage, AImessage = false) => {
+    const receivedMessages = aiMessages;
     try {
       if (!AImessage) {
         setAiMessages([...aiMessages, { role: "User", content: userMessage }]);
@@ -92,11 +102,14 @@ function TutorChat({ studentId: propStudentId }) {
         student_id: studentId,
         student_response: userMessage,
         thread_id: threadId,
+        message_cursor: messageCursor,
+        debug: debugMode,
       });
-      const { messages, state, next_state } = response.data;
+      const { messages, message_cursor, state, next_state } = response.data;
       setIsLoading(false);
-      setAiMessages(messages);
-      setLlmPrompt(state);
+      setAiMessages([...receivedMessages, ...messages]);
+      setMessageCursor(message_cursor);
+      setLlmPrompt(state ?? []);
       setNextState(next_state);
 
       if (next_state === null || next_state === "") {
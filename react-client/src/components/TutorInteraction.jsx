@@ -4,18 +4,18 @@ import "react-json-view-lite/dist/index.css";
 import MermaidDiagram from "./MermaidDiagram";
 import PropTypes from "prop-types";
 import "../../styles/TutorInteraction.css";
-import axios from "axios";
 import { Button, Row, Col, Form, Spinner } from "react-bootstrap";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { oneLight } from 'react-syntax-highlighter/dist/esm/styles/prism';
 import { useConfig } from "../utils/config";
+import { runAnalysisJob } from "../utils/analysisJobs";
 
 
 function TutorInteraction({
   aiMessages,
-  llmPrompt,
+  llmPrompt = [],
   onSend,
   isLoading,
   nextState,
@@ -32,6 +32,7 @@ function TutorInteraction({
   const [graphData, setGraphData] = useState(null);
   const [showProgress, setShowProgress] = useState(false); // State to manage progress visibility
   const [progressData, setProgressData] = useState(null); // State to store progress data
+  const [isProgressLoading, setIsProgressLoading] = useState(false); // Analysis job running
 
   // Fetch graph data on mount
   useEffect(() => {
@@ -100,15 +101,19 @@ function TutorInteraction({
 
   // Fetch student progress data
   const fetchStudentProgress = async () => {
+    setIsProgressLoading(true);
     try {
       const endpoint = "/api/student-analysis";
       const payload = { student_id: studentId };
-      const response = await axios.post(endpoint, payload);
-      setProgressData(response.data); // Store the fetched data
+      // The analysis runs as a background job, poll it until it is done
+      const result = await runAnalysisJob(endpoint, payload);
+      setProgressData(result); // Store the fetched data
       setShowProgress(true); // Show the progress section
     } catch (error) {
       console.error("Error fetching student progress:", error);
       alert("Failed to fetch progress data. Please try again.");
+    } finally {
+      setIsProgressLoading(false);
     }
   };
 
@@ -135,8 +140,9 @@ function TutorInteraction({
           variant="outline-light"
           className="custom-btn"
           onClick={fetchStudentProgress} // Fetch progress on button click
+          disabled={isProgressLoading}
         >
-          View Progress
+          {isProgressLoading ? <Spinner animation="border" size="sm" /> : "View Progress"}
         </Button>
       </div>
     </header>
@@ -334,7 +340,8 @@ TutorInteraction.propTypes = {
       content: PropTypes.string.isRequired,
     })
   ).isRequired,
-  llmPrompt: PropTypes.array.isRequired,
+  // graph state, only sent by the server in debug mode
+  llmPrompt: PropTypes.array,
   onSend: PropTypes.func.isRequired,
   isLoading: PropTypes.bool.isRequired,
   nextState: PropTypes.string.isRequired,
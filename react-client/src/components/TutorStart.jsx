@@ -27,6 +27,7 @@ function TutorStart({ onStartTutoring, isLoading }) {
   // States for conversation history
   const [isHistoryLoading, setIsHistoryLoading] = useState(false);
   const [conversationHistory, setConversationHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const [isHistoryModalOpen, setIsHistoryModalOpen] = useState(false);
   const [selectedConversation, setSelectedConversation] = useState(null);
   const [isConversationModalOpen, setIsConversationModalOpen] = useState(false);
@@ -106,7 +107,7 @@ function TutorStart({ onStartTutoring, isLoading }) {
   }
 
   // Function to fetch conversation history
-  const fetchConversationHistory = async () => {
+  const fetchConversationHistory = async (loadMore = false) => {
     setIsHistoryLoading(true);
     try {
       // Get the student ID from localStorage or another source
@@ -119,14 +120,18 @@ function TutorStart({ onStartTutoring, isLoading }) {
       }
 
       const response = await axios.post('/api/get-student-chat-history', {
-        student_id: studentId
+        student_id: studentId,
+        cursor: loadMore ? historyCursor : null
       });
 
       if (response.status === 200 && response.data.conversations) {
-        if (response.data.conversations.length === 0) {
+        if (!loadMore && response.data.conversations.length === 0) {
           alert('No conversation history found for your account.');
         } else {
-          setConversationHistory(response.data.conversations);
+          setConversationHistory(loadMore
+            ? [...conversationHistory, ...response.data.conversations]
+            : response.data.conversations);
+          setHistoryCursor(response.data.next_cursor);
           setIsHistoryModalOpen(true);
         }
       } else {
@@ -141,10 +146,30 @@ function TutorStart({ onStartTutoring, isLoading }) {
   };
 
   // Function to handle conversation selection
-  const handleConversationSelect = (conversation) => {
+  const handleConversationSelect = async (conversation) => {
     setSelectedConversation(conversation);
     setIsHistoryModalOpen(false);
     setIsConversationModalOpen(true);
+
+    // the listing only has the metadata, fetch the messages page by page
+    try {
+      const studentId = localStorage.getItem('userId') || sessionStorage.getItem('userId');
+      let messages = [];
+      let cursor = null;
+      do {
+        const response = await axios.post('/api/get-thread-messages', {
+          thread_id: conversation.thread_id,
+          student_id: studentId,
+          cursor: cursor
+        });
+        messages = [...messages, ...response.data.messages];
+        cursor = response.data.next_cursor;
+      } while (cursor !== null && cursor !== undefined);
+      setSelectedConversation({ ...conversation, messages: messages });
+    } catch (error) {
+      console.error('Error fetching conversation messages:', error);
+      alert('Error fetching conversation messages: ' + error.message);
+    }
   };
 
   // Format date for display
@@ -286,7 +311,7 @@ function TutorStart({ onStartTutoring, isLoading }) {
               <div className="text-center">
                 <Button
                   variant="outline-dark"
-                  onClick={fetchConversationHistory}
+                  onClick={() => fetchConversationHistory()}
                   className="w-50"
                   disabled={isHistoryLoading}
                 >
@@ -369,6 +394,18 @@ function TutorStart({ onStartTutoring, isLoading }) {
                 </ListGroup.Item>
               ))}
             </ListGroup>
+            {historyCursor && (
+              <div className="text-center">
+                <Button
+                  variant="outline-dark"
+                  size="sm"
+                  onClick={() => fetchConversationHistory(true)}
+                  disabled={isHistoryLoading}
+                >
+                  Load more
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </Modal>
@@ -0,0 +1,17 @@
+import axios from "axios";
+
+// Start an analysis and poll its background job until it is done.
+// Calls onProgress with the progress message of the running job and
+// resolves with the analysis result ({ summary, visualizations }).
+export async function runAnalysisJob(endpoint, payload, onProgress = () => {}) {
+    let { data: job } = await axios.post(endpoint, payload);
+    while (job.status === "queued" || job.status === "running") {
+        onProgress(job.progress);
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        ({ data: job } = await axios.get(`/api/analysis-jobs/${job.job_id}`));
+    }
+    if (job.status !== "done") {
+        throw new Error(job.error || "Analysis failed");
+    }
+    return job.result;
+}